@@ -0,0 +1,70 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from embedding_cache import normalize_query
+
+
+class AnswerCache:
+    """
+    Cache das respostas do /ask, com expiração (TTL) e remoção LRU.
+
+    A chave combina a pergunta normalizada, a lista ordenada dos ids dos
+    pontos recuperados, a versão do prompt e o token de versão do índice.
+    Como o LLM roda com temperature=0, a mesma pergunta com as mesmas
+    evidências produz a mesma resposta. Quando o token de versão muda (nova
+    ingestão), todas as entradas anteriores são descartadas.
+
+    Também guarda as janelas de resultados do /search, com outra chave
+    (ver `rag_api.search_window_flow`).
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "invalidations": 0}
+
+    @staticmethod
+    def make_key(question, point_ids, prompt_version):
+        parts = [prompt_version, normalize_query(question), *(str(point_id) for point_id in point_ids)]
+        return hashlib.sha256("\x1f".join(parts).encode('utf-8')).hexdigest()
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._data:
+                self.counters["invalidations"] += 1
+            self._data.clear()
+            self._version = version
+
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(version)
+            item = self._data.get(key)
+            if item is None:
+                self.counters["misses"] += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.counters["hits"] += 1
+            return value
+
+    def put(self, key, value, version):
+        with self._lock:
+            self._check_version(version)
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, entries=len(self._data))
@@ -0,0 +1,404 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import platform
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Benchmark de ponta a ponta sem a API do Google nem um servidor do Qdrant:
+# modelos simulados (fake_models.py, com latência configurável), Qdrant em
+# memória e um acervo de portarias sintéticas (synthetic_portarias.py), com
+# PDFs de texto e digitalizados, servido por um portal local (local_portal.py)
+# de onde o crawler os baixa. Mede a vazão da ingestão por etapa e a
+# distribuição das latências do /search e do /ask sob carga concorrente, nas
+# APIs WSGI (rag_api.py) e ASGI (rag_api_async.py), e grava os resultados
+# em JSON para comparar execuções.
+# Execução: python benchmark_offline.py --docs 200 --requests 200 --concurrency 16 --output atual.json --compare base.json
+
+logger = logging.getLogger("benchmark_offline")
+
+
+def configure_environment(workdir, args):
+    """Aponta todos os arquivos para `workdir` e ativa os modelos e o OCR simulados (antes de importar o projeto)."""
+    os.environ.update({
+        "MODEL_BACKEND": "fake",
+        "OCR_BACKEND": "fake",
+        "FAKE_EMBED_LATENCY": str(args.embed_latency),
+        "FAKE_EMBED_LATENCY_PER_TEXT": str(args.embed_latency_per_text),
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_LLM_TOKEN_LATENCY": str(args.llm_token_latency),
+        "FAKE_OCR_LATENCY": str(args.ocr_latency),
+        "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY", "offline"),
+        "VECTOR_BACKEND": "qdrant",
+        "EMBED_REQUESTS_PER_MINUTE": "100000",
+        "INGEST_MANIFEST_PATH": os.path.join(workdir, "pdfs", "manifest.json"),
+        "INGEST_REPORT_PATH": os.path.join(workdir, "ingest_report.json"),
+        "EMBED_FAILURES_PATH": os.path.join(workdir, "embedding_failures.jsonl"),
+        "INDEX_VERSION_PATH": os.path.join(workdir, "texts", ".index_version"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "texts", ".lexical_index.sqlite3"),
+        "VECTOR_STORE_PATH": os.path.join(workdir, "texts", ".vector_store.bin"),
+        "DOCUMENT_STORE_PATH": os.path.join(workdir, "texts", "documents"),
+        # Sem caches persistentes: cada execução parte do zero.
+        "OCR_CACHE_PATH": "",
+        "EMBEDDING_CACHE_PATH": "",
+    })
+    if args.workers:
+        os.environ["EXTRACTION_WORKERS"] = str(args.workers)
+
+
+def latency_summary(latencies, errors, wall):
+    """Percentis (ms), vazão e erros de uma série de pedidos."""
+    values = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+        "rps": round(len(latencies) / wall, 2) if wall else 0.0,
+    }
+
+
+def stage_latencies(report, name):
+    """Percentis (ms) de um histograma `<name>` do `metrics.report()`, por rótulo."""
+    return {
+        labels.split("=", 1)[-1]: {
+            "count": values["count"],
+            **{key: round(values[key] * 1000, 2) for key in ("p50", "p95", "p99")},
+        }
+        for labels, values in report.get(name, {}).items()
+    }
+
+
+def bench_ingestion(workdir, corpus):
+    import ingest_portarias
+    from qdrant_client import QdrantClient
+    from metrics import metrics
+
+    client = QdrantClient(":memory:")
+    ingestor = ingest_portarias.IngestPortarias(
+        pdf_dir=os.path.join(workdir, "pdfs"), text_dir=os.path.join(workdir, "texts")
+    )
+    ingestor.qdrant_client = client
+
+    metrics.reset()
+    started = time.perf_counter()
+    report = ingestor.run_ingestion()
+    seconds = time.perf_counter() - started
+    chunks = client.count(collection_name=ingestor.alias_name).count
+    collected = metrics.report()
+    result = {
+        "documents": len(corpus),
+        "scanned": sum(item.scanned for item in corpus),
+        "pages": sum(item.pages for item in corpus),
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "documents_per_s": round(len(corpus) / seconds, 2),
+        "chunks_per_s": round(chunks / seconds, 2),
+        "stages": report["stages"],
+        "queues": report["queues"],
+        "stage_latency_ms": stage_latencies(collected, "ingest_stage_seconds"),
+        "ocr_pages": collected.get("ingest_ocr_pages_total", {}).get("", 0),
+        "rejected": collected.get("ingest_rejected_total", {}),
+    }
+    return client, result
+
+
+def reset_api_caches():
+    """Invalida os caches de respostas e de buscas e esvazia o cache de embeddings em memória."""
+    import rag_api
+    rag_api.index_version.bump()
+    rag_api.query_embedder.memory.clear()
+
+
+ENDPOINTS = {
+    "/search": lambda query: {"query": query},
+    "/ask": lambda query: {"question": query},
+}
+
+
+def bench_wsgi(client, queries, requests, concurrency):
+    import rag_api
+    from metrics import metrics
+
+    rag_api.qdrant_client = client
+    results = {}
+    for path, body in ENDPOINTS.items():
+        reset_api_caches()
+
+        def call(query):
+            started = time.perf_counter()
+            response = rag_api.app.test_client().post(path, json=body(query))
+            return time.perf_counter() - started, response.status_code == 200
+
+        metrics.reset()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(call, (queries[i % len(queries)] for i in range(requests))))
+        wall = time.perf_counter() - started
+        latencies = [seconds for seconds, ok in outcomes if ok]
+        results[path] = latency_summary(latencies, len(outcomes) - len(latencies), wall)
+        results[path]["stages_ms"] = stage_latencies(metrics.report(), "rag_stage_seconds")
+    return results
+
+
+async def copy_collection(client, async_client, collection_name):
+    """Copia a coleção do Qdrant em memória da ingestão para um cliente assíncrono (também em memória)."""
+    from qdrant_client import models
+
+    info = client.get_collection(collection_name)
+    await async_client.create_collection(collection_name=collection_name, vectors_config=info.config.params.vectors)
+    offset = None
+    while True:
+        points, offset = client.scroll(collection_name, limit=256, offset=offset, with_payload=True, with_vectors=True)
+        await async_client.upsert(collection_name, points=[
+            models.PointStruct(id=point.id, vector=point.vector, payload=point.payload) for point in points
+        ])
+        if offset is None:
+            break
+
+
+async def bench_asgi(client, queries, requests, concurrency):
+    import httpx
+    import rag_api_async
+    from qdrant_client import AsyncQdrantClient
+    from settings import settings
+    from metrics import metrics
+
+    async_client = AsyncQdrantClient(":memory:")
+    await copy_collection(client, async_client, settings.QDRANT_COLLECTION)
+    rag_api_async.async_qdrant_client = async_client
+
+    results = {}
+    transport = httpx.ASGITransport(app=rag_api_async.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as http:
+        for path, body in ENDPOINTS.items():
+            reset_api_caches()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def call(query):
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await http.post(path, json=body(query))
+                    return time.perf_counter() - started, response.status_code == 200
+
+            metrics.reset()
+            started = time.perf_counter()
+            outcomes = await asyncio.gather(*(call(queries[i % len(queries)]) for i in range(requests)))
+            wall = time.perf_counter() - started
+            latencies = [seconds for seconds, ok in outcomes if ok]
+            results[path] = latency_summary(latencies, len(outcomes) - len(latencies), wall)
+            results[path]["stages_ms"] = stage_latencies(metrics.report(), "rag_stage_seconds")
+    return results
+
+
+# Módulos da extração (PDF, OCR, detecção de idioma) que não podem ser
+# carregados pela importação das APIs: não são usados para atender pedidos.
+# O PIL é a exceção quando vem do fastembed, importado pelo qdrant_client.
+EXTRACTION_MODULES = ("fitz", "pymupdf", "pytesseract", "tesserocr", "langdetect", "PIL", "ocr_engine", "pdf_processor")
+
+STARTUP_SCRIPT = (
+    "import sys, json, time; started = time.perf_counter(); import {module}; seconds = time.perf_counter() - started; "
+    "print(json.dumps({{'seconds': seconds, 'loaded': [m for m in {modules!r} if m in sys.modules "
+    "and not (m == 'PIL' and 'fastembed' in sys.modules)]}}))"
+)
+
+
+def bench_startup(modules=("rag_api", "rag_api_async"), repeat=3):
+    """
+    Tempo de importação de cada API em um processo novo (mediana de
+    `repeat`), comparado ao orçamento, e os `EXTRACTION_MODULES` que a
+    importação carregou (deve ser nenhum).
+    """
+    from settings import settings
+
+    results = {}
+    for module in modules:
+        samples, loaded = [], set()
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT.format(module=module, modules=EXTRACTION_MODULES)],
+                capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+            ).stdout
+            sample = json.loads(output.strip().splitlines()[-1])
+            samples.append(sample["seconds"])
+            loaded.update(sample["loaded"])
+        seconds = float(np.median(samples))
+        results[module] = {
+            "import_s": round(seconds, 3),
+            "budget_s": settings.STARTUP_IMPORT_BUDGET,
+            "within_budget": seconds <= settings.STARTUP_IMPORT_BUDGET,
+            "extraction_modules": sorted(loaded),
+        }
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# PDFs por página de listagem do portal local.
+PORTAL_PAGE_SIZE = 20
+
+
+def run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="benchmark_offline_")
+    configure_environment(workdir, args)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from synthetic_portarias import generate_corpus, sample_queries
+    from local_portal import LocalPortal
+
+    logger.info(f"Gerando {args.docs} portarias sintéticas em '{workdir}'...")
+    portal_dir = os.path.join(workdir, "portal")
+    corpus = generate_corpus(
+        portal_dir, args.docs, scanned_ratio=args.scanned_ratio, max_pages=args.max_pages, seed=args.seed
+    )
+    queries = sample_queries(corpus, args.queries, seed=args.seed)
+
+    # A ingestão baixa o acervo do portal local, passando pelo crawler e pelos GETs dos PDFs.
+    with LocalPortal(portal_dir, per_page=PORTAL_PAGE_SIZE) as portal:
+        os.environ.update({
+            "MPC_PORTARIAS_URL": portal.url,
+            "CRAWL_MAX_PAGES": str(len(corpus) // PORTAL_PAGE_SIZE + 1),
+        })
+        return run_benchmarks(args, workdir, corpus, queries)
+
+
+def run_benchmarks(args, workdir, corpus, queries):
+    logger.info("Medindo a inicialização das APIs...")
+    startup = bench_startup()
+
+    logger.info("Medindo a ingestão...")
+    client, ingestion = bench_ingestion(workdir, corpus)
+    results = {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "workdir")},
+        },
+        "startup": startup,
+        "ingestion": ingestion,
+        "api": {},
+    }
+    if "wsgi" in args.servers.split(","):
+        logger.info("Medindo a API WSGI (rag_api)...")
+        results["api"]["wsgi"] = bench_wsgi(client, queries, args.requests, args.concurrency)
+    if "asgi" in args.servers.split(","):
+        logger.info("Medindo a API ASGI (rag_api_async)...")
+        results["api"]["asgi"] = asyncio.run(bench_asgi(client, queries, args.requests, args.concurrency))
+    return results
+
+
+# Valores comparados por `--compare`: (caminho, maior é melhor).
+def comparable_values(results):
+    values = {
+        "ingestion.seconds": (results["ingestion"]["seconds"], False),
+        "ingestion.documents_per_s": (results["ingestion"]["documents_per_s"], True),
+        "ingestion.chunks_per_s": (results["ingestion"]["chunks_per_s"], True),
+    }
+    for module, startup in results.get("startup", {}).items():
+        values[f"startup.{module}.import_s"] = (startup["import_s"], False)
+    for stage, latency in results["ingestion"].get("stage_latency_ms", {}).items():
+        values[f"ingestion.{stage}.p95_ms"] = (latency["p95"], False)
+    for server, endpoints in results.get("api", {}).items():
+        for path, summary in endpoints.items():
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                values[f"{server}{path}.{key}"] = (summary[key], False)
+            values[f"{server}{path}.rps"] = (summary["rps"], True)
+    return values
+
+
+def print_summary(results):
+    for module, startup in results.get("startup", {}).items():
+        status = "dentro do" if startup["within_budget"] else "ACIMA do"
+        print(f"Importação de {module}: {startup['import_s']}s ({status} orçamento de {startup['budget_s']}s)")
+        if startup["extraction_modules"]:
+            print(f"  ERRO: a importação carregou módulos da extração: {', '.join(startup['extraction_modules'])}")
+    ingestion = results["ingestion"]
+    print(
+        f"Ingestão: {ingestion['documents']} PDFs ({ingestion['scanned']} digitalizados, {ingestion['pages']} páginas), "
+        f"{ingestion['chunks']} trechos em {ingestion['seconds']}s "
+        f"({ingestion['documents_per_s']} PDFs/s, {ingestion['chunks_per_s']} trechos/s)"
+    )
+    for stage, stats in ingestion["stages"].items():
+        print(f"  {stage:<12} {stats['items']:>6} itens  {stats['items_per_s']:>8.2f}/s  ocupada {stats['busy_s']:>7.2f}s")
+    print(f"{'api':<16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'erros':>6}")
+    for server, endpoints in results["api"].items():
+        for path, summary in endpoints.items():
+            print(
+                f"{server + ' ' + path:<16} {summary['p50_ms']:>8.1f} {summary['p95_ms']:>8.1f} "
+                f"{summary['p99_ms']:>8.1f} {summary['rps']:>8.1f} {summary['errors']:>6}"
+            )
+
+
+def print_comparison(baseline, results, threshold):
+    """Tabela das diferenças em relação a `baseline`; marca as pioras acima de `threshold` (fração)."""
+    old_values = comparable_values(baseline)
+    print(f"\nComparação com {baseline['meta'].get('git_commit')} ({baseline['meta'].get('timestamp')}):")
+    print(f"{'métrica':<36} {'antes':>10} {'agora':>10} {'dif.':>8}")
+    regressions = 0
+    for path, (value, higher_is_better) in comparable_values(results).items():
+        if path not in old_values:
+            continue
+        old = old_values[path][0]
+        change = (value - old) / old if old else 0.0
+        worse = change < -threshold if higher_is_better else change > threshold
+        regressions += worse
+        print(f"{path:<36} {old:>10.2f} {value:>10.2f} {change:>+7.1%}{'  <- piora' if worse else ''}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline da ingestão e da API, com modelos e Qdrant locais.")
+    parser.add_argument("--docs", type=int, default=100, help="Portarias sintéticas geradas.")
+    parser.add_argument("--scanned-ratio", type=float, default=0.1, help="Fração de PDFs digitalizados (com OCR).")
+    parser.add_argument("--max-pages", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=50, help="Consultas distintas de amostra.")
+    parser.add_argument("--requests", type=int, default=200, help="Pedidos por rota e por servidor.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--servers", default="wsgi,asgi", help="APIs medidas: wsgi, asgi ou ambas.")
+    parser.add_argument("--workers", type=int, default=0, help="Processos de extração (0 = padrão).")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Latência por chamada de embeddings (s).")
+    parser.add_argument("--embed-latency-per-text", type=float, default=0.002, help="Latência adicional por texto (s).")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Latência até o primeiro token do LLM (s).")
+    parser.add_argument("--llm-token-latency", type=float, default=0.01, help="Latência entre tokens do LLM (s).")
+    parser.add_argument("--ocr-latency", type=float, default=0.5, help="Latência do OCR por imagem (s).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", help="Diretório dos arquivos gerados (padrão: temporário).")
+    parser.add_argument("--output", help="Grava os resultados em JSON neste arquivo.")
+    parser.add_argument("--compare", help="Resultados anteriores (JSON) para comparar.")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Piora relativa que conta como regressão.")
+    parser.add_argument("--verbose", action="store_true", help="Mostra os logs da ingestão e da API.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    logger.setLevel(logging.INFO)
+    results = run(args)
+    print_summary(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    # A importação das APIs não pode carregar a extração de PDFs, com ou sem --compare.
+    failures = sum(bool(startup["extraction_modules"]) for startup in results["startup"].values())
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            failures += print_comparison(json.load(f), results, args.threshold)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,193 @@
+import json
+import time
+import random
+import argparse
+import logging
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+from collection_profiles import CollectionProfile, PROFILES
+from vector_store import LocalVectorStore
+from settings import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Compara os perfis de coleção (collection_profiles.py) no acervo real:
+# cada perfil recebe uma cópia temporária da coleção em produção, e as
+# mesmas consultas medem o recall@k contra a busca exata e a latência.
+# Execução: python benchmark_profiles.py --profiles ram,scalar,product --ef 64,128
+
+
+def load_points(client, from_store):
+    """(ids, vetores, payloads) da coleção em produção ou da cópia local dos vetores."""
+    ids, vectors, payloads = [], [], []
+    if from_store:
+        for batch in LocalVectorStore(settings.VECTOR_STORE_PATH).iter_points():
+            for point_id, vector, payload in batch:
+                ids.append(point_id)
+                vectors.append(vector)
+                payloads.append(payload)
+        return ids, vectors, payloads
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=settings.QDRANT_COLLECTION, limit=256, offset=offset, with_payload=True, with_vectors=True
+        )
+        for point in points:
+            ids.append(point.id)
+            vectors.append(point.vector)
+            payloads.append(point.payload)
+        if offset is None:
+            return ids, vectors, payloads
+
+
+def sample_queries(vectors, count, text_queries, seed):
+    """Vetores de trechos sorteados e, se pedido, as consultas de amostra vetorizadas."""
+    rng = random.Random(seed)
+    queries = [vectors[i] for i in rng.sample(range(len(vectors)), min(count, len(vectors)))]
+    if text_queries:
+        from langchain_gemini import embed_model
+        queries += embed_model.embed_documents(settings.REBUILD_SAMPLE_QUERIES)
+    return queries
+
+
+def wait_until_indexed(client, collection_name, timeout):
+    """Espera a otimização (HNSW e quantização) terminar, até `timeout` segundos."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.get_collection(collection_name).status == models.CollectionStatus.GREEN:
+            return True
+        time.sleep(1)
+    logger.warning(f"A coleção '{collection_name}' não terminou a indexação em {timeout}s.")
+    return False
+
+
+def create_copy(client, collection_name, profile, ids, vectors, payloads, batch_size):
+    if client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+    client.create_collection(collection_name=collection_name, **profile.create_params(len(vectors[0])))
+    for start in range(0, len(ids), batch_size):
+        client.upsert(
+            collection_name=collection_name,
+            points=models.Batch(
+                ids=ids[start:start + batch_size],
+                vectors=vectors[start:start + batch_size],
+                payloads=payloads[start:start + batch_size]
+            ),
+            wait=True
+        )
+
+
+def exact_neighbors(client, collection_name, queries, k):
+    """Vizinhos exatos de cada consulta (força bruta, ignorando HNSW e quantização)."""
+    params = models.SearchParams(exact=True, quantization=models.QuantizationSearchParams(ignore=True))
+    return [
+        {hit.id for hit in client.search(collection_name=collection_name, query_vector=query, limit=k, search_params=params)}
+        for query in queries
+    ]
+
+
+def measure(client, collection_name, queries, truth, k, search_params):
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        hits = client.search(collection_name=collection_name, query_vector=query, limit=k, search_params=search_params)
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len({hit.id for hit in hits} & expected) / max(1, len(expected)))
+    return {
+        "recall": float(np.mean(recalls)),
+        "min_recall": float(np.min(recalls)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def estimated_ram(profile, count, dim):
+    """
+    Memória aproximada (bytes) de vetores e grafo HNSW no perfil: os dados
+    em disco ficam no cache de páginas do sistema, não na memória do Qdrant.
+    """
+    ram = 0 if profile.on_disk_vectors else count * dim * 4
+    if profile.quantization == "scalar" and profile.quantization_always_ram:
+        ram += count * dim
+    elif profile.quantization == "product" and profile.quantization_always_ram:
+        ram += count * dim * 4 // int(profile.product_compression.lstrip("x"))
+    if not profile.hnsw_on_disk:
+        # Camada 0 do HNSW: até 2*m vizinhos de 4 bytes por ponto.
+        ram += count * profile.hnsw_m * 2 * 4
+    return ram
+
+
+def run(profiles, ef_values, k, query_count, text_queries, from_store, keep, index_timeout, seed):
+    client = QdrantClient(url=settings.QDRANT_URL, timeout=120.0)
+    ids, vectors, payloads = load_points(client, from_store)
+    if not ids:
+        raise RuntimeError("Nenhum ponto para o benchmark.")
+    dim = len(vectors[0])
+    queries = sample_queries(vectors, query_count, text_queries, seed)
+    logger.info(f"Benchmark com {len(ids)} pontos, {len(queries)} consultas e k={k}.")
+
+    results = []
+    truth = None
+    collections = []
+    try:
+        for name in profiles:
+            profile = CollectionProfile(name)
+            collection_name = f"{settings.QDRANT_COLLECTION}_bench_{name}"
+            collections.append(collection_name)
+            started = time.monotonic()
+            create_copy(client, collection_name, profile, ids, vectors, payloads, settings.UPSERT_BATCH_SIZE)
+            wait_until_indexed(client, collection_name, index_timeout)
+            build_seconds = time.monotonic() - started
+            if truth is None:
+                truth = exact_neighbors(client, collection_name, queries, k)
+            for ef in ef_values:
+                tuned = CollectionProfile(name, hnsw_ef=ef) if ef else profile
+                results.append({
+                    "profile": name,
+                    "hnsw_ef": ef,
+                    "build_s": round(build_seconds, 1),
+                    "ram_mb": round(estimated_ram(profile, len(ids), dim) / 2 ** 20, 1),
+                    **measure(client, collection_name, queries, truth, k, tuned.search_params()),
+                })
+    finally:
+        if not keep:
+            for collection_name in collections:
+                client.delete_collection(collection_name)
+    return results
+
+
+def print_table(results, k):
+    print(f"{'perfil':<10} {'hnsw_ef':>8} {'recall@' + str(k):>10} {'mín.':>6} {'p50 ms':>8} {'p95 ms':>8} {'RAM MB':>8} {'criação s':>10}")
+    for r in results:
+        print(
+            f"{r['profile']:<10} {str(r['hnsw_ef'] or '-'):>8} {r['recall']:>10.3f} {r['min_recall']:>6.2f} "
+            f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['ram_mb']:>8.1f} {r['build_s']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara recall e latência dos perfis de coleção do Qdrant.")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="Perfis separados por vírgula.")
+    parser.add_argument("--ef", default="", help="Valores de hnsw_ef da busca, separados por vírgula (vazio = padrão).")
+    parser.add_argument("--k", type=int, default=10, help="Número de vizinhos comparados com a busca exata.")
+    parser.add_argument("--queries", type=int, default=200, help="Trechos do acervo sorteados como consultas.")
+    parser.add_argument("--text-queries", action="store_true", help="Inclui as consultas de REBUILD_SAMPLE_QUERIES (usa a API de embeddings).")
+    parser.add_argument("--from-store", action="store_true", help="Lê os vetores da cópia local (VECTOR_STORE_PATH) em vez do Qdrant.")
+    parser.add_argument("--keep", action="store_true", help="Mantém as coleções do benchmark ao final.")
+    parser.add_argument("--index-timeout", type=float, default=600, help="Espera máxima pela indexação de cada perfil (s).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Grava os resultados em JSON neste arquivo.")
+    args = parser.parse_args()
+
+    results = run(
+        [name.strip() for name in args.profiles.split(",") if name.strip()],
+        [int(ef) for ef in args.ef.split(",") if ef.strip()] or [None],
+        args.k, args.queries, args.text_queries, args.from_store, args.keep, args.index_timeout, args.seed
+    )
+    print_table(results, args.k)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
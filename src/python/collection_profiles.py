@@ -0,0 +1,140 @@
+import logging
+
+from qdrant_client import models
+
+logger = logging.getLogger(__name__)
+
+# Valores de cada opção quando o perfil não os define.
+DEFAULTS = {
+    # None, "scalar" (int8, ~4x menor) ou "product" (PQ, de 4x a 64x menor).
+    "quantization": None,
+    "quantile": 0.99,
+    "product_compression": "x16",
+    # Mantém os vetores quantizados em RAM mesmo com os originais em disco.
+    "quantization_always_ram": True,
+    # Na busca: reordena os candidatos pelos vetores originais, trazendo
+    # `oversampling` vezes o limite pedido.
+    "rescore": True,
+    "oversampling": 2.0,
+    "on_disk_vectors": False,
+    "on_disk_payload": False,
+    "hnsw_m": 16,
+    "hnsw_ef_construct": 100,
+    "hnsw_on_disk": False,
+    # ef da busca (None = padrão do Qdrant, o próprio limite da busca).
+    "hnsw_ef": None,
+}
+
+# Perfis prontos. "ram" reproduz a configuração original das coleções.
+PROFILES = {
+    "ram": {},
+    "scalar": {"quantization": "scalar", "on_disk_vectors": True, "on_disk_payload": True},
+    "product": {"quantization": "product", "on_disk_vectors": True, "on_disk_payload": True, "oversampling": 3.0},
+    "disk": {"on_disk_vectors": True, "on_disk_payload": True, "hnsw_on_disk": True},
+}
+
+
+class CollectionProfile:
+    """
+    Configuração de armazenamento e índice de uma coleção do Qdrant:
+    quantização (escalar ou por produto, com rescoring na busca), vetores e
+    payloads em disco e parâmetros do HNSW (`m`, `ef_construct` e o `ef` da
+    busca). Parte de um perfil de `PROFILES`, com `overrides` por opção.
+    """
+
+    def __init__(self, name="ram", **overrides):
+        if name not in PROFILES:
+            raise ValueError(f"Perfil de coleção desconhecido: '{name}'. Opções: {', '.join(PROFILES)}")
+        unknown = set(overrides) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Opções de perfil desconhecidas: {', '.join(sorted(unknown))}")
+        self.name = name
+        self.options = {**DEFAULTS, **PROFILES[name], **overrides}
+        if self.options["quantization"] not in (None, "scalar", "product"):
+            raise ValueError(f"Quantização não suportada: {self.options['quantization']}")
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.QDRANT_PROFILE, **settings.QDRANT_PROFILE_OVERRIDES)
+
+    def __getattr__(self, option):
+        try:
+            return self.__dict__["options"][option]
+        except KeyError:
+            raise AttributeError(option) from None
+
+    def __repr__(self):
+        changed = {key: value for key, value in self.options.items() if DEFAULTS[key] != value}
+        return f"CollectionProfile({self.name!r}, {changed})"
+
+    def quantization_config(self):
+        if self.quantization == "scalar":
+            return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=self.quantile, always_ram=self.quantization_always_ram
+            ))
+        if self.quantization == "product":
+            return models.ProductQuantization(product=models.ProductQuantizationConfig(
+                compression=models.CompressionRatio(self.product_compression), always_ram=self.quantization_always_ram
+            ))
+        return None
+
+    def hnsw_config(self):
+        return models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct, on_disk=self.hnsw_on_disk)
+
+    def create_params(self, size):
+        """Argumentos do `create_collection` para vetores de `size` dimensões."""
+        return {
+            "vectors_config": models.VectorParams(size=size, distance=models.Distance.COSINE, on_disk=self.on_disk_vectors),
+            "on_disk_payload": self.on_disk_payload,
+            "hnsw_config": self.hnsw_config(),
+            "quantization_config": self.quantization_config(),
+        }
+
+    def search_params(self):
+        """`SearchParams` das buscas na coleção, ou None se não há nada além do padrão."""
+        quantization = None
+        if self.quantization:
+            quantization = models.QuantizationSearchParams(rescore=self.rescore, oversampling=self.oversampling)
+        if quantization is None and self.hnsw_ef is None:
+            return None
+        return models.SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+    def differences(self, config):
+        """Opções em que a configuração de uma coleção existente (`CollectionConfig`) difere do perfil."""
+        vectors = config.params.vectors
+        current = {
+            "on_disk_vectors": bool(vectors.on_disk),
+            "on_disk_payload": bool(config.params.on_disk_payload),
+            "hnsw_m": config.hnsw_config.m,
+            "hnsw_ef_construct": config.hnsw_config.ef_construct,
+            "hnsw_on_disk": bool(config.hnsw_config.on_disk),
+            "quantization": self._quantization_kind(config.quantization_config),
+        }
+        return sorted(key for key, value in current.items() if self.options[key] != value)
+
+    @staticmethod
+    def _quantization_kind(quantization_config):
+        if isinstance(quantization_config, models.ScalarQuantization):
+            return "scalar"
+        if isinstance(quantization_config, models.ProductQuantization):
+            return "product"
+        return None
+
+    def apply(self, client, collection_name):
+        """
+        Ajusta uma coleção existente ao perfil (`update_collection`); o Qdrant
+        reconstrói índices e quantização em segundo plano, sem parar as
+        buscas. Retorna as opções alteradas.
+        """
+        changed = self.differences(client.get_collection(collection_name).config)
+        if not changed:
+            return []
+        client.update_collection(
+            collection_name=collection_name,
+            vectors_config={"": models.VectorParamsDiff(on_disk=self.on_disk_vectors)},
+            collection_params=models.CollectionParamsDiff(on_disk_payload=self.on_disk_payload),
+            hnsw_config=self.hnsw_config(),
+            quantization_config=self.quantization_config() or models.Disabled.DISABLED
+        )
+        logger.info(f"Coleção '{collection_name}' ajustada ao perfil {self}: {', '.join(changed)}.")
+        return changed
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """A API está saturada; o pedido pode ser repetido após `retry_after` segundos."""
+
+    def __init__(self, status, retry_after):
+        super().__init__(f"API saturada ({status})")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    Limita os pedidos processados ao mesmo tempo pela API assíncrona.
+
+    Até `max_concurrency` pedidos rodam em paralelo; os seguintes esperam em
+    uma fila de até `max_queue` posições, por no máximo `queue_timeout`
+    segundos. Com a fila cheia, o pedido é recusado na hora (429); se a
+    espera estourar, é recusado com 503. Nos dois casos o cliente recebe
+    `retry_after` para tentar de novo.
+    """
+
+    def __init__(self, max_concurrency=256, max_queue=512, queue_timeout=10.0, retry_after=5):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.counters = {"admitted": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    async def acquire(self):
+        if not self._semaphore.locked():
+            # Há vaga: o semáforo é obtido sem esperar.
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self.counters["rejected_queue_full"] += 1
+                raise Overloaded(429, self.retry_after)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.counters["rejected_timeout"] += 1
+                raise Overloaded(503, self.retry_after) from None
+            finally:
+                self.waiting -= 1
+        self.active += 1
+        self.counters["admitted"] += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self):
+        return {"active": self.active, "waiting": self.waiting, **self.counters}
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Middleware ASGI que passa cada pedido HTTP pelo `ConcurrencyLimiter`.
+
+    A vaga fica ocupada até o fim da resposta, inclusive das respostas em
+    streaming, e é liberada também quando o cliente desconecta. Caminhos em
+    `exempt_paths` não passam pelo limite.
+    """
+
+    def __init__(self, app, limiter, exempt_paths=()):
+        self.app = app
+        self.limiter = limiter
+        self.exempt_paths = set(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.limiter.acquire()
+        except Overloaded as e:
+            logger.warning(f"Pedido recusado ({e.status}): {self.limiter.stats()}")
+            response = JSONResponse(
+                {"error": "O serviço está sobrecarregado. Tente novamente em instantes."},
+                status_code=e.status,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release()
@@ -0,0 +1,162 @@
+import os
+import hashlib
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Incrementar quando o formato do contexto mudar (entra na versão do prompt).
+CONTEXT_FORMAT_VERSION = 2
+
+# Abaixo deste número de tokens livres, um trecho não é truncado para caber.
+MIN_TRUNCATED_TOKENS = 100
+
+GROUP_END = "---\n\n"
+
+
+def _header(payload):
+    return f"Fonte: {payload['source']}\nTítulo: {payload['title']}\n"
+
+
+def _passage(payload, content):
+    page = payload.get('page')
+    label = f"Trecho (página {page})" if page else "Conteúdo do trecho"
+    return f"{label}: {content}\n\n"
+
+
+class ContextBuilder:
+    """
+    Monta o contexto enviado ao LLM a partir dos pontos recuperados.
+
+    Os trechos são escolhidos por MMR (Maximal Marginal Relevance) sobre os
+    vetores retornados pelo Qdrant, equilibrando o score de cada trecho com
+    a diversidade em relação aos já escolhidos. Trechos quase idênticos a
+    um já escolhido são descartados. A seleção para quando o orçamento de
+    tokens se esgota, truncando o último trecho se ainda houver espaço útil.
+    No contexto final, os trechos de uma mesma portaria ficam agrupados sob
+    um único cabeçalho, na ordem em que aparecem no documento.
+    """
+
+    def __init__(self, token_budget=6000, mmr_lambda=0.7, dedup_threshold=0.97, chars_per_token=4.0):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.dedup_threshold = dedup_threshold
+        self.chars_per_token = chars_per_token
+
+    @property
+    def version(self):
+        """Identifica a configuração, para invalidar respostas geradas com outro contexto."""
+        return (
+            f"{CONTEXT_FORMAT_VERSION}:{self.token_budget}:{self.mmr_lambda}:"
+            f"{self.dedup_threshold}:{self.chars_per_token}"
+        )
+
+    def estimate_tokens(self, text):
+        return int(len(text) / self.chars_per_token) + 1
+
+    def _similarity_matrix(self, found_docs):
+        """Matriz de similaridade de cosseno entre os pontos, ou None se faltarem vetores."""
+        vectors = [doc.vector for doc in found_docs]
+        if any(v is None or isinstance(v, dict) for v in vectors):
+            return None
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        return matrix @ matrix.T
+
+    def _select_order(self, found_docs, similarities, stats):
+        """Produz os índices dos pontos na ordem do MMR, pulando quase duplicatas."""
+        relevance = np.asarray([doc.score or 0.0 for doc in found_docs], dtype=np.float32)
+        remaining = list(range(len(found_docs)))
+        selected = []
+        seen_hashes = set()
+
+        while remaining:
+            if similarities is None or not selected:
+                best = max(remaining, key=lambda i: relevance[i])
+                redundancy = 0.0
+            else:
+                candidates = np.asarray(remaining)
+                redundancy_all = similarities[np.ix_(candidates, selected)].max(axis=1)
+                scores = self.mmr_lambda * relevance[candidates] - (1 - self.mmr_lambda) * redundancy_all
+                position = int(np.argmax(scores))
+                best = int(candidates[position])
+                redundancy = float(redundancy_all[position])
+            remaining.remove(best)
+
+            content = found_docs[best].payload.get('page_content', '')
+            content_hash = hashlib.sha1(" ".join(content.split()).lower().encode('utf-8')).hexdigest()
+            if redundancy >= self.dedup_threshold or content_hash in seen_hashes:
+                stats["duplicates"] += 1
+                continue
+            seen_hashes.add(content_hash)
+            selected.append(best)
+            yield best
+
+    def build(self, found_docs):
+        """
+        Retorna (contexto, fontes, estatísticas).
+
+        As fontes seguem a ordem em que cada portaria entrou no contexto e não se repetem.
+        """
+        stats = {
+            "candidates": len(found_docs),
+            "duplicates": 0,
+            "selected": 0,
+            "truncated": 0,
+            "skipped_budget": 0,
+            "tokens": 0,
+            "budget": self.token_budget,
+        }
+        groups = {}
+        used_tokens = 0
+
+        for index in self._select_order(found_docs, self._similarity_matrix(found_docs), stats):
+            payload = found_docs[index].payload
+            content = payload.get('page_content', '')
+            source_filename = payload['source']
+            # O cabeçalho e o separador de uma portaria contam uma única vez.
+            header = '' if source_filename in groups else _header(payload) + GROUP_END
+            entry_tokens = self.estimate_tokens(header + _passage(payload, content))
+            available = self.token_budget - used_tokens
+
+            if entry_tokens > available:
+                overhead = self.estimate_tokens(header + _passage(payload, ''))
+                if available - overhead < MIN_TRUNCATED_TOKENS:
+                    stats["skipped_budget"] += 1
+                    continue
+                # Desconta o marcador de truncamento e o arredondamento da estimativa.
+                max_chars = int((available - overhead - 3) * self.chars_per_token)
+                content = content[:max_chars].rstrip() + ' [...]'
+                entry_tokens = self.estimate_tokens(header + _passage(payload, content))
+                stats["truncated"] += 1
+
+            group = groups.setdefault(source_filename, {"payload": payload, "passages": []})
+            group["passages"].append((payload.get('chunk_index', 0), _passage(payload, content)))
+            used_tokens += entry_tokens
+            stats["selected"] += 1
+
+            if self.token_budget - used_tokens < MIN_TRUNCATED_TOKENS:
+                break
+
+        parts = []
+        sources = []
+        for source_filename, group in groups.items():
+            parts.append(_header(group["payload"]))
+            parts.extend(passage for _, passage in sorted(group["passages"], key=lambda p: p[0]))
+            parts.append(GROUP_END)
+            sources.append({
+                "id": os.path.splitext(source_filename)[0],
+                "title": group["payload"]['title']
+            })
+
+        stats["tokens"] = used_tokens
+        logger.info(
+            f"Contexto: {stats['selected']} de {stats['candidates']} trechos de {len(sources)} portarias, "
+            f"~{used_tokens}/{self.token_budget} tokens "
+            f"({stats['duplicates']} duplicados, {stats['truncated']} truncados, "
+            f"{stats['skipped_budget']} fora do orçamento)."
+        )
+        return "".join(parts), sources, stats
@@ -0,0 +1,285 @@
+import os
+import json
+import mmap
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Incrementar quando o layout mudar; um índice de outra versão é ignorado.
+STORE_FORMAT_VERSION = 1
+INDEX_FILE = "index.json"
+
+
+class StoredDocument:
+    """Um documento do `DocumentStore`: metadados do índice e acesso ao texto sob demanda."""
+
+    def __init__(self, doc_id, entry, data, separator_length=1):
+        self.doc_id = doc_id
+        self.entry = entry
+        self._data = data
+        self._separator_length = separator_length
+
+    @property
+    def title(self):
+        return self.entry.get('title')
+
+    @property
+    def year(self):
+        return self.entry.get('year')
+
+    @property
+    def source(self):
+        return self.entry.get('source')
+
+    @property
+    def etag(self):
+        return self.entry['etag']
+
+    @property
+    def page_count(self):
+        return len(self.entry['pages'])
+
+    def text(self):
+        """Texto completo, com as páginas separadas pelo separador da extração."""
+        offset = self.entry['offset']
+        return bytes(self._data[offset:offset + self.entry['length']]).decode('utf-8')
+
+    def page(self, number):
+        """Texto da página `number` (a partir de 1), lendo só os bytes dela; None se não existir."""
+        pages = self.entry['pages']
+        if not 1 <= number <= len(pages):
+            return None
+        start = self.entry['offset'] + pages[number - 1]
+        end = self.entry['offset'] + (pages[number] - self._separator_length if number < len(pages) else self.entry['length'])
+        return bytes(self._data[start:end]).decode('utf-8')
+
+
+class DocumentStore:
+    """
+    Textos extraídos dos PDFs em um único arquivo de dados só de acréscimo
+    (`documents.<geração>.dat`, UTF-8) e um índice JSON (`index.json`) com
+    a posição, o tamanho, o início de cada página e os metadados de cada
+    documento, no volume compartilhado entre o ingestor e a API.
+
+    A ingestão grava com `put`/`delete` e publica com `commit`, que regrava
+    o índice de uma só vez (`os.replace`); um documento alterado é
+    acrescentado ao fim do arquivo, e o espaço das versões antigas é
+    recuperado por `compact`, que grava uma nova geração do arquivo. A API
+    abre o armazenamento somente para leitura (`readonly=True`), com o
+    arquivo de dados mapeado em memória, e o recarrega quando o índice muda.
+    """
+
+    def __init__(self, directory, readonly=False, page_separator='\f'):
+        self.directory = directory
+        self.readonly = readonly
+        self.page_separator = page_separator
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._index = None
+        self._index_stamp = None
+        self._data = None
+        self._data_file = None
+        self._append = None
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+            self._index = self._read_index() or self._empty_index()
+            self._open_for_append()
+
+    @staticmethod
+    def _empty_index():
+        return {"format": STORE_FORMAT_VERSION, "generation": 0, "size": 0, "garbage": 0, "documents": {}}
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        if index.get('format') != STORE_FORMAT_VERSION:
+            logger.warning("Armazenamento de documentos de formato antigo; ele será recriado.")
+            return None
+        return index
+
+    def _data_path(self, generation):
+        return os.path.join(self.directory, f"documents.{generation}.dat")
+
+    def _open_for_append(self):
+        path = self._data_path(self._index['generation'])
+        self._append = open(path, 'ab')
+        # Dados acrescentados depois do último `commit` (ex.: execução interrompida) são descartados.
+        if self._append.tell() > self._index['size']:
+            self._append.truncate(self._index['size'])
+            self._append.seek(self._index['size'])
+
+    # --- Escrita (ingestão) ---
+
+    def put(self, doc_id, text, **metadata):
+        """
+        Grava o texto de um documento com os seus metadados (título, ano,
+        origem...). Um texto idêntico ao já gravado não é acrescentado de novo.
+        Retorna a entrada do índice.
+        """
+        encoded = text.encode('utf-8')
+        etag = hashlib.sha256(encoded).hexdigest()[:20]
+        with self._lock:
+            documents = self._index['documents']
+            current = documents.get(doc_id)
+            if current is not None and current['etag'] == etag:
+                current.update(metadata)
+                return current
+            separator = self.page_separator.encode('utf-8')
+            pages = [0]
+            position = encoded.find(separator)
+            while position != -1:
+                pages.append(position + len(separator))
+                position = encoded.find(separator, position + len(separator))
+            offset = self._append.tell()
+            self._append.write(encoded)
+            if current is not None:
+                self._index['garbage'] += current['length']
+            entry = documents[doc_id] = {
+                **metadata, "offset": offset, "length": len(encoded), "pages": pages, "etag": etag
+            }
+            return entry
+
+    def delete(self, doc_id):
+        with self._lock:
+            entry = self._index['documents'].pop(doc_id, None)
+            if entry is not None:
+                self._index['garbage'] += entry['length']
+            return entry is not None
+
+    def commit(self):
+        """Garante os dados em disco e publica o índice atualizado."""
+        with self._lock:
+            self._append.flush()
+            os.fsync(self._append.fileno())
+            self._index['size'] = self._append.tell()
+            self._write_index(self._index)
+
+    def _write_index(self, index):
+        building = self.index_path + '.building'
+        with open(building, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(building, self.index_path)
+
+    def compact(self, min_garbage_ratio=0.5):
+        """
+        Regrava só as versões atuais dos documentos em uma nova geração do
+        arquivo de dados, se o espaço ocupado por versões antigas passar de
+        `min_garbage_ratio`. A geração anterior é apagada; leitores que ainda
+        a têm mapeada continuam válidos até recarregarem o índice, e um leitor
+        que leu o índice antigo sem chegar a abrir os dados relê o índice.
+        """
+        self.commit()
+        with self._lock:
+            size, garbage = self._index['size'], self._index['garbage']
+            if not size or garbage / size < min_garbage_ratio:
+                return False
+            old_generation = self._index['generation']
+            index = {**self._index, "generation": old_generation + 1, "garbage": 0, "documents": {}}
+            with open(self._data_path(old_generation), 'rb') as source, \
+                    open(self._data_path(index['generation']), 'wb') as target:
+                for doc_id, entry in self._index['documents'].items():
+                    source.seek(entry['offset'])
+                    index['documents'][doc_id] = {**entry, "offset": target.tell()}
+                    target.write(source.read(entry['length']))
+                target.flush()
+                os.fsync(target.fileno())
+                index['size'] = target.tell()
+            self._write_index(index)
+            self._append.close()
+            self._index = index
+            self._open_for_append()
+            os.remove(self._data_path(old_generation))
+        logger.info(f"Armazenamento de documentos compactado: {garbage} bytes de versões antigas liberados.")
+        return True
+
+    def close(self):
+        if self._append is not None:
+            self._append.close()
+            self._append = None
+
+    # --- Leitura ---
+
+    def _snapshot(self):
+        """(índice, dados) atuais; na leitura, recarrega o índice e remapeia os dados quando mudam."""
+        if not self.readonly:
+            with self._lock:
+                self._append.flush()
+                path = self._data_path(self._index['generation'])
+                if self._data_file != path:
+                    self._data = _FileReader(path)
+                    self._data_file = path
+                return self._index, self._data
+
+        for attempt in range(2):
+            try:
+                stat = os.stat(self.index_path)
+            except FileNotFoundError:
+                return None, None
+            stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if stamp == self._index_stamp:
+                break
+            with self._lock:
+                if stamp == self._index_stamp:
+                    break
+                index = self._read_index()
+                try:
+                    data = self._map_data(index)
+                except FileNotFoundError:
+                    # Uma compactação publicou outro índice e apagou a geração
+                    # citada no índice lido: relê o índice (uma vez).
+                    if attempt:
+                        raise
+                    logger.info("Geração de dados substituída durante a leitura; relendo o índice.")
+                    continue
+                self._index, self._data, self._index_stamp = index, data, stamp
+                break
+        return self._index, self._data
+
+    def _map_data(self, index):
+        if index is None or not index['size']:
+            return None
+        with open(self._data_path(index['generation']), 'rb') as f:
+            return mmap.mmap(f.fileno(), index['size'], access=mmap.ACCESS_READ)
+
+    def get(self, doc_id):
+        """O `StoredDocument` de `doc_id`, ou None se ele não estiver no armazenamento."""
+        index, data = self._snapshot()
+        if index is None:
+            return None
+        entry = index['documents'].get(doc_id)
+        if entry is None:
+            return None
+        return StoredDocument(doc_id, entry, data if entry['length'] else b"", len(self.page_separator.encode('utf-8')))
+
+    def __contains__(self, doc_id):
+        index, _ = self._snapshot()
+        return index is not None and doc_id in index['documents']
+
+    def ids(self):
+        index, _ = self._snapshot()
+        return list(index['documents']) if index else []
+
+    def __len__(self):
+        index, _ = self._snapshot()
+        return len(index['documents']) if index else 0
+
+
+class _FileReader:
+    """Leitura por posição do arquivo de dados durante a escrita (ainda sem `commit`)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDONLY)
+
+    def __getitem__(self, item):
+        return os.pread(self._fd, item.stop - item.start, item.start)
+
+    def __del__(self):
+        os.close(self._fd)
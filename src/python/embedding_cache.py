@@ -0,0 +1,357 @@
+import os
+import re
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Incrementar invalida todas as entradas persistidas (ex.: mudança na normalização).
+CACHE_FORMAT_VERSION = 1
+
+
+def normalize_query(text: str) -> str:
+    """Normaliza o texto para a chave do cache: sem acentos, minúsculo e com espaços colapsados."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    without_accents = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', without_accents).strip().casefold()
+
+
+class LRUCache:
+    """Cache LRU em memória, seguro para threads."""
+
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteVectorStore:
+    """
+    Camada persistente do cache, compartilhada entre processos (workers do
+    gunicorn) por meio de um arquivo SQLite em modo WAL.
+
+    Os vetores são gravados como float32. O número de entradas é limitado a
+    `max_entries`; ao ultrapassá-lo, as menos usadas recentemente são removidas.
+    """
+
+    # Intervalo mínimo (s) entre atualizações de `last_used` de uma mesma
+    # entrada, para que leituras não virem escritas a cada acerto.
+    TOUCH_INTERVAL = 300
+    EVICT_EVERY = 100
+
+    def __init__(self, path, max_entries=50000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._puts = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors (last_used)")
+
+    def _connection(self):
+        # Uma conexão por thread e por processo: conexões não sobrevivem a um fork.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute("SELECT vector, last_used FROM vectors WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > self.TOUCH_INTERVAL:
+            conn.execute("UPDATE vectors SET last_used = ? WHERE key = ?", (now, key))
+        return array('f', row[0]).tolist()
+
+    def put(self, key, vector):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO vectors (key, vector, last_used) VALUES (?, ?, ?)",
+            (key, array('f', vector).tobytes(), time.time())
+        )
+        self._puts += 1
+        if self._puts % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def recent(self, limit):
+        """As `limit` entradas usadas mais recentemente, como pares (chave, vetor)."""
+        rows = self._connection().execute(
+            "SELECT key, vector FROM vectors ORDER BY last_used DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [(key, array('f', blob).tolist()) for key, blob in rows]
+
+    def evict(self):
+        """Remove as entradas menos usadas até sobrar 90% de `max_entries`."""
+        conn = self._connection()
+        count = conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        excess = count - int(self.max_entries * 0.9)
+        if count > self.max_entries and excess > 0:
+            conn.execute(
+                "DELETE FROM vectors WHERE key IN (SELECT key FROM vectors ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            logger.info(f"Cache de embeddings: {excess} entradas antigas removidas.")
+
+
+class CachedEmbeddings:
+    """
+    Camada de cache na frente de `embed_query` de um modelo de embeddings do LangChain.
+
+    A chave combina o nome do modelo, o tipo de tarefa e o texto normalizado,
+    de modo que trocar o modelo em `langchain_gemini.py` invalida o cache.
+    Consulta primeiro o LRU em memória e depois, se configurada, a camada
+    persistente compartilhada entre workers. `embed_queries` faz o mesmo
+    para várias consultas, vetorizando as ausentes do cache em uma única
+    chamada; `aembed_query` e `aembed_queries` são as versões assíncronas,
+    usadas pela API ASGI, que acessam a camada persistente (SQLite) em uma
+    thread, fora do event loop. `embed_documents` não é cacheado e é repassado ao
+    modelo.
+    """
+
+    def __init__(self, model, maxsize=2048, persistent_path=None, max_persistent_entries=50000):
+        self.model = model
+        self.namespace = "|".join([
+            str(CACHE_FORMAT_VERSION),
+            str(getattr(model, 'model', type(model).__name__)),
+            str(getattr(model, 'task_type', None)),
+        ])
+        self.memory = LRUCache(maxsize)
+        self.persistent = None
+        if persistent_path:
+            try:
+                self.persistent = SQLiteVectorStore(persistent_path, max_persistent_entries)
+            except sqlite3.Error as e:
+                logger.warning(f"Cache persistente de embeddings indisponível ({e}). Usando só memória.")
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "persistent_hits": 0, "misses": 0}
+
+    def _key(self, text):
+        normalized = normalize_query(text)
+        return hashlib.sha256(f"{self.namespace}|{normalized}".encode('utf-8')).hexdigest()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _persistent_get(self, key):
+        try:
+            return self.persistent.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Falha ao ler o cache persistente de embeddings: {e}")
+            return None
+
+    def _persistent_put(self, key, vector):
+        try:
+            self.persistent.put(key, vector)
+        except sqlite3.Error as e:
+            logger.warning(f"Falha ao gravar no cache persistente de embeddings: {e}")
+
+    def _memory_get(self, key):
+        vector = self.memory.get(key)
+        if vector is not None:
+            self._count("memory_hits")
+        return vector
+
+    def _persistent_lookup(self, key):
+        """Vetor da camada persistente (copiado para o LRU), ou None. Faz I/O: fora do event loop na API ASGI."""
+        vector = self._persistent_get(key)
+        if vector is not None:
+            self._count("persistent_hits")
+            self.memory.put(key, vector)
+        return vector
+
+    def _cached(self, key):
+        vector = self._memory_get(key)
+        if vector is None and self.persistent is not None:
+            vector = self._persistent_lookup(key)
+        return vector
+
+    async def _acached(self, key):
+        # Só o LRU é consultado no event loop; o SQLite (com o seu tempo de
+        # espera por bloqueio) roda em uma thread.
+        vector = self._memory_get(key)
+        if vector is None and self.persistent is not None:
+            vector = await asyncio.to_thread(self._persistent_lookup, key)
+        return vector
+
+    def _store(self, key, vector):
+        self.memory.put(key, vector)
+        if self.persistent is not None:
+            self._persistent_put(key, vector)
+
+    async def _astore(self, key, vector):
+        self.memory.put(key, vector)
+        if self.persistent is not None:
+            await asyncio.to_thread(self._persistent_put, key, vector)
+
+    def embed_query(self, text):
+        key = self._key(text)
+        vector = self._cached(key)
+        if vector is not None:
+            return vector
+
+        self._count("misses")
+        vector = self.model.embed_query(text.strip())
+        self._store(key, vector)
+        return vector
+
+    async def aembed_query(self, text):
+        key = self._key(text)
+        vector = await self._acached(key)
+        if vector is not None:
+            return vector
+
+        self._count("misses")
+        vector = await self.model.aembed_query(text.strip())
+        await self._astore(key, vector)
+        return vector
+
+    def _lookup_memory(self, texts):
+        """Chaves das consultas, vetores no LRU e textos ausentes dele (por chave, sem repetições)."""
+        keys = [self._key(text) for text in texts]
+        vectors = {}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in missing:
+                continue
+            vector = self._memory_get(key)
+            if vector is not None:
+                vectors[key] = vector
+            else:
+                missing[key] = text.strip()
+        return keys, vectors, missing
+
+    def _lookup_persistent(self, vectors, missing):
+        """Move de `missing` para `vectors` as consultas encontradas na camada persistente."""
+        for key in list(missing):
+            vector = self._persistent_lookup(key)
+            if vector is not None:
+                vectors[key] = vector
+                del missing[key]
+
+    def _count_misses(self, missing):
+        if missing:
+            with self._lock:
+                self.counters["misses"] += len(missing)
+
+    def _lookup_many(self, texts):
+        """Chaves das consultas, vetores já em cache e textos ausentes (por chave, sem repetições)."""
+        keys, vectors, missing = self._lookup_memory(texts)
+        if missing and self.persistent is not None:
+            self._lookup_persistent(vectors, missing)
+        self._count_misses(missing)
+        return keys, vectors, missing
+
+    async def _alookup_many(self, texts):
+        keys, vectors, missing = self._lookup_memory(texts)
+        if missing and self.persistent is not None:
+            await asyncio.to_thread(self._lookup_persistent, vectors, missing)
+        self._count_misses(missing)
+        return keys, vectors, missing
+
+    def _store_memory(self, vectors, missing, embedded):
+        items = list(zip(missing, embedded))
+        for key, vector in items:
+            self.memory.put(key, vector)
+            vectors[key] = vector
+        return items
+
+    def _persistent_put_many(self, items):
+        for key, vector in items:
+            self._persistent_put(key, vector)
+
+    def _store_many(self, vectors, missing, embedded):
+        items = self._store_memory(vectors, missing, embedded)
+        if self.persistent is not None:
+            self._persistent_put_many(items)
+
+    async def _astore_many(self, vectors, missing, embedded):
+        items = self._store_memory(vectors, missing, embedded)
+        if self.persistent is not None:
+            await asyncio.to_thread(self._persistent_put_many, items)
+
+    def embed_queries(self, texts):
+        """
+        Vetores de várias consultas, na mesma ordem. As que não estão no
+        cache (sem repetições) são vetorizadas em uma só chamada a
+        `embed_documents`; o modelo usa o mesmo `task_type` nas duas rotas.
+        """
+        keys, vectors, missing = self._lookup_many(texts)
+        if missing:
+            self._store_many(vectors, missing, self.model.embed_documents(list(missing.values())))
+        return [vectors[key] for key in keys]
+
+    async def aembed_queries(self, texts):
+        keys, vectors, missing = await self._alookup_many(texts)
+        if missing:
+            await self._astore_many(vectors, missing, await self.model.aembed_documents(list(missing.values())))
+        return [vectors[key] for key in keys]
+
+    def embed_documents(self, texts, *args, **kwargs):
+        return self.model.embed_documents(texts, *args, **kwargs)
+
+    def preload(self, limit):
+        """
+        Carrega no LRU em memória os `limit` vetores usados mais recentemente
+        no cache persistente (as consultas frequentes, vistas pelos outros
+        workers ou antes de um reinício). Retorna quantos foram carregados.
+        """
+        if self.persistent is None or limit <= 0:
+            return 0
+        try:
+            rows = self.persistent.recent(min(limit, self.memory.maxsize))
+        except sqlite3.Error as e:
+            logger.warning(f"Falha ao ler o cache persistente de embeddings: {e}")
+            return 0
+        # Do menos ao mais recente, para que os mais recentes fiquem no fim do LRU.
+        for key, vector in reversed(rows):
+            self.memory.put(key, vector)
+        return len(rows)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = sum(stats.values())
+        stats["memory_entries"] = len(self.memory)
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["persistent_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,201 @@
+import time
+import random
+import hashlib
+import logging
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from embedding_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Trechos da mensagem de erro que indicam limite de taxa/cota da API.
+RATE_LIMIT_MARKERS = ('429', 'resource_exhausted', 'resource exhausted', 'quota', 'rate limit')
+
+
+def is_rate_limit_error(error):
+    message = str(error).lower()
+    return any(marker in message for marker in RATE_LIMIT_MARKERS)
+
+
+class TokenBucket:
+    """
+    Limitador de taxa por balde de fichas: até `rate` chamadas por segundo,
+    com rajadas de até `capacity`. `pause` esvazia o balde e bloqueia novas
+    chamadas por alguns segundos (ex.: após um erro de limite de taxa).
+    Com `rate` <= 0, não limita.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class AdaptiveBatchSize:
+    """
+    Tamanho de lote ajustado por AIMD: cresce `step` textos a cada chamada
+    abaixo da latência alvo e cai pela metade quando uma chamada passa dela
+    ou falha, sempre entre `minimum` e `maximum`.
+    """
+
+    def __init__(self, minimum, maximum, target_latency, step=None):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.target_latency = target_latency
+        self.step = step or self.minimum
+        self.value = self.maximum
+        self._lock = threading.Lock()
+
+    def on_success(self, latency):
+        with self._lock:
+            if latency > self.target_latency:
+                self.value = max(self.minimum, self.value // 2)
+            else:
+                self.value = min(self.maximum, self.value + self.step)
+
+    def on_failure(self):
+        with self._lock:
+            self.value = max(self.minimum, self.value // 2)
+
+
+class EmbeddingClient:
+    """
+    Cliente de vetorização de documentos da ingestão, sobre o modelo de
+    embeddings do LangChain (`langchain_gemini.embed_model`).
+
+    Cada chamada de `embed` divide os textos em lotes de tamanho adaptativo
+    (`AdaptiveBatchSize`) e os envia ao modelo em paralelo, até
+    `max_concurrency` por vez, respeitando o `TokenBucket` de requisições por
+    minuto. Um lote que falha é repetido até `max_retries` vezes, com espera
+    exponencial e aleatória; em erros de limite de taxa, o balde é pausado
+    para todas as threads. Textos idênticos (pelo sha256 do conteúdo) são
+    vetorizados uma única vez enquanto estiverem no LRU de `cache_size`
+    entradas (guardadas em float32, ~3 KB cada com 768 dimensões).
+    """
+
+    def __init__(self, model, requests_per_minute=600, max_concurrency=4, min_batch_size=8, max_batch_size=100,
+                 target_latency=10.0, max_retries=5, backoff_base=1.0, backoff_max=60.0, cache_size=20000):
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.bucket = TokenBucket(requests_per_minute / 60.0, capacity=max_concurrency)
+        self.batch_size = AdaptiveBatchSize(min_batch_size, max_batch_size, target_latency)
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="embedding")
+        self.cache = LRUCache(cache_size)
+        self._lock = threading.Lock()
+        self.counters = {
+            "requests": 0, "retries": 0, "rate_limited": 0,
+            "embedded": 0, "deduplicated": 0, "failed": 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def embed(self, texts):
+        """
+        Vetoriza `texts`. Retorna (vetores, erros) na mesma ordem: para os
+        textos que não puderam ser vetorizados, o vetor é None e o erro traz
+        a mensagem da última tentativa.
+        """
+        keys = [hashlib.sha256(text.encode('utf-8')).hexdigest() for text in texts]
+        vectors = {}
+        unique = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in unique:
+                self._count("deduplicated")
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._count("deduplicated")
+                vectors[key] = list(cached)
+            else:
+                unique[key] = text
+
+        errors = {}
+        items = list(unique.items())
+        futures = []
+        start = 0
+        while start < len(items):
+            size = self.batch_size.value
+            futures.append(self.executor.submit(self._embed_batch, items[start:start + size]))
+            start += size
+        for future in futures:
+            batch, batch_vectors, error = future.result()
+            for (key, _), vector in zip(batch, batch_vectors or [None] * len(batch)):
+                if vector is None:
+                    errors[key] = error
+                else:
+                    vectors[key] = vector
+
+        return [vectors.get(key) for key in keys], [errors.get(key) for key in keys]
+
+    def _backoff(self, attempt):
+        """Espera antes da próxima tentativa: metade fixa e metade aleatória do limite exponencial."""
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def _embed_batch(self, batch):
+        texts = [text for _, text in batch]
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self._count("requests")
+            started = time.monotonic()
+            try:
+                vectors = self.model.embed_documents(texts)
+                if len(vectors) != len(texts):
+                    raise ValueError(f"{len(vectors)} vetores para {len(texts)} textos")
+            except Exception as e:
+                self.batch_size.on_failure()
+                if attempt == self.max_retries:
+                    logger.error(f"Falha ao vetorizar um lote de {len(texts)} textos após {attempt + 1} tentativas: {e}")
+                    self._count("failed", len(texts))
+                    return batch, None, str(e)
+                delay = self._backoff(attempt)
+                if is_rate_limit_error(e):
+                    self._count("rate_limited")
+                    self.bucket.pause(delay)
+                self._count("retries")
+                logger.warning(
+                    f"Erro ao vetorizar um lote de {len(texts)} textos (tentativa {attempt + 1}): {e}. "
+                    f"Nova tentativa em {delay:.1f}s."
+                )
+                time.sleep(delay)
+                continue
+
+            self.batch_size.on_success(time.monotonic() - started)
+            for (key, _), vector in zip(batch, vectors):
+                self.cache.put(key, array('f', vector))
+            self._count("embedded", len(texts))
+            return batch, vectors, None
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "batch_size": self.batch_size.value}
@@ -0,0 +1,142 @@
+import re
+import time
+import random
+import asyncio
+import hashlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Substitutos locais e determinísticos dos modelos do Gemini (e do
+# Tesseract), para medir o desempenho sem chave de API nem rede. São
+# escolhidos por MODEL_BACKEND=fake e OCR_BACKEND=fake (ver
+# langchain_gemini.py e ocr_engine.get_engine), com latência configurável.
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def _stable_hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Embeddings por hashing das palavras (e pares de palavras) do texto, em
+    `dim` dimensões e normalizados: textos com palavras em comum ficam
+    próximos, como nos embeddings reais, e o mesmo texto sempre dá o mesmo
+    vetor. Cada chamada espera `latency` segundos mais `latency_per_text`
+    por texto.
+    """
+
+    def __init__(self, dim=768, latency=0.0, latency_per_text=0.0, model="fake-embedding"):
+        self.dim = dim
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+        self.model = model
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = _TOKEN_PATTERN.findall(text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = _stable_hash(feature)
+            vector[h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if not norm:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def _delay(self, count):
+        return self.latency + self.latency_per_text * count
+
+    def embed_documents(self, texts, *args, **kwargs):
+        time.sleep(self._delay(len(texts)))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text, *args, **kwargs):
+        time.sleep(self._delay(1))
+        return self._vector(text)
+
+    async def aembed_documents(self, texts, *args, **kwargs):
+        await asyncio.sleep(self._delay(len(texts)))
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text, *args, **kwargs):
+        await asyncio.sleep(self._delay(1))
+        return self._vector(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Modelo de chat que responde com um texto fixo citando a primeira
+    portaria do contexto, em `answer_words` palavras. O primeiro token sai
+    após `latency` segundos e cada um dos seguintes após `token_latency`.
+    """
+
+    model: str = "fake-chat"
+    latency: float = 0.0
+    token_latency: float = 0.0
+    answer_words: int = 60
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _tokens(self, messages):
+        prompt = "\n".join(str(message.content) for message in messages)
+        sources = re.findall(r'[\w\-.]+\.pdf', prompt)
+        question = re.search(r'Pergunta do Usuário:\**\s*(.+)', prompt)
+        words = f"Com base nas portarias fornecidas, sobre {question.group(1).strip() if question else 'a pergunta'}:".split()
+        rng = random.Random(_stable_hash(prompt))
+        filler = "o documento trata do assunto indicado conforme o ato publicado pelo órgão".split()
+        while len(words) < self.answer_words:
+            words.append(rng.choice(filler))
+        words.append(f"[Fonte: {sources[0]}]" if sources else "[Fonte: nenhuma]")
+        return [word + " " for word in words[:-1]] + [words[-1]]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        time.sleep(self.latency + self.token_latency * (len(tokens) - 1))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency + self.token_latency * (len(tokens) - 1))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        for index, token in enumerate(self._tokens(messages)):
+            if index:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for index, token in enumerate(self._tokens(messages)):
+            if index:
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class FakeOcrWorker:
+    """
+    OCR simulado: espera `latency` segundos por imagem e devolve o texto de
+    uma portaria sintética escolhida pelo hash da imagem (mesma imagem,
+    mesmo texto), com a mesma interface do `TesserocrWorker`.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def recognize(self, image):
+        from synthetic_portarias import portaria_text
+        time.sleep(self.latency)
+        rng = random.Random(hashlib.blake2b(image.tobytes(), digest_size=8).hexdigest())
+        _, _, _, pages = portaria_text(rng.randint(1, 300), rng.randint(2018, 2024), rng)
+        return pages[0]
+
+    def close(self):
+        pass
@@ -0,0 +1,56 @@
+import os
+import uuid
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class IndexVersion:
+    """
+    Token de versão do índice, gravado em um arquivo do volume compartilhado
+    entre o ingestor e a API.
+
+    A ingestão chama `bump()` sempre que altera a coleção; a API lê o token
+    com `current()` (que só relê o arquivo quando a data de modificação muda)
+    para descartar caches derivados do índice antigo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._token = None
+
+    def current(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return "none"
+        with self._lock:
+            if mtime != self._mtime:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self._token = f.read().strip() or "none"
+                    self._mtime = mtime
+                except OSError:
+                    return self._token or "none"
+            return self._token
+
+    def bump(self):
+        """Grava um novo token de forma atômica e o retorna."""
+        token = uuid.uuid4().hex
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.index_version-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(token)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logger.info(f"Versão do índice atualizada: {token}")
+        return token
@@ -0,0 +1,177 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Estados possíveis de uma entrada do manifesto.
+STATUS_EXTRACTED = "extracted"   # Texto extraído, ainda não vetorizado/enviado ao Qdrant.
+STATUS_EMBEDDED = "embedded"     # Ponto gravado com sucesso no Qdrant.
+STATUS_REJECTED = "rejected"     # Descartado na extração (vazio, idioma, corrompido).
+
+# Ações decididas para um PDF encontrado em uma execução.
+ACTION_EXTRACT = "extract"       # Extrair (e OCR, se preciso) e vetorizar.
+ACTION_REUSE = "reuse"           # Reaproveitar a extração e só vetorizar.
+
+MANIFEST_VERSION = 2
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Calcula o sha256 do conteúdo de um arquivo lendo-o em blocos."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """
+    Manifesto persistente da ingestão, indexado pelo sha256 de cada PDF.
+
+    Cada entrada guarda o nome do arquivo de origem, o resultado da extração
+    (título, ano, arquivo de texto, número de trechos), o estado da
+    vetorização e, indiretamente, os ids dos pontos no Qdrant (um por trecho). Permite que uma nova execução processe apenas arquivos novos
+    ou alterados e remova os pontos de arquivos que deixaram de existir.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # As etapas do pipeline de ingestão atualizam o manifesto em threads diferentes.
+        self._lock = threading.RLock()
+        self.entries = {}
+        # Coleção física do Qdrant à qual os estados de vetorização se referem.
+        self.collection = None
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            logger.info(f"Manifesto não encontrado em '{self.path}'. Iniciando um novo.")
+            self.entries = {}
+            self.collection = None
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != MANIFEST_VERSION:
+                logger.warning("Versão do manifesto incompatível. Ele será reconstruído.")
+                self.entries = {}
+                self.collection = None
+            else:
+                self.entries = data.get('files', {})
+                self.collection = data.get('collection')
+        except (OSError, ValueError) as e:
+            logger.error(f"Manifesto ilegível em '{self.path}' ({e}). Ele será reconstruído.")
+            self.entries = {}
+            self.collection = None
+
+    def save(self):
+        """Grava o manifesto de forma atômica (arquivo temporário + rename)."""
+        with self._lock:
+            data = json.dumps(
+                {'version': MANIFEST_VERSION, 'collection': self.collection, 'files': self.entries},
+                ensure_ascii=False, indent=1
+            )
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.manifest-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, sha256):
+        with self._lock:
+            entry = self.entries.get(sha256)
+            return dict(entry) if entry else None
+
+    def set(self, sha256, **fields):
+        with self._lock:
+            entry = self.entries.setdefault(sha256, {})
+            entry.update(fields)
+            return dict(entry)
+
+    def remove(self, sha256):
+        with self._lock:
+            return self.entries.pop(sha256, None)
+
+    def embedded_count(self):
+        """Número de pontos (trechos) que devem estar gravados no Qdrant."""
+        with self._lock:
+            return sum(entry.get('chunks', 0) for entry in self.entries.values() if entry.get('status') == STATUS_EMBEDDED)
+
+    def reset_embeddings(self, collection=None):
+        """Marca todas as entradas vetorizadas como pendentes (ex.: coleção nova)."""
+        with self._lock:
+            self.collection = collection
+            for entry in self.entries.values():
+                if entry.get('status') == STATUS_EMBEDDED:
+                    entry['status'] = STATUS_EXTRACTED
+
+    def source_index(self):
+        """Retorna {arquivo de origem: (sha256, entrada)}."""
+        with self._lock:
+            return {
+                entry['source']: (sha, entry)
+                for sha, entry in self.entries.items()
+                if entry.get('source')
+            }
+
+    def hash_file(self, pdf_dir, filename, source_index):
+        """
+        Retorna o sha256 de um PDF.
+
+        Reaproveita o hash gravado quando tamanho e data de modificação não
+        mudaram, evitando reler PDFs grandes a cada execução.
+        """
+        path = os.path.join(pdf_dir, filename)
+        stat = os.stat(path)
+        sha, entry = source_index.get(filename, (None, None))
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+            return sha
+        return file_sha256(path)
+
+    def classify(self, pdf_dir, filename, sha, claimed):
+        """
+        Decide o que fazer com um PDF encontrado nesta execução.
+
+        Retorna None quando o arquivo já está em dia (vetorizado ou rejeitado)
+        ou é uma duplicata de outro PDF, ACTION_REUSE quando a extração já
+        existe e só falta a vetorização, e ACTION_EXTRACT nos demais casos.
+        `claimed` ({sha256: arquivo}) acumula os conteúdos já vistos na execução.
+        """
+        entry = self.get(sha)
+        if entry and entry.get('source') != filename and os.path.exists(os.path.join(pdf_dir, entry['source'])):
+            # O PDF já registrado com esse conteúdo continua sendo o indexado.
+            claimed.setdefault(sha, entry['source'])
+
+        owner = claimed.setdefault(sha, filename)
+        if owner != filename:
+            logger.info(f"'{filename}' tem o mesmo conteúdo de '{owner}' e será ignorado.")
+            return None
+
+        if not entry or entry.get('source') != filename:
+            return ACTION_EXTRACT
+        if entry.get('status') in (STATUS_EMBEDDED, STATUS_REJECTED):
+            return None
+        if entry.get('status') == STATUS_EXTRACTED:
+            return ACTION_REUSE
+        return ACTION_EXTRACT
+
+    def stale(self, current_hashes):
+        """
+        Lista os sha256 cujas entradas não correspondem mais a um PDF em disco
+        (arquivo removido, alterado ou renomeado).
+        """
+        with self._lock:
+            return [
+                sha for sha, entry in self.entries.items()
+                if current_hashes.get(entry.get('source')) != sha
+            ]
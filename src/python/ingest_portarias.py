@@ -1,16 +1,33 @@
 import os
+import json
 import logging
 import uuid
+import time
 from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from qdrant_client import QdrantClient, models
 from qdrant_client.http.models import PointStruct, UpdateStatus
 
-from pdf_downloader import download_pdfs_first_page
-from pdf_processor import process_single_pdf
+from pdf_downloader import iter_pdfs
+from pdf_processor import ExtractionPool, REJECTION_KINDS
+from portaria_text import PAGE_SEPARATOR, make_snippet
 from langchain_gemini import embed_model
+from embedding_client import EmbeddingClient
+from ingest_manifest import (
+    IngestManifest, STATUS_EXTRACTED, STATUS_EMBEDDED, STATUS_REJECTED, ACTION_REUSE
+)
+from pipeline import Pipeline
+from index_version import IndexVersion
+from lexical_index import LexicalIndex, remove_index
+from query_planner import DOC_TYPES, document_metadata, METADATA_VERSION
+from vector_store import LocalVectorStore, VectorStoreWriter
+from collection_profiles import CollectionProfile
+from document_store import DocumentStore
+from metrics import metrics, LOG_FORMAT, install_request_id_logging
 from settings import settings
 
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+install_request_id_logging()
 logger = logging.getLogger(__name__)
 
 class IngestPortarias:
@@ -21,110 +38,805 @@ class IngestPortarias:
             url=settings.QDRANT_URL,
             timeout=60.0
         )
-        self.collection_name = settings.QDRANT_COLLECTION
+        # `QDRANT_COLLECTION` é o alias consultado pela rag_api; os dados ficam
+        # em coleções versionadas (`<alias>_v<timestamp>`) apontadas por ele.
+        self.alias_name = settings.QDRANT_COLLECTION
+        self.collection_name = None
+        # Quantização, armazenamento em disco e HNSW das coleções (QDRANT_PROFILE).
+        self.collection_profile = CollectionProfile.from_settings(settings)
         self.NAMESPACE_UUID = uuid.UUID('f8a72360-63f3-b747-b811-ba59d2d65dd9')
         
         os.makedirs(self.pdf_dir, exist_ok=True)
         os.makedirs(self.text_dir, exist_ok=True)
 
-    def _setup_qdrant_collection(self):
-        """Garante que a coleção exista com os parâmetros corretos."""
-        self.qdrant_client.recreate_collection(
-            collection_name=self.collection_name,
-            vectors_config=models.VectorParams(
-                size=768,
-                distance=models.Distance.COSINE
+        self.index_version = IndexVersion(settings.INDEX_VERSION_PATH)
+        self.extraction_pool = ExtractionPool(
+            max_workers=settings.EXTRACTION_WORKERS or None,
+            timeout=settings.EXTRACTION_TIMEOUT,
+            max_tasks_per_child=settings.EXTRACTION_MAX_TASKS_PER_CHILD
+        )
+        self.manifest = IngestManifest(settings.INGEST_MANIFEST_PATH or os.path.join(self.pdf_dir, 'manifest.json'))
+        self.embedding_client = EmbeddingClient(
+            embed_model,
+            requests_per_minute=settings.EMBED_REQUESTS_PER_MINUTE,
+            max_concurrency=settings.EMBED_CONCURRENCY,
+            min_batch_size=settings.EMBED_MIN_BATCH_SIZE,
+            max_batch_size=settings.EMBED_BATCH_SIZE,
+            target_latency=settings.EMBED_TARGET_LATENCY,
+            max_retries=settings.EMBED_MAX_RETRIES,
+            backoff_base=settings.EMBED_BACKOFF_BASE,
+            backoff_max=settings.EMBED_BACKOFF_MAX,
+            cache_size=settings.EMBED_DEDUP_CACHE_SIZE
+        )
+        metrics.register_collector("ingest_embedding", self.embedding_client.stats, "Cliente de embeddings da ingestão.")
+        # Trechos que não puderam ser vetorizados, repetidos ao final da
+        # execução; os que falharem de novo são gravados neste arquivo.
+        self.embedding_failures_path = settings.EMBED_FAILURES_PATH or os.path.join(self.pdf_dir, 'embedding_failures.jsonl')
+        self.failed_chunks = []
+        # Trechos ainda não gravados de cada documento (sha256), durante `_sync`.
+        self.remaining_chunks = {}
+        # Índice lexical (BM25) que acompanha `collection_name`; definido em `run_ingestion`.
+        self.lexical_index = None
+        # Cópia local dos vetores da coleção em produção, para restaurá-la sem revetorizar.
+        self.vector_store = LocalVectorStore(settings.VECTOR_STORE_PATH)
+        # Textos extraídos, lidos pela rag_api no /document e reaproveitados
+        # aqui quando o PDF não mudou; publicados a cada DOCUMENT_STORE_COMMIT_EVERY.
+        self.documents = DocumentStore(settings.DOCUMENT_STORE_PATH, page_separator=PAGE_SEPARATOR)
+        self.uncommitted_documents = 0
+        self._migrate_text_files()
+        # Trechos sobrepostos, cortados de preferência nas quebras de página e de parágrafo.
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=settings.CHUNK_SIZE,
+            chunk_overlap=settings.CHUNK_OVERLAP,
+            separators=[PAGE_SEPARATOR, "\n\n", "\n", ". ", " ", ""],
+            add_start_index=True
+        )
+
+    def _chunk_id(self, source, index):
+        return str(uuid.uuid5(self.NAMESPACE_UUID, f"{source}#{index}"))
+
+    def _entry_point_ids(self, entry):
+        """Ids dos pontos gravados para uma entrada do manifesto (um por trecho)."""
+        return [self._chunk_id(entry['source'], index) for index in range(entry.get('chunks', 0))]
+
+    # Campos do payload usados em filtros e agrupamentos, indexados no Qdrant.
+    PAYLOAD_INDEXES = {
+        "source": models.PayloadSchemaType.KEYWORD,
+        "doc_types": models.PayloadSchemaType.KEYWORD,
+        "year": models.PayloadSchemaType.INTEGER,
+        "month": models.PayloadSchemaType.INTEGER,
+        "number": models.PayloadSchemaType.INTEGER,
+    }
+
+    def _setup_qdrant_collection(self, collection_name):
+        """Cria uma coleção física vazia com os parâmetros do perfil configurado."""
+        self.qdrant_client.create_collection(
+            collection_name=collection_name,
+            **self.collection_profile.create_params(settings.EMBEDDING_DIM)
+        )
+        self._ensure_payload_indexes(collection_name)
+        logger.info(f"Coleção '{collection_name}' criada com o perfil {self.collection_profile}.")
+
+    def _ensure_payload_indexes(self, collection_name):
+        """Cria os índices de payload que faltarem (coleções criadas antes deles existirem)."""
+        existing = self.qdrant_client.get_collection(collection_name).payload_schema or {}
+        for field_name, schema in self.PAYLOAD_INDEXES.items():
+            if field_name not in existing:
+                self.qdrant_client.create_payload_index(
+                    collection_name=collection_name, field_name=field_name, field_schema=schema, wait=True
+                )
+                logger.info(f"Índice de payload '{field_name}' criado em '{collection_name}'.")
+
+    def _versioned_collection_name(self):
+        return f"{self.alias_name}_v{time.strftime('%Y%m%d%H%M%S')}"
+
+    def _resolve_live_collection(self):
+        """
+        Retorna a coleção física que atende as consultas hoje.
+
+        Normalmente é a coleção apontada pelo alias `QDRANT_COLLECTION`. Em
+        instalações antigas, pode ser uma coleção física com esse mesmo nome.
+        Retorna None se nenhuma das duas existir.
+        """
+        for alias in self.qdrant_client.get_aliases().aliases:
+            if alias.alias_name == self.alias_name:
+                return alias.collection_name
+        if self.qdrant_client.collection_exists(self.alias_name):
+            return self.alias_name
+        return None
+
+    def _swap_alias(self, new_collection, previous_collection):
+        """Aponta o alias para a nova coleção em uma única operação atômica."""
+        operations = []
+        if previous_collection == self.alias_name:
+            # Migração: uma coleção física ocupa o nome do alias e precisa ser
+            # removida antes que o alias possa ser criado.
+            logger.warning(f"Removendo a coleção legada '{self.alias_name}' para criar o alias.")
+            self.qdrant_client.delete_collection(self.alias_name)
+        elif previous_collection:
+            operations.append(models.DeleteAliasOperation(
+                delete_alias=models.DeleteAlias(alias_name=self.alias_name)
+            ))
+        operations.append(models.CreateAliasOperation(
+            create_alias=models.CreateAlias(collection_name=new_collection, alias_name=self.alias_name)
+        ))
+        self.qdrant_client.update_collection_aliases(change_aliases_operations=operations)
+        logger.info(f"Alias '{self.alias_name}' agora aponta para '{new_collection}'.")
+
+    def _validate_collection(self, collection_name, previous_collection):
+        """
+        Verifica uma coleção reconstruída antes de colocá-la em produção.
+
+        Confere a contagem de pontos contra o manifesto e contra a coleção
+        anterior, se cada ponto amostrado recupera a si mesmo como primeiro
+        resultado e se as consultas de amostra configuradas retornam algo.
+        """
+        count = self.qdrant_client.count(collection_name=collection_name, exact=True).count
+        expected = self.manifest.embedded_count()
+        if count == 0 or count < expected:
+            logger.error(f"Validação falhou: {count} pontos na coleção, {expected} esperados pelo manifesto.")
+            return False
+
+        if previous_collection:
+            previous_count = self.qdrant_client.count(collection_name=previous_collection, exact=True).count
+            if count < previous_count * settings.REBUILD_MIN_POINT_RATIO:
+                logger.error(
+                    f"Validação falhou: {count} pontos contra {previous_count} na coleção atual "
+                    f"(mínimo de {settings.REBUILD_MIN_POINT_RATIO:.0%})."
+                )
+                return False
+
+        sample, _ = self.qdrant_client.scroll(
+            collection_name=collection_name,
+            limit=settings.REBUILD_SAMPLE_SIZE,
+            with_vectors=True,
+            with_payload=False
+        )
+        for point in sample:
+            hits = self.qdrant_client.search(
+                collection_name=collection_name, query_vector=point.vector, limit=1,
+                search_params=self.collection_profile.search_params()
+            )
+            # Textos idênticos geram vetores idênticos; nesse caso vale o empate no score.
+            if not hits or (hits[0].id != point.id and hits[0].score < 0.9999):
+                logger.error(f"Validação falhou: o ponto {point.id} não recupera a si mesmo.")
+                return False
+
+        for query in settings.REBUILD_SAMPLE_QUERIES:
+            hits = self.qdrant_client.search(
+                collection_name=collection_name,
+                query_vector=embed_model.embed_query(query),
+                limit=1,
+                search_params=self.collection_profile.search_params()
+            )
+            if not hits:
+                logger.error(f"Validação falhou: a consulta de amostra '{query}' não retornou resultados.")
+                return False
+
+        logger.info(f"Coleção '{collection_name}' validada com {count} pontos.")
+        return True
+
+    def _gc_old_versions(self, live_collection):
+        """Apaga versões antigas da coleção, mantendo as `QDRANT_KEEP_VERSIONS` mais recentes."""
+        prefix = f"{self.alias_name}_v"
+        versions = sorted(
+            (c.name for c in self.qdrant_client.get_collections().collections
+             if c.name.startswith(prefix) and c.name != live_collection),
+            reverse=True
+        )
+        for name in versions[settings.QDRANT_KEEP_VERSIONS:]:
+            logger.info(f"Removendo versão antiga da coleção: '{name}'.")
+            self.qdrant_client.delete_collection(name)
+
+    def _remove_stale_entries(self, stale_hashes):
+        """Remove do Qdrant e do manifesto os PDFs que foram apagados ou alterados."""
+        stale_set = set(stale_hashes)
+        # Um PDF alterado mantém o nome e, portanto, os ids dos seus trechos,
+        # que já foram regravados com o novo conteúdo nesta execução e não
+        # podem ser apagados; só sobram os trechos além do novo total.
+        live_ids = {
+            point_id
+            for sha, entry in self.manifest.source_index().values()
+            if sha not in stale_set
+            for point_id in self._entry_point_ids(entry)
+        }
+        point_ids = [
+            point_id
+            for sha in stale_hashes
+            # Inclui documentos pendentes, que podem ter parte dos trechos gravada.
+            for point_id in self._entry_point_ids(self.manifest.get(sha))
+            if point_id not in live_ids
+        ]
+        if point_ids:
+            logger.info(f"Removendo {len(point_ids)} trechos de arquivos removidos ou alterados.")
+            self.qdrant_client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(points=point_ids),
+                wait=True
+            )
+            self.lexical_index.delete_points(point_ids)
+        for sha in stale_hashes:
+            entry = self.manifest.remove(sha)
+            # O texto extraído só é apagado se o PDF deixou de existir; se ele
+            # apenas mudou, o texto será substituído no reprocessamento.
+            if entry.get('source') and not os.path.exists(os.path.join(self.pdf_dir, entry['source'])):
+                self.documents.delete(self._document_id(entry['source']))
+        self.manifest.save()
+        return len(point_ids)
+
+    def _rebuild_lexical_index(self, collection_name):
+        """Reconstrói o índice lexical a partir dos payloads da coleção, sem revetorizar nada."""
+        building = LexicalIndex.create(settings.LEXICAL_INDEX_PATH + '.building', collection_name)
+        offset = None
+        while True:
+            points, offset = self.qdrant_client.scroll(
+                collection_name=collection_name, limit=256, offset=offset, with_payload=True, with_vectors=False
+            )
+            building.upsert_chunks(self._lexical_row(point.id, point.payload) for point in points)
+            if offset is None:
+                break
+        logger.info(f"Índice lexical reconstruído a partir de '{collection_name}' com {building.count()} trechos.")
+        return building.publish(settings.LEXICAL_INDEX_PATH)
+
+    def _export_vector_store(self, collection_name):
+        """
+        Regrava a cópia local dos vetores (`LocalVectorStore`) a partir da
+        coleção. O cabeçalho guarda a coleção, o modelo de embeddings e o
+        sha256 de cada documento gravado, usados na restauração.
+        """
+        if not settings.VECTOR_STORE_PATH:
+            return 0
+        writer = VectorStoreWriter(settings.VECTOR_STORE_PATH, settings.VECTOR_STORE_DTYPE, doc_types=sorted(DOC_TYPES))
+        try:
+            offset = None
+            while True:
+                points, offset = self.qdrant_client.scroll(
+                    collection_name=collection_name, limit=256, offset=offset, with_payload=True, with_vectors=True
+                )
+                for point in points:
+                    writer.add(point.id, point.vector, point.payload)
+                if offset is None:
+                    break
+        except Exception:
+            writer.close()
+            raise
+        documents = {
+            source: sha for source, (sha, entry) in self.manifest.source_index().items()
+            if entry.get('status') == STATUS_EMBEDDED
+        }
+        count = writer.publish(
+            collection=collection_name, model=getattr(embed_model, 'model', ''), documents=documents
+        )
+        logger.info(f"Cópia local dos vetores gravada com {count} trechos em '{settings.VECTOR_STORE_PATH}'.")
+        return count
+
+    def _refresh_vector_store(self, collection_name, changed):
+        """Regrava a cópia local se a coleção mudou ou se ela reflete outra coleção."""
+        if not settings.VECTOR_STORE_PATH:
+            return
+        try:
+            metadata = self.vector_store.metadata()
+            if changed or not metadata or metadata.get('collection') != collection_name:
+                self._export_vector_store(collection_name)
+        except Exception as e:
+            # A cópia local é secundária: uma falha não invalida a ingestão.
+            logger.error(f"Erro ao gravar a cópia local dos vetores: {e}")
+
+    def _restore_from_vector_store(self, live_collection):
+        """
+        Recria a coleção a partir da cópia local dos vetores, sem revetorizar
+        nada (ex.: volume do Qdrant perdido). Só vale se a cópia foi gravada
+        a partir da coleção descrita pelo manifesto e com o mesmo modelo de
+        embeddings. Documentos cujo sha256 mudou desde a cópia continuam
+        pendentes e são vetorizados pela sincronização seguinte. A nova
+        coleção é validada antes de assumir o alias; retorna o nome dela, ou
+        None se não houve restauração.
+        """
+        try:
+            metadata = self.vector_store.metadata()
+        except (OSError, ValueError) as e:
+            logger.error(f"Cópia local dos vetores ilegível: {e}")
+            return None
+        if not metadata or not metadata['count'] or metadata.get('collection') != self.manifest.collection:
+            return None
+        if metadata.get('model') != getattr(embed_model, 'model', ''):
+            logger.warning("A cópia local dos vetores foi gerada por outro modelo de embeddings; ela não será usada.")
+            return None
+
+        collection_name = self._versioned_collection_name()
+        logger.info(f"Restaurando {metadata['count']} trechos da cópia local dos vetores em '{collection_name}'.")
+        self._setup_qdrant_collection(collection_name)
+        for batch in self.vector_store.iter_points(settings.UPSERT_BATCH_SIZE):
+            self.qdrant_client.upsert(
+                collection_name=collection_name,
+                points=[PointStruct(id=point_id, vector=vector, payload=payload) for point_id, vector, payload in batch],
+                wait=True
+            )
+
+        documents = metadata.get('documents') or {}
+        self.manifest.reset_embeddings(collection_name)
+        for source, (sha, entry) in self.manifest.source_index().items():
+            if documents.get(source) == sha and entry.get('status') == STATUS_EXTRACTED:
+                self.manifest.set(sha, status=STATUS_EMBEDDED)
+        self.manifest.save()
+
+        if not self._validate_collection(collection_name, live_collection):
+            logger.error(f"A coleção restaurada '{collection_name}' não passou na validação e será descartada.")
+            self.qdrant_client.delete_collection(collection_name)
+            return None
+        self._swap_alias(collection_name, live_collection)
+        self.index_version.bump()
+        self._gc_old_versions(collection_name)
+        return collection_name
+
+    @staticmethod
+    def _lexical_row(point_id, payload):
+        return {
+            "point_id": str(point_id),
+            "source": payload['source'],
+            "title": payload.get('title'),
+            "year": payload.get('year'),
+            "month": payload.get('month'),
+            "number": payload.get('number'),
+            "doc_types": payload.get('doc_types'),
+            "page": payload.get('page'),
+            "chunk_index": payload.get('chunk_index'),
+            "text": payload.get('page_content', ''),
+        }
+
+    def _backfill_metadata(self):
+        """
+        Atualiza, sem revetorizar, os metadados de filtragem (número, mês,
+        tipos) dos documentos indexados com outra `METADATA_VERSION`.
+        """
+        updated = 0
+        for sha, entry in self.manifest.source_index().values():
+            if entry.get('status') != STATUS_EMBEDDED or entry.get('metadata_version') == METADATA_VERSION:
+                continue
+            doc = self._load_document(entry['source'])
+            if doc is None:
+                continue
+            metadata = {key: doc.metadata[key] for key in ('number', 'month', 'doc_types')}
+            self.qdrant_client.set_payload(
+                collection_name=self.collection_name,
+                payload=metadata,
+                points=models.Filter(must=[
+                    models.FieldCondition(key="source", match=models.MatchValue(value=entry['source']))
+                ]),
+                wait=True
+            )
+            self.lexical_index.update_metadata(entry['source'], **metadata)
+            self.manifest.set(sha, metadata_version=METADATA_VERSION)
+            updated += 1
+        if updated:
+            self.manifest.save()
+            logger.info(f"Metadados de filtragem atualizados em {updated} documentos.")
+        return updated
+
+    def _backfill_snippets(self):
+        """Grava o campo `snippet` nos pontos indexados antes de ele existir."""
+        missing = models.Filter(must=[models.IsEmptyCondition(is_empty=models.PayloadField(key="snippet"))])
+        updated = 0
+        while True:
+            # Os pontos atualizados deixam de satisfazer o filtro; basta reler o início.
+            points, _ = self.qdrant_client.scroll(
+                collection_name=self.collection_name, scroll_filter=missing, limit=256,
+                with_payload=["page_content"], with_vectors=False
+            )
+            if not points:
+                break
+            self.qdrant_client.batch_update_points(
+                collection_name=self.collection_name,
+                update_operations=[
+                    models.SetPayloadOperation(set_payload=models.SetPayload(
+                        payload={"snippet": make_snippet(point.payload.get('page_content', ''))},
+                        points=[point.id]
+                    ))
+                    for point in points
+                ],
+                wait=True
             )
+            updated += len(points)
+        if updated:
+            logger.info(f"Resumo da busca gravado em {updated} trechos indexados.")
+        return updated
+
+    def _record_extraction(self, sha, doc, chunk_count):
+        filename = doc.metadata['source']
+        stat = os.stat(os.path.join(self.pdf_dir, filename))
+        self.manifest.set(
+            sha, source=filename, size=stat.st_size, mtime=stat.st_mtime,
+            title=doc.metadata['title'], year=doc.metadata['year'],
+            pages=doc.page_content.count(PAGE_SEPARATOR) + 1,
+            chunks=chunk_count, metadata_version=METADATA_VERSION, status=STATUS_EXTRACTED
+        )
+
+    def _split_document(self, doc):
+        """
+        Divide o documento em trechos sobrepostos.
+
+        Cada trecho leva os metadados do documento, a página em que começa,
+        a posição (em caracteres) no texto extraído, o resumo exibido na
+        busca e o seu índice, que determina o id do ponto no Qdrant.
+        """
+        chunks = self.text_splitter.split_documents([doc])
+        for index, chunk in enumerate(chunks):
+            start = chunk.metadata['start_index']
+            chunk.metadata['chunk_index'] = index
+            chunk.metadata['page'] = doc.page_content.count(PAGE_SEPARATOR, 0, start) + 1
+            chunk.page_content = chunk.page_content.replace(PAGE_SEPARATOR, "\n\n")
+            # Pré-calculado para que a busca não precise trazer o texto inteiro do Qdrant.
+            chunk.metadata['snippet'] = make_snippet(chunk.page_content)
+        return chunks
+
+    @staticmethod
+    def _document_id(filename):
+        """Id do documento no `DocumentStore` (e no /document): o nome do PDF sem a extensão."""
+        return os.path.splitext(filename)[0]
+
+    def _make_document(self, filename, title, year, content):
+        return Document(
+            page_content=content,
+            metadata={
+                "source": filename,
+                "title": title,
+                "year": year,  # Adiciona o ano aos metadados
+                # Número, mês e tipos da portaria, usados nos filtros de busca.
+                **document_metadata(title, content)
+            }
         )
-        logger.info(f"Coleção '{self.collection_name}' garantidamente criada com a configuração correta.")
+
+    def _load_document(self, filename):
+        """Monta o Document a partir do texto guardado no `DocumentStore`, ou None se não houver."""
+        stored = self.documents.get(self._document_id(filename))
+        if stored is None:
+            return None
+        # As páginas continuam separadas por PAGE_SEPARATOR.
+        return self._make_document(filename, stored.title, stored.year, stored.text())
+
+    def _store_document(self, filename, result):
+        """Guarda o texto extraído de um PDF e monta o Document dele, sem reler nada do disco."""
+        self.documents.put(
+            self._document_id(filename), result['text'], title=result['title'], year=result['year'], source=filename
+        )
+        self.uncommitted_documents += 1
+        if self.uncommitted_documents >= settings.DOCUMENT_STORE_COMMIT_EVERY:
+            self._commit_documents()
+        return self._make_document(filename, result['title'], result['year'], result['text'])
+
+    def _commit_documents(self):
+        self.documents.commit()
+        self.uncommitted_documents = 0
+
+    def _migrate_text_files(self):
+        """
+        Importa para o `DocumentStore` os arquivos .txt gravados pelas versões
+        anteriores da extração (linhas "Title:", "Year:" e "Text:") e os apaga.
+        """
+        migrated = 0
+        for name in sorted(os.listdir(self.text_dir)):
+            if not name.endswith('.txt'):
+                continue
+            path = os.path.join(self.text_dir, name)
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+            if len(lines) >= 3 and lines[0].startswith('Title: ') and lines[1].startswith('Year: '):
+                title = lines[0].replace('Title: ', '').strip()
+                year_str = lines[1].replace('Year: ', '').strip()
+                year = int(year_str) if year_str != 'None' else None
+                content = "".join(lines[2:]).replace('Text: ', '', 1).strip()
+                stem = os.path.splitext(name)[0]
+                self.documents.put(stem, content, title=title, year=year, source=stem + '.pdf')
+                migrated += 1
+            os.remove(path)
+        if migrated:
+            self._commit_documents()
+            logger.info(f"{migrated} textos extraídos migrados para o armazenamento de documentos.")
 
 
-    def run_ingestion(self):
+    def run_ingestion(self, full_rebuild=False):
+        """
+        Executa a ingestão.
+
+        No modo incremental, apenas PDFs novos ou alterados (segundo o
+        manifesto de sha256) são extraídos e vetorizados na coleção em
+        produção, e pontos de PDFs removidos são apagados. Com
+        `full_rebuild=True`, tudo é vetorizado em uma nova coleção versionada,
+        que só passa a atender as consultas (troca atômica do alias) depois
+        de validada; a coleção anterior continua servindo durante todo o processo.
+        Se a coleção em produção sumiu ou não é a do manifesto, ela é antes
+        restaurada da cópia local dos vetores, quando possível.
+        """
         logger.info("Iniciando o processo de ingestão de portarias.")
         
+        live_collection = self._resolve_live_collection()
+
+        if not full_rebuild and self.manifest.collection != live_collection:
+            # Coleção perdida ou diferente da descrita pelo manifesto: tenta
+            # restaurá-la da cópia local antes de revetorizar tudo.
+            live_collection = self._restore_from_vector_store(live_collection) or live_collection
+
+        if not full_rebuild and live_collection:
+            if self.manifest.collection == live_collection:
+                self.collection_name = live_collection
+                self._ensure_payload_indexes(live_collection)
+                self.collection_profile.apply(self.qdrant_client, live_collection)
+                self.lexical_index = LexicalIndex(settings.LEXICAL_INDEX_PATH)
+                metadata_changed = self._backfill_metadata()
+                snippets_changed = self._backfill_snippets()
+                if self.lexical_index.collection() != live_collection:
+                    self.lexical_index = self._rebuild_lexical_index(live_collection)
+                report = self._sync()
+                changed = report["stages"]["upsert"]["items"] or report["replayed"] or report["removed"] or metadata_changed
+                self._refresh_vector_store(live_collection, changed or snippets_changed)
+                if changed:
+                    # Invalida os caches da API derivados do conteúdo anterior.
+                    self.index_version.bump()
+                return report
+            # O manifesto descreve outra coleção (ex.: reconstrução que falhou,
+            # manifesto de formato antigo): não há como saber quais pontos da
+            # coleção atual ainda valem, então ela é reconstruída por inteiro.
+            logger.info(f"Manifesto não corresponde à coleção '{live_collection}'. Reconstruindo a coleção.")
+
+        self.collection_name = self._versioned_collection_name()
+        self._setup_qdrant_collection(self.collection_name)
+        self.manifest.reset_embeddings(self.collection_name)
+        # O índice lexical da nova coleção é montado à parte e publicado junto com o alias.
+        self.lexical_index = LexicalIndex.create(settings.LEXICAL_INDEX_PATH + '.building', self.collection_name)
+        report = self._sync()
+
+        if not self._validate_collection(self.collection_name, live_collection):
+            logger.error(f"A coleção '{self.collection_name}' não passou na validação e será descartada.")
+            self.qdrant_client.delete_collection(self.collection_name)
+            self.lexical_index.close()
+            remove_index(self.lexical_index.path)
+            raise RuntimeError("Reconstrução da coleção abortada: validação falhou.")
+
+        self._swap_alias(self.collection_name, live_collection)
+        self.lexical_index = self.lexical_index.publish(settings.LEXICAL_INDEX_PATH)
+        self._refresh_vector_store(self.collection_name, True)
+        self.index_version.bump()
+        self._gc_old_versions(self.collection_name)
+        logger.info("Reconstrução concluída sem interrupção das consultas.")
+        return report
+
+    def _iter_pdf_files(self):
+        """Baixa os PDFs do portal e produz cada arquivo local assim que fica disponível."""
         logger.info("Baixando PDFs do portal...")
-        download_pdfs_first_page(
-            url=settings.MPC_PORTARIAS_URL,
-            output_dir=self.pdf_dir
-        )
-        
-        pdf_files = [f for f in os.listdir(self.pdf_dir) if f.endswith('.pdf')]
-        if not pdf_files:
-            logger.warning("Nenhum PDF novo encontrado. Finalizando a ingestão.")
-            return
+        seen = set()
+        try:
+            for filename in iter_pdfs(
+                settings.MPC_PORTARIAS_URL,
+                self.pdf_dir,
+                max_pages=settings.CRAWL_MAX_PAGES,
+                max_workers=settings.DOWNLOAD_WORKERS,
+                per_host=settings.DOWNLOAD_PER_HOST,
+                stop_on_known=settings.CRAWL_STOP_ON_KNOWN
+            ):
+                seen.add(filename)
+                yield filename
+        except Exception as e:
+            logger.error(f"Erro no download dos PDFs: {e}")
+        # PDFs baixados em execuções anteriores que não estão mais na listagem.
+        for filename in sorted(os.listdir(self.pdf_dir)):
+            if filename.endswith('.pdf') and filename not in seen:
+                yield filename
 
-        self._setup_qdrant_collection()
-
-        all_documents = []
-        for filename in pdf_files:
-            pdf_path = os.path.join(self.pdf_dir, filename)
-            logger.info(f"Processando: {filename}")
-            
-            result = process_single_pdf(pdf_path, self.text_dir)
-            
-            if result and result.get('title') != 'Error':
-                text_file_path = os.path.join(self.text_dir, os.path.splitext(filename)[0] + '.txt')
-                if os.path.exists(text_file_path):
-                    with open(text_file_path, 'r', encoding='utf-8') as f:
-                        lines = f.readlines()
-                        
-                        # Extrai metadados do arquivo .txt
-                        title = lines[0].replace('Title: ', '').strip()
-                        year_str = lines[1].replace('Year: ', '').strip()
-                        year = int(year_str) if year_str != 'None' else None
-                        content = "".join(lines[2:]).replace('Text: ', '').strip()
-
-                    doc = Document(
-                        page_content=content,
-                        metadata={
-                            "source": filename,
-                            "title": title,
-                            "year": year  # Adiciona o ano aos metadados
-                        }
-                    )
-                    all_documents.append(doc)
+    def _emit_chunks(self, sha, doc, emit):
+        chunks = self._split_document(doc)
+        metrics.histogram("ingest_document_chunks", "Trechos por documento.").observe(len(chunks))
+        self._record_extraction(sha, doc, len(chunks))
+        for chunk in chunks:
+            emit((sha, chunk, len(chunks)))
 
-        if not all_documents:
-            logger.warning("Nenhum documento válido para vetorizar.")
-            return
+    def _extract_stage(self, items, emit):
+        """
+        Etapa de extração: reaproveita textos já extraídos ou envia o PDF ao
+        pool de processos, e envia cada trecho do documento à vetorização.
+        """
+        pending = {}
 
-        batch_size = 100
-        total_docs = len(all_documents)
-        logger.info(f"Iniciando vetorização e upload de {total_docs} documentos em lotes de {batch_size}.")
-
-        for i in range(0, total_docs, batch_size):
-            batch_docs = all_documents[i:i + batch_size]
-            logger.info(f"Processando lote {i//batch_size + 1}/{(total_docs + batch_size - 1)//batch_size}")
-
-            contents_to_embed = [doc.page_content for doc in batch_docs]
-            
-            try:
-                embeddings = embed_model.embed_documents(contents_to_embed)
-                
-                points_to_upsert = []
-                for idx, doc in enumerate(batch_docs):
-                    payload = doc.metadata.copy()
-                    payload['page_content'] = doc.page_content
-
-                    point_id = str(uuid.uuid5(self.NAMESPACE_UUID, doc.metadata['source']))
-
-                    point = PointStruct(
-                        id=point_id,
-                        vector=embeddings[idx],
-                        payload=payload
+        def paths():
+            for filename, sha, action in items:
+                if action == ACTION_REUSE:
+                    doc = self._load_document(filename)
+                    if doc is not None:
+                        self._emit_chunks(sha, doc, emit)
+                        continue
+                pending[filename] = sha
+                yield os.path.join(self.pdf_dir, filename)
+
+        with self.extraction_pool as pool:
+            for pdf_path, result in pool.imap(paths()):
+                filename = os.path.basename(pdf_path)
+                sha = pending.pop(filename)
+
+                if not result or result.get('title') == 'Error':
+                    reason = (result or {}).get('reason')
+                    metrics.counter(
+                        "ingest_rejected_total", "PDFs descartados na extração, por motivo.",
+                        reason=REJECTION_KINDS.get(reason, "error")
+                    ).inc()
+                    stat = os.stat(pdf_path)
+                    self.manifest.set(
+                        sha, source=filename, size=stat.st_size, mtime=stat.st_mtime,
+                        status=STATUS_REJECTED, reason=reason
                     )
-                    points_to_upsert.append(point)
+                    continue
+                metrics.histogram(
+                    "ingest_stage_seconds", "Duração por item (ou lote) de cada etapa da ingestão.", stage="extraction"
+                ).observe(result['seconds'])
+                metrics.counter("ingest_pages_total", "Páginas extraídas.").inc(result['pages'])
+                metrics.counter("ingest_ocr_pages_total", "Páginas sem camada de texto, lidas pelo OCR.").inc(result['ocr_pages'])
+                self._emit_chunks(sha, self._store_document(filename, result), emit)
+
+    def _embed_stage(self, batches, emit):
+        """
+        Etapa de vetorização: gera os embeddings de cada lote de trechos pelo
+        `EmbeddingClient`. Trechos que falham são guardados para a repetição
+        ao final da execução (`_replay_failed_chunks`).
+        """
+        for batch in batches:
+            with metrics.span("ingest_stage", stage="embedding"):
+                vectors, errors = self.embedding_client.embed([chunk.page_content for _, chunk, _ in batch])
+            metrics.counter("ingest_embedding_failures_total", "Trechos que o modelo de embeddings não vetorizou.").inc(
+                sum(vector is None for vector in vectors)
+            )
+            for item, vector, error in zip(batch, vectors, errors):
+                if vector is None:
+                    self.failed_chunks.append((item, error))
+                    continue
+                emit((*item, vector))
+
+    def _upsert_stage(self, batches, emit):
+        """
+        Etapa de gravação: envia os trechos ao Qdrant e marca como vetorizado
+        no manifesto cada documento que teve todos os seus trechos gravados.
+        Um documento com algum trecho perdido continua pendente e é
+        revetorizado na próxima execução.
+        """
+        for batch in batches:
+            self._upsert_batch(batch, emit)
+
+    def _upsert_batch(self, batch, emit):
+        points_to_upsert = []
+        for _, chunk, _, vector in batch:
+            payload = chunk.metadata.copy()
+            payload['page_content'] = chunk.page_content
+            points_to_upsert.append(PointStruct(
+                id=self._chunk_id(chunk.metadata['source'], chunk.metadata['chunk_index']),
+                vector=vector,
+                payload=payload
+            ))
 
+        try:
+            with metrics.span("ingest_stage", stage="upsert"):
                 operation_info = self.qdrant_client.upsert(
                     collection_name=self.collection_name,
                     points=points_to_upsert,
                     wait=True
                 )
-                if operation_info.status != UpdateStatus.COMPLETED:
-                    logger.warning(f"O lote {i+1} pode não ter sido salvo corretamente. Status: {operation_info.status}")
+        except Exception as e:
+            logger.error(f"Erro ao gravar um lote de {len(batch)} trechos no Qdrant: {e}")
+            return
+        if operation_info.status != UpdateStatus.COMPLETED:
+            logger.warning(f"Um lote de {len(batch)} trechos pode não ter sido salvo corretamente. Status: {operation_info.status}")
+            return
+        self.lexical_index.upsert_chunks(
+            self._lexical_row(point.id, point.payload) for point in points_to_upsert
+        )
 
-            except Exception as e:
-                logger.error(f"Erro ao processar o lote de documentos {i+1}-{i+len(batch_docs)}: {e}")
-                continue
-        
-        logger.info("Processo de ingestão concluído com sucesso.")
\ No newline at end of file
+        remaining = self.remaining_chunks
+        completed = False
+        for sha, _, total, _ in batch:
+            remaining[sha] = remaining.get(sha, total) - 1
+            if remaining[sha] == 0:
+                del remaining[sha]
+                self.manifest.set(sha, status=STATUS_EMBEDDED)
+                emit(sha)
+                completed = True
+        if completed:
+            self.manifest.save()
+
+    def _replay_failed_chunks(self):
+        """
+        Repete a vetorização dos trechos que falharam no pipeline e grava os
+        que conseguir. Os que falharem de novo são registrados em
+        `embedding_failures_path` (um JSON por linha); os seus documentos
+        continuam pendentes no manifesto e voltam na próxima execução.
+        Retorna o número de documentos completados pela repetição.
+        """
+        failed, self.failed_chunks = self.failed_chunks, []
+        completed = []
+        if failed:
+            logger.warning(f"Repetindo a vetorização de {len(failed)} trechos que falharam.")
+            items = [item for item, _ in failed]
+            vectors, errors = self.embedding_client.embed([chunk.page_content for _, chunk, _ in items])
+            embedded = [(*item, vector) for item, vector in zip(items, vectors) if vector is not None]
+            for start in range(0, len(embedded), settings.UPSERT_BATCH_SIZE):
+                self._upsert_batch(embedded[start:start + settings.UPSERT_BATCH_SIZE], completed.append)
+            failed = [(item, error) for item, vector, error in zip(items, vectors, errors) if vector is None]
+
+        if failed:
+            logger.error(
+                f"{len(failed)} trechos continuam sem vetor; os documentos serão reprocessados na próxima execução. "
+                f"Detalhes em '{self.embedding_failures_path}'."
+            )
+            with open(self.embedding_failures_path, 'w', encoding='utf-8') as f:
+                for (sha, chunk, _), error in failed:
+                    f.write(json.dumps({
+                        "sha256": sha,
+                        "source": chunk.metadata['source'],
+                        "chunk_index": chunk.metadata['chunk_index'],
+                        "error": error,
+                    }, ensure_ascii=False) + "\n")
+        elif os.path.exists(self.embedding_failures_path):
+            os.remove(self.embedding_failures_path)
+        return len(completed)
+
+    def _sync(self):
+        """
+        Sincroniza `self.collection_name` com os PDFs do portal e do disco.
+
+        Download, extração, vetorização e gravação rodam como um pipeline
+        com filas limitadas: as etapas trabalham ao mesmo tempo e a memória
+        usada não cresce com o tamanho do acervo. Retorna o relatório de
+        vazão por etapa e profundidade das filas.
+        """
+        current_hashes = {}
+        claimed = {}
+        source_index = self.manifest.source_index()
+        self.remaining_chunks = {}
+        self.failed_chunks = []
+
+        def discover(emit):
+            for filename in self._iter_pdf_files():
+                if filename in current_hashes:
+                    continue
+                sha = self.manifest.hash_file(self.pdf_dir, filename, source_index)
+                current_hashes[filename] = sha
+                action = self.manifest.classify(self.pdf_dir, filename, sha, claimed)
+                if action:
+                    emit((filename, sha, action))
+
+        pipeline = Pipeline(report_interval=settings.PIPELINE_REPORT_INTERVAL)
+        to_extract = pipeline.add_queue("extração", settings.PIPELINE_QUEUE_SIZE)
+        to_embed = pipeline.add_queue("vetorização", settings.PIPELINE_QUEUE_SIZE)
+        to_upsert = pipeline.add_queue("upsert", settings.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("download", discover, outbox=to_extract)
+        pipeline.add_stage("extração", self._extract_stage, inbox=to_extract, outbox=to_embed)
+        pipeline.add_stage(
+            "vetorização", self._embed_stage, inbox=to_embed, outbox=to_upsert,
+            # Cada lote da etapa alimenta até EMBED_CONCURRENCY chamadas paralelas ao modelo.
+            batch_size=settings.EMBED_BATCH_SIZE * settings.EMBED_CONCURRENCY,
+            max_wait=settings.EMBED_BATCH_MAX_WAIT
+        )
+        pipeline.add_stage(
+            "upsert", self._upsert_stage, inbox=to_upsert,
+            batch_size=settings.UPSERT_BATCH_SIZE, max_wait=settings.EMBED_BATCH_MAX_WAIT
+        )
+        report = pipeline.run()
+        report["replayed"] = self._replay_failed_chunks()
+        report["embedding"] = self.embedding_client.stats()
+        logger.info(f"Vetorização: {report['embedding']}")
+
+        removed = 0
+        if not current_hashes:
+            # Sem nenhum PDF (ex.: volume vazio e portal fora do ar), nada é apagado.
+            logger.warning("Nenhum PDF encontrado. Finalizando a ingestão.")
+        else:
+            stale = self.manifest.stale(current_hashes)
+            if stale:
+                removed = self._remove_stale_entries(stale)
+        self._commit_documents()
+        self.documents.compact(settings.DOCUMENT_STORE_COMPACT_RATIO)
+        self.manifest.save()
+        report["removed"] = removed
+
+        stages = report["stages"]
+        logger.info(
+            f"Ingestão: {len(current_hashes)} PDFs verificados, {stages['download']['items']} enviados à extração, "
+            f"{stages['upsert']['items'] + report['replayed']} documentos gravados no Qdrant."
+        )
+        logger.info("Processo de ingestão concluído com sucesso.")
+        return report
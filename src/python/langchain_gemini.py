@@ -1,16 +1,55 @@
-# src/python/langchain_gemini.py
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
 from settings import settings
+from lazy_resource import LazyResource
 
-# A biblioteca irá procurar a variável de ambiente GOOGLE_API_KEY automaticamente
-embed_model = GoogleGenerativeAIEmbeddings(
-    model="models/embedding-001",
-    task_type="RETRIEVAL_DOCUMENT"
-)
-
-# O mesmo para o modelo de chat
-llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash",
-    temperature=0,
-    convert_system_message_to_human=True
-)
\ No newline at end of file
+# Os modelos são construídos no primeiro uso (LazyResource), e não na
+# importação: a biblioteca do Gemini só é carregada quando um deles é usado.
+# O nome do modelo e o tipo de tarefa ficam disponíveis antes disso (chaves
+# de cache, versão do prompt, manifesto da ingestão).
+
+if settings.MODEL_BACKEND == "fake":
+    EMBEDDING_MODEL, EMBEDDING_TASK_TYPE = "fake-embedding", None
+    CHAT_MODEL = "fake-chat"
+else:
+    EMBEDDING_MODEL, EMBEDDING_TASK_TYPE = "models/embedding-001", "RETRIEVAL_DOCUMENT"
+    CHAT_MODEL = "gemini-1.5-flash"
+
+
+def build_embed_model():
+    if settings.MODEL_BACKEND == "fake":
+        # Modelos locais e determinísticos (fake_models.py), para benchmarks e testes sem a API do Google.
+        from fake_models import FakeEmbeddings
+        return FakeEmbeddings(
+            dim=settings.EMBEDDING_DIM,
+            latency=settings.FAKE_EMBED_LATENCY,
+            latency_per_text=settings.FAKE_EMBED_LATENCY_PER_TEXT,
+            model=EMBEDDING_MODEL
+        )
+
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    # A biblioteca irá procurar a variável de ambiente GOOGLE_API_KEY automaticamente
+    return GoogleGenerativeAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        task_type=EMBEDDING_TASK_TYPE
+    )
+
+
+def build_llm():
+    if settings.MODEL_BACKEND == "fake":
+        from fake_models import FakeChatModel
+        return FakeChatModel(
+            model=CHAT_MODEL, latency=settings.FAKE_LLM_LATENCY, token_latency=settings.FAKE_LLM_TOKEN_LATENCY
+        )
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    # O mesmo para o modelo de chat
+    return ChatGoogleGenerativeAI(
+        model=CHAT_MODEL,
+        temperature=0,
+        convert_system_message_to_human=True
+    )
+
+
+embed_model = LazyResource(build_embed_model, "embed_model", model=EMBEDDING_MODEL, task_type=EMBEDDING_TASK_TYPE)
+llm = LazyResource(build_llm, "llm", model=CHAT_MODEL)
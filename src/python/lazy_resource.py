@@ -0,0 +1,76 @@
+import os
+import time
+import logging
+import threading
+import weakref
+
+logger = logging.getLogger(__name__)
+
+_resources = weakref.WeakSet()
+
+
+class LazyResource:
+    """
+    Objeto (cliente do Qdrant, modelo do Gemini...) construído por
+    `factory()` só no primeiro uso, e não na importação do módulo. Os
+    atributos e métodos são repassados a ele, então o `LazyResource` é usado
+    no lugar do objeto; `get()` devolve o próprio objeto.
+
+    É seguro com fork (workers do gunicorn com --preload): um objeto
+    construído no processo pai não é reaproveitado no filho, que constrói o
+    seu na primeira vez que o usar. `attributes` são atributos conhecidos
+    antes da construção (como o nome do modelo), respondidos sem construir
+    o objeto.
+    """
+
+    def __init__(self, factory, name=None, **attributes):
+        self._factory = factory
+        self._name = name or getattr(factory, '__name__', 'recurso')
+        self._attributes = attributes
+        self._lock = threading.Lock()
+        self._instance = None
+        self._pid = None
+        _resources.add(self)
+
+    def get(self):
+        instance = self._instance
+        if instance is not None and self._pid == os.getpid():
+            return instance
+        with self._lock:
+            if self._instance is None or self._pid != os.getpid():
+                started = time.perf_counter()
+                self._instance = self._factory()
+                self._pid = os.getpid()
+                logger.info(f"'{self._name}' inicializado em {time.perf_counter() - started:.3f}s.")
+            return self._instance
+
+    @property
+    def initialized(self):
+        return self._instance is not None and self._pid == os.getpid()
+
+    def reset(self):
+        """Descarta o objeto; o próximo uso constrói outro."""
+        with self._lock:
+            self._instance = None
+            self._pid = None
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in self._attributes:
+            return self._attributes[name]
+        return getattr(self.get(), name)
+
+    def __repr__(self):
+        state = "inicializado" if self.initialized else "não inicializado"
+        return f"<LazyResource {self._name} ({state})>"
+
+
+def _after_fork_in_child():
+    # Um lock mantido por outra thread no momento do fork nunca seria liberado no filho.
+    for resource in list(_resources):
+        resource._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
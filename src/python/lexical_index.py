@@ -0,0 +1,308 @@
+import os
+import re
+import sqlite3
+import logging
+import threading
+
+from embedding_cache import normalize_query
+from portaria_text import PORTARIA_PATTERN, PORTARIA_REFERENCE
+
+logger = logging.getLogger(__name__)
+
+# Incrementar quando o esquema mudar; um índice de outra versão é reconstruído.
+INDEX_FORMAT_VERSION = 2
+
+# Palavras muito frequentes que só tornariam a consulta lexical mais lenta.
+STOPWORDS = {
+    'a', 'o', 'as', 'os', 'de', 'da', 'do', 'das', 'dos', 'e', 'em', 'no', 'na', 'nos', 'nas',
+    'um', 'uma', 'para', 'por', 'com', 'que', 'se', 'ao', 'aos', 'qual', 'quais', 'sobre',
+}
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS chunks ("
+    " id INTEGER PRIMARY KEY, point_id TEXT NOT NULL UNIQUE, source TEXT NOT NULL,"
+    " title TEXT, year INTEGER, month INTEGER, number INTEGER, doc_types TEXT,"
+    " page INTEGER, chunk_index INTEGER, text TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source)",
+    "CREATE INDEX IF NOT EXISTS chunks_number ON chunks (number, year)",
+    # Índice invertido (FTS5) sobre o texto da tabela `chunks`, sem acentos.
+    "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5("
+    " text, content='chunks', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN"
+    " INSERT INTO chunks_fts (rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN"
+    " INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+]
+
+COLUMNS = "point_id, source, title, year, month, number, doc_types, page, chunk_index, text"
+
+
+def parse_portaria_reference(query: str):
+    """Retorna (número, ano) se a consulta cita uma portaria específica, ou None."""
+    for match in PORTARIA_REFERENCE.finditer(query):
+        if match.group('year'):
+            return int(match.group('number')), int(match.group('year'))
+    return None
+
+
+def tokenize(text: str):
+    """Termos da consulta: sem acentos, minúsculos e sem stopwords."""
+    return [
+        token for token in re.findall(r'\w+', normalize_query(text))
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def remove_index(path):
+    """Apaga o arquivo de um índice e os seus arquivos -wal/-shm, se existirem."""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Combina listas de ids ordenadas por relevância (Reciprocal Rank Fusion).
+
+    Cada lista contribui com 1 / (k + posição) para os ids que contém; o
+    resultado é a lista de (id, pontuação) da maior para a menor pontuação.
+    """
+    scores = {}
+    for ranking in rankings:
+        for position, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + position)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """
+    Índice lexical (BM25) dos trechos indexados no Qdrant, em um arquivo
+    SQLite com FTS5 no volume compartilhado entre o ingestor e a API.
+
+    Cada linha corresponde a um ponto do Qdrant (mesmo id), com o texto e os
+    metadados do trecho. A ingestão mantém o índice em dia junto com a
+    coleção; a API o abre somente para leitura (`readonly=True`) e reabre o
+    arquivo quando ele é substituído por uma reconstrução.
+
+    O gravador usa o modo WAL, para que as leituras da API não esperem pelas
+    gravações da ingestão. Por isso uma reconstrução não troca o arquivo em
+    uso (os leitores do arquivo anterior continuariam nos arquivos -wal/-shm,
+    que passariam a ser do novo): `publish` copia o novo índice para dentro
+    dele. Falhas do SQLite nas buscas (ex.: "database is locked") são
+    registradas e propagadas, e não confundidas com uma busca sem resultados.
+    """
+
+    def __init__(self, path, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        if not readonly:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._connection()
+            if self._get_meta(conn, 'format') not in (None, str(INDEX_FORMAT_VERSION)):
+                logger.warning("Índice lexical de formato antigo. Ele será reconstruído.")
+                self.close()
+                remove_index(path)
+                conn = self._connection()
+            self._set_meta(conn, 'format', str(INDEX_FORMAT_VERSION))
+
+    @classmethod
+    def create(cls, path, collection):
+        """Cria um índice vazio em `path` (apagando o que existir) associado a `collection`."""
+        remove_index(path)
+        index = cls(path)
+        index.set_collection(collection)
+        return index
+
+    def _connection(self):
+        """
+        Uma conexão por thread. Para leitura, a conexão é refeita quando o
+        arquivo é substituído; retorna None se o índice ainda não existe.
+        """
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            if self.readonly:
+                return None
+            inode = None
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and (self._local.pid != os.getpid() or (self.readonly and self._local.inode != inode)):
+            conn = None
+        if conn is None:
+            if self.readonly:
+                conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=5.0, check_same_thread=False)
+            else:
+                conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                for statement in SCHEMA:
+                    conn.execute(statement)
+                conn.commit()
+                inode = os.stat(self.path).st_ino
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.inode = inode
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    @staticmethod
+    def _get_meta(conn, key):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def collection(self):
+        """Coleção física do Qdrant que o índice reflete."""
+        conn = self._connection()
+        try:
+            return self._get_meta(conn, 'collection') if conn else None
+        except sqlite3.Error:
+            return None
+
+    def set_collection(self, collection):
+        self._set_meta(self._connection(), 'collection', collection)
+
+    def upsert_chunks(self, rows):
+        """
+        Grava trechos. `rows` são dicionários com point_id, source, title,
+        year, month, number, doc_types, page, chunk_index e text; um trecho
+        já existente com o mesmo `point_id` é substituído.
+        """
+        values = []
+        for row in rows:
+            number = row.get('number')
+            if number is None:
+                match = PORTARIA_PATTERN.search(row.get('title') or '')
+                number = int(match.group('number')) if match else None
+            values.append((
+                row['point_id'], row['source'], row.get('title'), row.get('year'), row.get('month'),
+                number, " ".join(row.get('doc_types') or []), row.get('page'), row.get('chunk_index'), row['text']
+            ))
+        conn = self._connection()
+        with conn:
+            conn.executemany("DELETE FROM chunks WHERE point_id = ?", [(v[0],) for v in values])
+            conn.executemany(f"INSERT INTO chunks ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", values)
+
+    def update_metadata(self, source, number=None, month=None, doc_types=None):
+        """Atualiza os metadados de filtragem de todos os trechos de um documento."""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE chunks SET number = ?, month = ?, doc_types = ? WHERE source = ?",
+                (number, month, " ".join(doc_types or []), source)
+            )
+
+    def delete_points(self, point_ids):
+        conn = self._connection()
+        with conn:
+            conn.executemany("DELETE FROM chunks WHERE point_id = ?", [(point_id,) for point_id in point_ids])
+
+    def count(self):
+        conn = self._connection()
+        return conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0] if conn else 0
+
+    @staticmethod
+    def _rows(cursor):
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _plan_conditions(plan):
+        """Condições SQL equivalentes às restrições de um `QueryPlan`."""
+        conditions, params = [], []
+        if plan is None:
+            return conditions, params
+        if plan.year_from:
+            conditions.append("c.year >= ?")
+            params.append(plan.year_from)
+        if plan.year_to:
+            conditions.append("c.year <= ?")
+            params.append(plan.year_to)
+        if plan.years and not (plan.year_from or plan.year_to):
+            conditions.append(f"c.year IN ({', '.join('?' * len(plan.years))})")
+            params.extend(plan.years)
+        if plan.months:
+            conditions.append(f"c.month IN ({', '.join('?' * len(plan.months))})")
+            params.extend(plan.months)
+        if plan.number is not None:
+            conditions.append("c.number = ?")
+            params.append(plan.number)
+        if plan.doc_types:
+            conditions.append("(" + " OR ".join("(' ' || c.doc_types || ' ') LIKE ?" for _ in plan.doc_types) + ")")
+            params.extend(f"% {doc_type} %" for doc_type in plan.doc_types)
+        return conditions, params
+
+    def search(self, query, limit=50, plan=None):
+        """
+        Trechos que contêm termos da consulta, do mais ao menos relevante
+        segundo o BM25, restritos aos filtros de `plan` (um `QueryPlan`).
+        Cada resultado traz as colunas do trecho e `score` (maior é melhor).
+        Levanta sqlite3.Error se o índice não puder ser lido.
+        """
+        terms = tokenize(query)
+        conn = self._connection()
+        if not terms or conn is None:
+            return []
+        match = " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+        sql = (
+            f"SELECT {', '.join('c.' + c.strip() for c in COLUMNS.split(','))}, -bm25(chunks_fts) AS score "
+            "FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid WHERE chunks_fts MATCH ?"
+        )
+        conditions, params = self._plan_conditions(plan)
+        for condition in conditions:
+            sql += " AND " + condition
+        params = [match] + params
+        sql += " ORDER BY bm25(chunks_fts) LIMIT ?"
+        params.append(limit)
+        try:
+            return self._rows(conn.execute(sql, params))
+        except sqlite3.Error as e:
+            logger.error(f"Falha na busca lexical: {e}")
+            raise
+
+    def find_portaria(self, number, year):
+        """
+        Trechos da(s) portaria(s) com esse número e ano, na ordem do documento.
+        Levanta sqlite3.Error se o índice não puder ser lido.
+        """
+        conn = self._connection()
+        if conn is None:
+            return []
+        try:
+            return self._rows(conn.execute(
+                f"SELECT {COLUMNS} FROM chunks WHERE number = ? AND year = ? ORDER BY source, chunk_index",
+                (number, year)
+            ))
+        except sqlite3.Error as e:
+            logger.error(f"Falha na busca exata de portaria: {e}")
+            raise
+
+    def publish(self, live_path):
+        """
+        Substitui o conteúdo do índice em `live_path` pelo deste (ex.: após a
+        troca do alias), em uma única transação (API de backup do SQLite),
+        apaga este arquivo e retorna o índice de `live_path`. As leituras em
+        andamento terminam no conteúdo anterior; as seguintes veem o novo.
+        """
+        live = LexicalIndex(live_path)
+        self._connection().backup(live._connection())
+        self.close()
+        remove_index(self.path)
+        return live
@@ -0,0 +1,144 @@
+import os
+import hashlib
+import logging
+import threading
+import urllib.parse
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Substituto local do portal de portarias do MPC, para testar o crawler
+# (pdf_downloader.py) e medir a etapa de download no benchmark offline sem
+# rede. Serve os PDFs de um diretório em páginas de listagem paginadas, com
+# link "Próxima", e cada PDF com ETag e Last-Modified, respondendo 304 aos
+# GETs condicionais de arquivos que não mudaram.
+# Uso: with LocalPortal(diretorio, per_page=20) as portal: iter_pdfs(portal.url, ...)
+
+
+class LocalPortal:
+    """
+    Portal local sobre os PDFs de `directory`, em `url` (/portarias?page=N).
+    A listagem mostra `per_page` PDFs por página, do nome maior para o menor
+    (as portarias novas, como no portal real, aparecem na primeira página).
+    `requests` registra (caminho, status, cabeçalhos condicionais) de cada
+    pedido atendido.
+    """
+
+    def __init__(self, directory, per_page=20, host="127.0.0.1", port=0):
+        self.directory = directory
+        self.per_page = per_page
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/portarias"
+
+    def filenames(self):
+        return sorted((name for name in os.listdir(self.directory) if name.endswith('.pdf')), reverse=True)
+
+    def listing_requests(self):
+        return [entry for entry in self.requests if entry[0].startswith('/portarias')]
+
+    def pdf_requests(self):
+        return [entry for entry in self.requests if entry[0].startswith('/arquivos/')]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="local-portal", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _record(self, path, status, headers):
+        conditional = {key: headers[key] for key in ('If-None-Match', 'If-Modified-Since') if key in headers}
+        with self._lock:
+            self.requests.append((path, status, conditional))
+
+    def _listing(self, page):
+        names = self.filenames()
+        start = (page - 1) * self.per_page
+        links = "\n".join(
+            f'<li><a href="/arquivos/{urllib.parse.quote(name)}">{name}</a></li>'
+            for name in names[start:start + self.per_page]
+        )
+        next_link = (
+            f'<a class="next" href="/portarias?page={page + 1}">Próxima</a>'
+            if start + self.per_page < len(names) else ''
+        )
+        return f"<html><body><ul>\n{links}\n</ul>\n{next_link}</body></html>".encode('utf-8')
+
+    def _validators(self, path):
+        with open(path, 'rb') as f:
+            etag = '"' + hashlib.sha1(f.read()).hexdigest()[:16] + '"'
+        return etag, formatdate(os.path.getmtime(path), usegmt=True)
+
+    def _handler_class(self):
+        portal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _send(self, status, body=b'', content_type=None, headers=()):
+                portal._record(self.path, status, self.headers)
+                self.send_response(status)
+                if content_type:
+                    self.send_header('Content-Type', content_type)
+                for key, value in headers:
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urllib.parse.urlsplit(self.path)
+                if url.path == '/portarias':
+                    try:
+                        page = int(urllib.parse.parse_qs(url.query).get('page', ['1'])[0])
+                    except ValueError:
+                        page = 1
+                    self._send(200, portal._listing(max(page, 1)), 'text/html; charset=utf-8')
+                    return
+
+                name = urllib.parse.unquote(url.path[len('/arquivos/'):]) if url.path.startswith('/arquivos/') else ''
+                path = os.path.join(portal.directory, os.path.basename(name))
+                if not name or not os.path.isfile(path):
+                    self._send(404)
+                    return
+
+                etag, last_modified = portal._validators(path)
+                validators = (('ETag', etag), ('Last-Modified', last_modified))
+                if self._not_modified(etag, path):
+                    self._send(304, headers=validators)
+                    return
+                with open(path, 'rb') as f:
+                    self._send(200, f.read(), 'application/pdf', validators)
+
+            def _not_modified(self, etag, path):
+                if 'If-None-Match' in self.headers:
+                    return self.headers['If-None-Match'] == etag
+                if 'If-Modified-Since' in self.headers:
+                    try:
+                        since = parsedate_to_datetime(self.headers['If-Modified-Since']).timestamp()
+                    except (TypeError, ValueError):
+                        return False
+                    return int(os.path.getmtime(path)) <= since
+                return False
+
+        return Handler
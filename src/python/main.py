@@ -1,18 +1,63 @@
+import os
+import json
+import time
+import argparse
 import logging
 from ingest_portarias import IngestPortarias
+from metrics import metrics, new_request_id, request_id_var
+from settings import settings
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def update_database():
-    """Função principal que executa o processo de ingestão."""
+def update_database(full_rebuild=False):
+    """
+    Função principal que executa o processo de ingestão.
+
+    Retorna o relatório da execução (também gravado em INGEST_REPORT_PATH):
+    vazão e tempo de cada etapa do pipeline, profundidade das filas,
+    métricas da ingestão e o erro, se ela falhou.
+    """
+    run_id = new_request_id()
+    request_id_var.set(run_id)
+    started = time.time()
+    report = {"run_id": run_id, "full_rebuild": full_rebuild, "status": "ok"}
+    ingestor = None
     try:
         logger.info("Iniciando processo de atualização da base de dados vetorial.")
         ingestor = IngestPortarias()
-        ingestor.run_ingestion()
+        report["pipeline"] = ingestor.run_ingestion(full_rebuild=full_rebuild)
         logger.info("Processo de atualização finalizado com sucesso.")
     except Exception as e:
         logger.error(f"Ocorreu um erro crítico durante a atualização: {str(e)}", exc_info=True)
+        report.update(status="error", error=str(e))
+    report.update(
+        started_at=time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)),
+        duration_s=round(time.time() - started, 3),
+        metrics=metrics.report()
+    )
+    write_report(report, ingestor.pdf_dir if ingestor else "/app/pdfs")
+    return report
+
+def write_report(report, pdf_dir):
+    path = settings.INGEST_REPORT_PATH or os.path.join(pdf_dir, 'ingest_report.json')
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+        logger.info(f"Relatório da execução gravado em '{path}' ({report['status']}, {report['duration_s']}s).")
+    except OSError as e:
+        logger.warning(f"Não foi possível gravar o relatório da execução em '{path}': {e}")
 
 if __name__ == "__main__":
-    update_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Atualiza a base vetorial de portarias.")
+    parser.add_argument(
+        "--full-rebuild",
+        action="store_true",
+        default=settings.INGEST_FULL_REBUILD,
+        help=(
+            "Revetoriza todos os PDFs em uma nova coleção, reaproveitando os textos já extraídos; "
+            "PDFs rejeitados na extração continuam ignorados."
+        )
+    )
+    args = parser.parse_args()
+    update_database(full_rebuild=args.full_rebuild)
@@ -0,0 +1,213 @@
+import re
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Formato dos logs da API e da ingestão, com o id do pedido (ou "-" fora de um pedido).
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+# Quantis calculados sobre as observações mais recentes de cada histograma.
+QUANTILES = (0.5, 0.95, 0.99)
+
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+_VALID_REQUEST_ID = re.compile(r'^[\w\-.]{1,64}$')
+
+
+def new_request_id(incoming=None):
+    """Id do pedido: o recebido no cabeçalho X-Request-ID, se for válido, ou um novo."""
+    if incoming and _VALID_REQUEST_ID.match(incoming):
+        return incoming
+    return uuid.uuid4().hex[:16]
+
+
+class RequestIdFilter(logging.Filter):
+    """Inclui em cada registro de log o id do pedido em andamento (`request_id`)."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+def install_request_id_logging():
+    """Instala o `RequestIdFilter` nos handlers do logger raiz, para o `LOG_FORMAT` funcionar em todos."""
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, RequestIdFilter) for f in handler.filters):
+            handler.addFilter(RequestIdFilter())
+
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """
+    Contagem e soma de todas as observações, e quantis (p50/p95/p99) das
+    `window` mais recentes, sem guardar o histórico inteiro.
+    """
+
+    def __init__(self, window=2048):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        with self._lock:
+            self._recent.append(value)
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            count, total = self.count, self.sum
+        result = {"count": count, "sum": round(total, 6)}
+        for q in QUANTILES:
+            result[f"p{round(q * 100)}"] = (
+                round(recent[min(len(recent) - 1, int(q * len(recent)))], 6) if recent else 0.0
+            )
+        return result
+
+
+class MetricsRegistry:
+    """
+    Métricas do processo: contadores, histogramas (tempos e tamanhos) e
+    coletores, que expõem como medidores os `stats()` já mantidos pelos
+    componentes (caches, single-flight, limitador de concorrência...).
+
+    Cada métrica tem um nome e rótulos opcionais (`stage="embedding"`).
+    `prometheus()` gera o formato de texto do /metrics (histogramas como
+    `summary`, com os quantis) e `report()` o mesmo conteúdo em JSON. As
+    métricas são de cada processo; com vários workers, cada um expõe as suas.
+    """
+
+    def __init__(self, window=2048):
+        self.window = window
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = {}
+
+    def _child(self, kind, factory, name, help_text, labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = {"kind": kind, "help": help_text, "children": {}}
+            elif metric["kind"] != kind:
+                raise ValueError(f"A métrica '{name}' já foi registrada como {metric['kind']}.")
+            elif help_text and not metric["help"]:
+                metric["help"] = help_text
+            child = metric["children"].get(key)
+            if child is None:
+                child = metric["children"][key] = factory()
+            return child
+
+    def counter(self, name, help_text="", **labels):
+        return self._child("counter", Counter, name, help_text, labels)
+
+    def histogram(self, name, help_text="", **labels):
+        return self._child("summary", lambda: Histogram(self.window), name, help_text, labels)
+
+    def register_collector(self, prefix, stats, help_text=""):
+        """Expõe os valores numéricos de `stats()` como medidores `<prefix>_<chave>`."""
+        with self._lock:
+            self._collectors[prefix] = (stats, help_text)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Mede o bloco e registra a duração (segundos) no histograma `<name>_seconds`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.histogram(f"{name}_seconds", **labels).observe(elapsed)
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def _collected(self):
+        with self._lock:
+            collectors = list(self._collectors.items())
+        for prefix, (stats, help_text) in collectors:
+            try:
+                values = stats()
+            except Exception as e:
+                logger.warning(f"Coletor de métricas '{prefix}' falhou: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield f"{prefix}_{key}", help_text, value
+
+    def report(self):
+        """Todas as métricas em um dicionário (JSON), com os rótulos como `chave=valor,...`."""
+        with self._lock:
+            metrics = {name: dict(metric["children"]) for name, metric in self._metrics.items()}
+        report = {}
+        for name, children in sorted(metrics.items()):
+            report[name] = {
+                ",".join(f"{key}={value}" for key, value in labels): child.snapshot()
+                for labels, child in children.items()
+            }
+        for name, _, value in self._collected():
+            report[name] = value
+        return report
+
+    def prometheus(self):
+        """As métricas no formato de texto do Prometheus (versão 0.0.4)."""
+        with self._lock:
+            metrics = {name: (metric["kind"], metric["help"], dict(metric["children"]))
+                       for name, metric in self._metrics.items()}
+        lines = []
+        for name, (kind, help_text, children) in sorted(metrics.items()):
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, child in children.items():
+                snapshot = child.snapshot()
+                if kind == "counter":
+                    lines.append(f"{name}{_labels(labels)} {snapshot}")
+                    continue
+                for q in QUANTILES:
+                    lines.append(f"{name}{_labels(labels + (('quantile', q),))} {snapshot[f'p{round(q * 100)}']}")
+                lines.append(f"{name}_sum{_labels(labels)} {snapshot['sum']}")
+                lines.append(f"{name}_count{_labels(labels)} {snapshot['count']}")
+        for name, help_text, value in self._collected():
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+# Métricas do processo, compartilhadas pela API e pela ingestão.
+metrics = MetricsRegistry()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -0,0 +1,292 @@
+import os
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+
+import fitz
+import pytesseract
+from PIL import Image
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Modos de renderização das páginas para o OCR.
+RENDER_MODES = ("gray", "binary", "rgb")
+
+
+class OcrError(Exception):
+    """O Tesseract falhou ou excedeu o tempo limite em uma página."""
+
+
+def otsu_threshold(histogram):
+    """Limiar de binarização de Otsu para o histograma de 256 tons de uma imagem em cinza."""
+    total = sum(histogram)
+    weighted_total = sum(value * count for value, count in enumerate(histogram))
+    best, threshold = 0.0, 127
+    background = weighted_background = 0
+    for value, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted_background += value * count
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best:
+            best, threshold = variance, value
+    return threshold
+
+
+def render_page(page, dpi=300, mode="gray", clip=None):
+    """
+    Renderiza a página (ou a região `clip`) como imagem PIL a partir do
+    buffer do pixmap, sem codificar PNG no caminho. Em "binary", a imagem
+    em cinza é binarizada pelo limiar de Otsu.
+    """
+    if mode not in RENDER_MODES:
+        raise ValueError(f"Modo de renderização não suportado: {mode}")
+    colorspace = fitz.csRGB if mode == "rgb" else fitz.csGRAY
+    pix = page.get_pixmap(dpi=dpi, colorspace=colorspace, clip=clip, alpha=False)
+    image_mode = "RGB" if mode == "rgb" else "L"
+    image = Image.frombuffer(image_mode, (pix.width, pix.height), pix.samples, "raw", image_mode, pix.stride, 1)
+    if mode == "binary":
+        threshold = otsu_threshold(image.histogram())
+        image = image.point([0] * (threshold + 1) + [255] * (255 - threshold))
+    return image
+
+
+class TesserocrWorker:
+    """
+    Tesseract carregado uma única vez no processo (API C via `tesserocr`) e
+    reutilizado a cada página, sem abrir um processo nem recarregar o
+    modelo do idioma por chamada. O tempo limite é aplicado pelo próprio
+    Tesseract (`Recognize(timeout=...)`).
+    """
+
+    def __init__(self, lang, psm, timeout, tessdata_path=None):
+        import tesserocr
+        kwargs = {"lang": lang, "psm": psm}
+        if tessdata_path:
+            kwargs["path"] = tessdata_path
+        self.api = tesserocr.PyTessBaseAPI(**kwargs)
+        self.timeout_ms = int(timeout * 1000)
+
+    def recognize(self, image):
+        self.api.SetImage(image)
+        if not self.api.Recognize(timeout=self.timeout_ms):
+            raise OcrError(f"Tesseract falhou ou excedeu {self.timeout_ms / 1000:.0f}s")
+        return self.api.GetUTF8Text()
+
+    def close(self):
+        self.api.End()
+
+
+class PytesseractWorker:
+    """Alternativa sem `tesserocr`: um processo `tesseract` por página, encerrado no tempo limite."""
+
+    def __init__(self, lang, psm, timeout, tessdata_path=None):
+        self.lang = lang
+        self.config = f"--psm {psm}"
+        if tessdata_path:
+            self.config += f' --tessdata-dir "{tessdata_path}"'
+        self.timeout = timeout
+
+    def recognize(self, image):
+        try:
+            return pytesseract.image_to_string(image, lang=self.lang, config=self.config, timeout=self.timeout)
+        except RuntimeError as e:
+            raise OcrError(str(e)) from e
+
+    def close(self):
+        pass
+
+
+class OcrCache:
+    """
+    Textos já reconhecidos, pelo hash da imagem da página, em um arquivo
+    SQLite compartilhado entre os processos de extração. Um PDF alterado
+    ou reprocessado não repete o OCR das páginas que continuam iguais.
+    """
+
+    TOUCH_INTERVAL = 3600
+    EVICT_EVERY = 200
+
+    def __init__(self, path, max_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._puts = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, text TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._connection().execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute("SELECT text, last_used FROM pages WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > self.TOUCH_INTERVAL:
+            conn.execute("UPDATE pages SET last_used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key, text):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO pages (key, text, last_used) VALUES (?, ?, ?)", (key, text, time.time())
+        )
+        self._puts += 1
+        if self._puts % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        """Remove as entradas menos usadas até sobrar 90% de `max_entries`."""
+        conn = self._connection()
+        count = conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        excess = count - int(self.max_entries * 0.9)
+        if count > self.max_entries and excess > 0:
+            conn.execute("DELETE FROM pages WHERE key IN (SELECT key FROM pages ORDER BY last_used LIMIT ?)", (excess,))
+
+
+class OcrEngine:
+    """
+    OCR das páginas digitalizadas dos PDFs.
+
+    As páginas são renderizadas em `dpi` (cinza por padrão) direto do
+    pixmap. `header_text` reconhece só a faixa superior da página
+    (`header_fraction` da altura), em `header_dpi`, para reler o título e o
+    ano quando o OCR da página inteira não os encontrou. Cada processo
+    de extração mantém um único Tesseract carregado (`TesserocrWorker`, ou
+    `PytesseractWorker` se o `tesserocr` não estiver disponível), com tempo
+    limite por página, e os textos reconhecidos ficam no `OcrCache`. Um
+    `worker` com a mesma interface (ex.: o `FakeOcrWorker` dos benchmarks)
+    substitui o Tesseract.
+    """
+
+    def __init__(self, lang="por", dpi=300, header_dpi=400, header_fraction=0.25, mode="gray", psm=3,
+                 timeout=60.0, tessdata_path=None, cache_path=None, cache_max_entries=200000, worker=None):
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Modo de renderização não suportado: {mode}")
+        self.lang = lang
+        self.dpi = dpi
+        self.header_dpi = header_dpi
+        self.header_fraction = header_fraction
+        self.mode = mode
+        self.psm = psm
+        self.worker = worker or self._new_worker(lang, psm, timeout, tessdata_path)
+        self.cache = None
+        if cache_path:
+            try:
+                self.cache = OcrCache(cache_path, cache_max_entries)
+            except sqlite3.Error as e:
+                logger.warning(f"Cache de OCR indisponível ({e}); seguindo sem ele.")
+        self.counters = {"pages": 0, "headers": 0, "cache_hits": 0, "errors": 0, "seconds": 0.0}
+
+    @staticmethod
+    def _new_worker(lang, psm, timeout, tessdata_path):
+        try:
+            return TesserocrWorker(lang, psm, timeout, tessdata_path)
+        except ImportError:
+            logger.info("tesserocr não instalado; o OCR usará um processo do Tesseract por página.")
+        except RuntimeError as e:
+            logger.warning(f"Não foi possível carregar o Tesseract pelo tesserocr ({e}); usando o pytesseract.")
+        return PytesseractWorker(lang, psm, timeout, tessdata_path)
+
+    def _key(self, image):
+        digest = hashlib.blake2b(image.tobytes(), digest_size=20)
+        digest.update(f"|{image.mode}|{image.size}|{self.lang}|{self.psm}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def recognize(self, image):
+        """Texto da imagem; vazio (e registrado no log) se o Tesseract falhar ou estourar o tempo."""
+        key = self._key(image)
+        if self.cache is not None:
+            try:
+                cached = self.cache.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"Erro ao ler o cache de OCR: {e}")
+                cached = None
+            if cached is not None:
+                self.counters["cache_hits"] += 1
+                return cached
+
+        started = time.monotonic()
+        try:
+            text = self.worker.recognize(image)
+        except OcrError as e:
+            self.counters["errors"] += 1
+            logger.warning(f"OCR falhou em uma página: {e}")
+            return ""
+        finally:
+            self.counters["seconds"] += time.monotonic() - started
+
+        if self.cache is not None:
+            try:
+                self.cache.put(key, text)
+            except sqlite3.Error as e:
+                logger.warning(f"Erro ao gravar no cache de OCR: {e}")
+        return text
+
+    def header_text(self, page):
+        """Texto da faixa superior da página, onde ficam o número e o ano da portaria."""
+        self.counters["headers"] += 1
+        rect = page.rect
+        clip = fitz.Rect(rect.x0, rect.y0, rect.x1, rect.y0 + rect.height * self.header_fraction)
+        return self.recognize(render_page(page, self.header_dpi, self.mode, clip)).strip()
+
+    def page_text(self, page):
+        self.counters["pages"] += 1
+        return self.recognize(render_page(page, self.dpi, self.mode)).strip()
+
+    def stats(self):
+        return dict(self.counters)
+
+    def close(self):
+        self.worker.close()
+
+
+_engine = None
+
+
+def get_engine():
+    """O `OcrEngine` do processo, criado no primeiro uso a partir de `settings`."""
+    global _engine
+    if _engine is None:
+        worker = None
+        if settings.OCR_BACKEND == "fake":
+            from fake_models import FakeOcrWorker
+            worker = FakeOcrWorker(settings.FAKE_OCR_LATENCY)
+        _engine = OcrEngine(
+            lang=settings.OCR_LANG,
+            dpi=settings.OCR_DPI,
+            header_dpi=settings.OCR_HEADER_DPI,
+            header_fraction=settings.OCR_HEADER_FRACTION,
+            mode=settings.OCR_RENDER_MODE,
+            psm=settings.OCR_PSM,
+            timeout=settings.OCR_PAGE_TIMEOUT,
+            tessdata_path=settings.TESSDATA_PATH or None,
+            cache_path=settings.OCR_CACHE_PATH or None,
+            cache_max_entries=settings.OCR_CACHE_MAX_ENTRIES,
+            worker=worker
+        )
+    return _engine
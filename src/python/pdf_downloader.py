@@ -1,115 +1,344 @@
 import os
+import re
+import json
+import time
+import random
+import logging
+import tempfile
+import threading
+import urllib.parse
+from email.utils import formatdate
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
 from bs4 import BeautifulSoup
-import urllib.parse
-import logging
-import re
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Sidecar file (inside the PDF directory) with the ETag/Last-Modified of each download.
+STATE_FILENAME = '.download_state.json'
+
+NEXT_PAGE_LABELS = {'próxima', 'próximo', 'próxima página', 'next', '›', '»', '>'}
+
+
+def create_session(pool_size=8, retries=3, backoff_factor=1.0):
+    """
+    Shared HTTP session for the crawler and the downloads.
+
+    The adapter keeps up to `pool_size` keep-alive connections per host and
+    retries connection errors, 429 and 5xx responses with exponential
+    backoff, honouring Retry-After.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'User-Agent': USER_AGENT})
+    return session
+
+
+class HostLimiter:
+    """Limits the number of simultaneous requests per host."""
+
+    def __init__(self, per_host=4):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    @contextmanager
+    def slot(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.per_host))
+        with semaphore:
+            yield
+
 
-def get_pdf_links_first_page(base_url):
-        """Get PDF links only from the first page"""
-        pdf_links = set()
-    
-        # Configure session for better performance
-        session = requests.Session()
-        session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
-    
+class DownloadState:
+    """Validators (ETag/Last-Modified) of previous downloads, used for conditional GETs."""
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, STATE_FILENAME)
+        self._lock = threading.Lock()
+        self._records = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._records = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable download state {self.path}: {e}")
+
+    def get(self, url):
+        with self._lock:
+            return self._records.get(url)
+
+    def set(self, url, **fields):
+        with self._lock:
+            self._records[url] = fields
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self._records, indent=1)
+        directory = os.path.dirname(self.path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.state-', suffix='.tmp')
         try:
-            logging.info(f"Fetching first page: {base_url}")
-            
-            response = session.get(base_url, timeout=60)
-            response.raise_for_status()
-    
-            soup = BeautifulSoup(response.text, 'html.parser')
-    
-            # Find PDF links on the page (both direct and indirect links)
-            for link in soup.find_all('a'):
-                href = link.get('href', '')
-                if href.endswith('.pdf') or 'download' in href.lower():
-                    full_link = urllib.parse.urljoin(base_url, href)
-                    pdf_links.add(full_link)
-    
-            logging.info(f"Found {len(pdf_links)} PDF links on the first page.")
-            
-        except Exception as e:
-            logging.error(f"Error fetching the first page: {str(e)}")
-        
-        return list(pdf_links)
-    
-def download_pdf(session, base_url, pdf_link, output_dir):
-        """Download a single PDF file"""
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def pdf_filename(pdf_link):
+    """Local (sanitized) filename for a PDF link"""
+    filename = os.path.basename(urllib.parse.unquote(pdf_link))
+    filename = re.sub(r'[^\w\-_\.]', '_', filename)
+    if not filename.endswith('.pdf'):
+        filename += '.pdf'
+    return filename
+
+
+def extract_pdf_links(soup, page_url):
+    """PDF links of a listing page (both direct and indirect links)"""
+    pdf_links = []
+    for link in soup.find_all('a'):
+        href = link.get('href', '')
+        if href.endswith('.pdf') or 'download' in href.lower():
+            full_link = urllib.parse.urljoin(page_url, href)
+            if full_link not in pdf_links:
+                pdf_links.append(full_link)
+    return pdf_links
+
+
+def find_next_page(soup, page_url):
+    """URL of the next listing page (rel="next", "Próxima", "»"...), or None"""
+    for link in soup.find_all('a', href=True):
+        rel = [r.lower() for r in (link.get('rel') or [])]
+        classes = ' '.join(link.get('class') or []).lower()
+        label = link.get_text(strip=True).lower()
+        if 'next' in rel or 'next' in classes or label in NEXT_PAGE_LABELS:
+            return urllib.parse.urljoin(page_url, link['href'])
+    return None
+
+
+def iter_listing_pages(session, start_url, max_pages=1):
+    """Crawl the listing following the pagination, yielding (page_url, pdf_links)"""
+    page_url = start_url
+    visited = set()
+    while page_url and page_url not in visited and len(visited) < max_pages:
+        visited.add(page_url)
+        logging.info(f"Fetching listing page {len(visited)}: {page_url}")
+        response = session.get(page_url, timeout=60)
+        response.raise_for_status()
+        if 'charset' not in response.headers.get('content-type', '').lower():
+            # Without a declared charset requests assumes ISO-8859-1 and mangles "Próxima".
+            response.encoding = response.apparent_encoding
+
+        soup = BeautifulSoup(response.text, 'html.parser')
+        pdf_links = extract_pdf_links(soup, page_url)
+        logging.info(f"Found {len(pdf_links)} PDF links on {page_url}.")
+        yield page_url, pdf_links
+
+        page_url = find_next_page(soup, page_url)
+
+
+def get_pdf_links_first_page(base_url, session=None):
+    """Get PDF links only from the first page"""
+    session = session or create_session(pool_size=1)
+    try:
+        for _, pdf_links in iter_listing_pages(session, base_url, max_pages=1):
+            return pdf_links
+    except Exception as e:
+        logging.error(f"Error fetching the first page: {str(e)}")
+    return []
+
+
+@contextmanager
+def _no_limit():
+    yield
+
+
+def download_pdf(session, base_url, pdf_link, output_dir, state=None, limiter=None, attempts=3):
+    """
+    Download a single PDF file, returning its local filename (or None on failure).
+
+    Files already on disk are revalidated with a conditional GET
+    (If-None-Match / If-Modified-Since) and only fetched again when the
+    server reports a change. The body is written to a temporary file and
+    atomically renamed, so a partial download never replaces a good PDF.
+    """
+    filename = pdf_filename(pdf_link)
+    full_url = urllib.parse.urljoin(base_url, pdf_link)
+    output_path = os.path.join(output_dir, filename)
+
+    headers = {}
+    record = state.get(full_url) if state else None
+    if os.path.exists(output_path):
+        if record and record.get('etag'):
+            headers['If-None-Match'] = record['etag']
+        if record and record.get('last_modified'):
+            headers['If-Modified-Since'] = record['last_modified']
+        elif not record:
+            # Downloaded before validators were recorded: use the file's own mtime.
+            headers['If-Modified-Since'] = formatdate(os.path.getmtime(output_path), usegmt=True)
+
+    for attempt in range(1, attempts + 1):
         try:
-            # Clean filename and create full URL
-            filename = os.path.basename(urllib.parse.unquote(pdf_link))
-            filename = re.sub(r'[^\w\-_\.]', '_', filename)
-            if not filename.endswith('.pdf'):
-                filename += '.pdf'
-                
-            full_url = urllib.parse.urljoin(base_url, pdf_link)
-            output_path = os.path.join(output_dir, filename)
-            
-            # Skip if file already exists
-            if os.path.exists(output_path):
-                logging.info(f"File already exists: {filename}")
-                return True
-            
-            logging.info(f"Downloading: {full_url}")
-            response = session.get(full_url, stream=True, timeout=30)
-            response.raise_for_status()
-            
-            # Verify it's actually a PDF
-            content_type = response.headers.get('content-type', '').lower()
-            if 'pdf' not in content_type and 'octet-stream' not in content_type:
-                logging.warning(f"Skipping non-PDF content: {full_url}")
-                return False
-            
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
+            with (limiter.slot(full_url) if limiter else _no_limit()):
+                with session.get(full_url, stream=True, timeout=30, headers=headers) as response:
+                    if response.status_code == 304:
+                        logging.debug(f"Not modified: {filename}")
+                        return filename
+                    response.raise_for_status()
+
+                    # Verify it's actually a PDF
+                    content_type = response.headers.get('content-type', '').lower()
+                    if 'pdf' not in content_type and 'octet-stream' not in content_type:
+                        logging.warning(f"Skipping non-PDF content: {full_url}")
+                        return None
+
+                    fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=f'.{filename}.', suffix='.part')
+                    try:
+                        with os.fdopen(fd, 'wb') as f:
+                            for chunk in response.iter_content(chunk_size=64 * 1024):
+                                f.write(chunk)
+                        os.replace(tmp_path, output_path)
+                    except BaseException:
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+                        raise
+
+                    if state is not None:
+                        state.set(
+                            full_url,
+                            filename=filename,
+                            etag=response.headers.get('ETag'),
+                            last_modified=response.headers.get('Last-Modified')
+                        )
+
             logging.info(f"Successfully downloaded: {filename}")
-            return True
-            
+            return filename
+
+        except requests.HTTPError as e:
+            # 429/5xx were already retried with backoff by the session adapter.
+            logging.error(f"Error downloading {pdf_link}: {str(e)}")
+            return None
+        except requests.RequestException as e:
+            if attempt == attempts:
+                logging.error(f"Error downloading {pdf_link}: {str(e)}")
+                return None
+            # Errors in the middle of the body are not covered by the adapter's retries.
+            delay = (2 ** (attempt - 1)) + random.uniform(0, 1)
+            logging.warning(f"Retrying {pdf_link} in {delay:.1f}s ({attempt}/{attempts}): {str(e)}")
+            time.sleep(delay)
         except Exception as e:
             logging.error(f"Error downloading {pdf_link}: {str(e)}")
-            return False
-    
+            return None
+
+
+def _save_state(state):
+    try:
+        state.save()
+    except OSError as e:
+        logging.error(f"Could not save the download state {state.path}: {e}")
+
+
+def iter_pdfs(url, output_dir, max_pages=1, max_workers=8, per_host=4, stop_on_known=True, session=None):
+    """
+    Crawl the listing and download its PDFs concurrently, yielding each local
+    filename as soon as the file is available on disk (downloaded now or
+    confirmed unchanged).
+
+    The crawl follows the pagination up to `max_pages` pages. With
+    `stop_on_known`, it stops after the first page whose PDFs were all
+    already on disk, which is enough for the nightly update; a historical
+    backfill disables it and raises `max_pages`.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    session = session or create_session(pool_size=max_workers)
+    state = DownloadState(output_dir)
+    limiter = HostLimiter(per_host)
+
+    seen_links = set()
+    total = 0
+    success_count = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf-download') as executor:
+            futures = set()
+
+            def drain(block):
+                nonlocal success_count
+                finished = as_completed(futures) if block else [f for f in futures if f.done()]
+                for future in finished:
+                    futures.discard(future)
+                    filename = future.result()
+                    if filename:
+                        success_count += 1
+                        yield filename
+
+            try:
+                for page_url, pdf_links in iter_listing_pages(session, url, max_pages=max_pages):
+                    new_links = [link for link in pdf_links if link not in seen_links]
+                    seen_links.update(new_links)
+                    known = all(os.path.exists(os.path.join(output_dir, pdf_filename(link))) for link in new_links)
+
+                    for pdf_link in new_links:
+                        futures.add(
+                            executor.submit(download_pdf, session, page_url, pdf_link, output_dir, state, limiter)
+                        )
+                    total += len(new_links)
+
+                    yield from drain(block=False)
+
+                    if not new_links:
+                        logging.info("Listing page without new PDF links; stopping the crawl.")
+                        break
+                    if stop_on_known and known:
+                        logging.info("All PDFs on this page were already downloaded; stopping the crawl.")
+                        break
+            except Exception as e:
+                logging.error(f"Error crawling the listing: {str(e)}")
+
+            yield from drain(block=True)
+    finally:
+        # Also when the caller closes the generator early or the crawl aborts: the
+        # validators of the files already on disk must not be lost.
+        _save_state(state)
+
+    if not total:
+        logging.error("No PDF links found!")
+    logging.info(f"Download completed. {success_count} of {total} PDFs available locally.")
+
+
+def download_pdfs(url, output_dir, **kwargs):
+    """Download all PDFs of the listing, returning how many are available locally"""
+    try:
+        return sum(1 for _ in iter_pdfs(url, output_dir, **kwargs))
+    except Exception as e:
+        logging.error(f"Error in download process: {str(e)}")
+        return 0
+
+
+def iter_pdfs_first_page(url, output_dir, **kwargs):
+    """Download the PDFs from the first page only (see iter_pdfs)"""
+    return iter_pdfs(url, output_dir, max_pages=1, **kwargs)
+
+
 def download_pdfs_first_page(url, output_dir):
-        """
-        Download all PDFs from the first page of a webpage
-        """
-        try:
-            # Create output directory
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # Configure session
-            session = requests.Session()
-            session.headers.update({
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            })
-            
-            # Get PDF links from the first page
-            pdf_links = get_pdf_links_first_page(url)
-            total_pdfs = len(pdf_links)
-            logging.info(f"Found {total_pdfs} unique PDF files to download from the first page.")
-            
-            if not pdf_links:
-                logging.error("No PDF links found!")
-                return 0
-            
-            # Download PDFs sequentially
-            success_count = 0
-            for i, pdf_link in enumerate(pdf_links, 1):
-                if download_pdf(session, url, pdf_link, output_dir):
-                    success_count += 1
-                
-                if i % 50 == 0:
-                    logging.info(f"Progress: {i}/{total_pdfs} ({(i/total_pdfs)*100:.1f}%)")
-            
-            logging.info(f"Download completed. Successfully downloaded {success_count} of {total_pdfs} PDFs.")
-            return success_count
-            
-        except Exception as e:
-            logging.error(f"Error in download process: {str(e)}")
-            return 0
+    """
+    Download all PDFs from the first page of a webpage
+    """
+    return download_pdfs(url, output_dir, max_pages=1)
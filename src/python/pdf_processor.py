@@ -1,13 +1,16 @@
 import fitz
-import pytesseract
-from PIL import Image
-import io
 import os
 import logging
-import re
-from concurrent.futures import ThreadPoolExecutor
+import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
 from langdetect import detect, LangDetectException
 
+from ocr_engine import get_engine
+from portaria_text import PAGE_SEPARATOR, PORTARIA_PATTERN
+
 # --- AGENTE 1: Lógica de Verificação de Idioma ---
 def is_portuguese(text: str) -> bool:
     """Verifica se o texto fornecido está em português."""
@@ -26,93 +29,276 @@ def is_portuguese(text: str) -> bool:
 # --- INÍCIO DA CORREÇÃO ---
 def extract_title_and_year(text):
     """Extrai o título e o ano da portaria usando regex."""
-    # CORREÇÃO: Removido o flag inline (?i) para evitar o erro de compilação.
-    # O argumento 'flags=re.IGNORECASE' já lida com a sensibilidade de maiúsculas/minúsculas.
-    pattern = re.compile(
-        r'(portaria\s+n[°º]?\s*\d+\s*\/\s*(\d{4})\s*\/\s*mpc\s*\/\s*pa)',
-        flags=re.IGNORECASE
-    )
     lines = text.split('\n')
     for line in lines:
         line = line.strip()
-        match = pattern.search(line)
+        match = PORTARIA_PATTERN.search(line)
         if match:
             title = match.group(1)  # O título completo (1º grupo de captura)
-            year = int(match.group(2)) # O ano (2º grupo de captura)
+            year = int(match.group('year'))
             return title, year
     return "Sem título", None
 # --- FIM DA CORREÇÃO ---
 
 
-def process_single_pdf(pdf_path, output_dir):
-    """Processa um único PDF, aplicando o Agente 1 e extraindo metadados."""
+def iter_page_texts(pdf):
+    """
+    Produz (número da página, texto, usou OCR) para cada página do PDF, em ordem.
+
+    O OCR (`ocr_engine`) só é aplicado às páginas sem camada de texto (ex.:
+    digitalizadas). As páginas são processadas uma a uma, sem manter o
+    documento inteiro em memória.
+    """
+    for number, page in enumerate(pdf, start=1):
+        page_text = page.get_text()
+        ocr = False
+        if not page_text.strip():
+            page_text = get_engine().page_text(page)
+            ocr = True
+        yield number, page_text.strip(), ocr
+
+
+def scanned_header_title(page):
+    """Título e ano lidos do cabeçalho de uma página digitalizada, pelo OCR em resolução maior."""
+    return extract_title_and_year(get_engine().header_text(page))
+
+
+# Categoria (rótulo das métricas) de cada motivo de descarte; os demais são erros de leitura.
+REJECTION_KINDS = {
+    'PDF Vazio': 'empty',
+    'Não está em português': 'language',
+    'Tempo limite excedido': 'timeout',
+    'Falha no processo de extração': 'crash',
+}
+
+
+def process_single_pdf(pdf_path):
+    """
+    Processa um único PDF, aplicando o Agente 1 e extraindo metadados.
+
+    O texto volta no resultado (`text`, páginas separadas por
+    PAGE_SEPARATOR), pronto para a divisão em trechos e para o
+    armazenamento de documentos, sem passar por um arquivo intermediário.
+    """
     filename = os.path.basename(pdf_path)
+    started = time.monotonic()
     try:
-        output_file = os.path.splitext(filename)[0] + '.txt'
-        output_path = os.path.join(output_dir, output_file)
-        
         with fitz.open(pdf_path) as pdf:
             if not pdf.page_count > 0:
                 logging.warning(f"PDF vazio ou corrompido: {filename}")
                 return {'filename': filename, 'title': 'Error', 'reason': 'PDF Vazio'}
 
-            page = pdf[0]
-            page_text = page.get_text()
-            
-            if not page_text.strip():
-                pix = page.get_pixmap()
-                img = Image.open(io.BytesIO(pix.tobytes()))
-                page_text = pytesseract.image_to_string(img, lang='por')
+            pages = iter_page_texts(pdf)
+            _, first_page_text, first_page_ocr = next(pages)
             
             # --- Aplicação do AGENTE 1 ---
-            if not is_portuguese(page_text):
+            if not is_portuguese(first_page_text):
                 logging.warning(f"Documento '{filename}' parece não estar em português e será descartado.")
                 return {'filename': filename, 'title': 'Error', 'reason': 'Não está em português'}
 
-            title, year = extract_title_and_year(page_text)
+            # O título e o ano vêm do texto da primeira página (já lida pelo OCR,
+            # se digitalizada). O cabeçalho só é relido, em resolução maior,
+            # quando o OCR da página inteira não os encontrou.
+            title, year = extract_title_and_year(first_page_text)
+            if year is None and first_page_ocr:
+                title, year = scanned_header_title(pdf[0])
             
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(f"Title: {title}\n")
-                f.write(f"Year: {year}\n")
-                f.write(f"Text: {page_text.strip()}")
-                
-            logging.info(f"Processado: {filename}")
-            return {'filename': filename, 'title': title, 'year': year}
+            page_texts, ocr_pages = [first_page_text], int(first_page_ocr)
+            for _, page_text, ocr in pages:
+                page_texts.append(page_text)
+                ocr_pages += ocr
+
+            logging.info(f"Processado: {filename} ({len(page_texts)} páginas, {ocr_pages} com OCR)")
+            return {
+                'filename': filename, 'title': title, 'year': year, 'pages': len(page_texts), 'ocr_pages': ocr_pages,
+                'text': PAGE_SEPARATOR.join(page_texts).strip(), 'seconds': round(time.monotonic() - started, 3)
+            }
                     
     except Exception as e:
         logging.error(f"Erro ao processar {filename}: {str(e)}")
         return {'filename': filename, 'title': 'Error', 'reason': str(e)}
 
-def process_pdfs(pdf_dir, output_dir, max_workers=3):
+def _init_worker(log_level):
+    """Configura o logging nos processos filhos (iniciados com 'spawn')."""
+    logging.basicConfig(level=log_level)
+
+
+def _terminate_pool(executor):
+    """Encerra o pool imediatamente, matando processos travados ou em execução."""
+    processes = list((getattr(executor, '_processes', None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+
+class ExtractionPool:
     """
-    Processa todos os PDFs em paralelo e retorna os títulos.
+    Pool de processos para a extração/OCR de PDFs.
+
+    Usa processos em vez de threads porque a renderização do fitz, o
+    tratamento do resultado do Tesseract e o langdetect disputam o GIL.
+    Cada arquivo tem um tempo limite; um PDF que trava ou derruba o
+    processo (ex.: falha de segmentação no MuPDF) é marcado como erro sem
+    afetar os demais: o pool é recriado e os arquivos que estavam em
+    execução junto com ele são reexecutados isoladamente.
+    """
+
+    def __init__(self, max_workers=None, timeout=180, max_tasks_per_child=50, progress_every=10,
+                 worker=process_single_pdf):
+        # `worker` precisa ser uma função de nível de módulo (serializável).
+        self.worker = worker
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        self.progress_every = progress_every
+        self._executor = None
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(logging.getLogger().level,),
+            max_tasks_per_child=self.max_tasks_per_child
+        )
+
+    def _restart(self):
+        if self._executor is not None:
+            _terminate_pool(self._executor)
+        self._executor = self._new_executor()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def imap(self, pdf_paths):
+        """
+        Processa os PDFs e produz (caminho, resultado) na mesma ordem da entrada.
+
+        `pdf_paths` pode ser qualquer iterável (inclusive um gerador): os
+        arquivos são consumidos sob demanda, e no máximo `max_workers`
+        ficam em execução ao mesmo tempo.
+        """
+        source = iter(pdf_paths)
+        requeued = deque()     # (índice, caminho, tentativas) interrompidos por um reinício do pool
+        retries = deque()      # (índice, caminho, tentativas) a reexecutar isoladamente
+        inflight = {}          # future -> (índice, caminho, tentativas, prazo)
+        finished = {}          # índice -> (caminho, resultado), aguardando a vez na ordem
+        next_index = 0
+        next_to_yield = 0
+        exhausted = False
+        started = time.monotonic()
+
+        if self._executor is None:
+            self._executor = self._new_executor()
+
+        def submit(index, path, attempts):
+            future = self._executor.submit(self.worker, path)
+            inflight[future] = (index, path, attempts, time.monotonic() + self.timeout)
+
+        while True:
+            # Reexecuções de suspeitos de derrubar o pool rodam sozinhas.
+            if retries:
+                if not inflight:
+                    submit(*retries.popleft())
+            else:
+                while requeued and len(inflight) < self.max_workers:
+                    submit(*requeued.popleft())
+                while not exhausted and len(inflight) < self.max_workers:
+                    path = next(source, None)
+                    if path is None:
+                        exhausted = True
+                        break
+                    submit(next_index, path, 0)
+                    next_index += 1
+
+            if not inflight:
+                if exhausted and not retries and not requeued:
+                    break
+                continue
+
+            nearest_deadline = min(deadline for *_, deadline in inflight.values())
+            done, _ = wait(
+                inflight,
+                timeout=max(0.0, nearest_deadline - time.monotonic()),
+                return_when=FIRST_COMPLETED
+            )
+
+            broken = False
+            for future in done:
+                index, path, attempts, _ = inflight.pop(future)
+                try:
+                    finished[index] = (path, future.result())
+                except BrokenProcessPool:
+                    broken = True
+                    self._requeue_crashed(retries, finished, index, path, attempts)
+                except Exception as e:
+                    filename = os.path.basename(path)
+                    logging.error(f"Erro ao processar {filename}: {e}")
+                    finished[index] = (path, {'filename': filename, 'title': 'Error', 'reason': str(e)})
+
+            now = time.monotonic()
+            expired = [f for f, (*_, deadline) in inflight.items() if deadline <= now]
+            if broken or expired:
+                for future in expired:
+                    index, path, _, _ = inflight.pop(future)
+                    filename = os.path.basename(path)
+                    logging.error(f"Tempo limite de {self.timeout}s excedido ao processar {filename}.")
+                    finished[index] = (path, {'filename': filename, 'title': 'Error', 'reason': 'Tempo limite excedido'})
+                # Os demais arquivos em execução são recolocados na fila e o pool é recriado.
+                for future, (index, path, attempts, _) in list(inflight.items()):
+                    if broken:
+                        self._requeue_crashed(retries, finished, index, path, attempts)
+                    else:
+                        requeued.append((index, path, attempts))
+                inflight.clear()
+                self._restart()
+
+            while next_to_yield in finished:
+                yield finished.pop(next_to_yield)
+                next_to_yield += 1
+                if self.progress_every and next_to_yield % self.progress_every == 0:
+                    elapsed = time.monotonic() - started
+                    logging.info(
+                        f"Progresso da extração: {next_to_yield} arquivos em {elapsed:.1f}s "
+                        f"({next_to_yield / elapsed:.2f} arquivos/s, {self.max_workers} processos)"
+                    )
+
+    @staticmethod
+    def _requeue_crashed(retries, finished, index, path, attempts):
+        """Reexecuta sozinho um arquivo afetado por uma queda do pool, ou o descarta na segunda queda."""
+        filename = os.path.basename(path)
+        if attempts >= 1:
+            logging.error(f"{filename} derrubou o processo de extração e será descartado.")
+            finished[index] = (path, {'filename': filename, 'title': 'Error', 'reason': 'Falha no processo de extração'})
+        else:
+            retries.append((index, path, attempts + 1))
+
+
+def process_pdfs(pdf_dir, max_workers=None, timeout=180):
+    """
+    Processa todos os PDFs em paralelo (pool de processos) e retorna os resultados, com o texto de cada um.
     """
-    os.makedirs(output_dir, exist_ok=True)
-    
     pdf_files = [f for f in os.listdir(pdf_dir) if f.endswith('.pdf')]
     total_files = len(pdf_files)
     logging.info(f"Iniciando o processamento de {total_files} arquivos PDF")
     
     results = []
     success_count = 0
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [
-            executor.submit(
-                process_single_pdf,
-                os.path.join(pdf_dir, pdf_file),
-                output_dir
-            )
-            for pdf_file in pdf_files
-        ]
-        
-        for i, future in enumerate(futures, 1):
-            result = future.result()
+    with ExtractionPool(max_workers=max_workers, timeout=timeout) as pool:
+        paths = (os.path.join(pdf_dir, pdf_file) for pdf_file in pdf_files)
+        for _, result in pool.imap(paths):
             if result and result['title'] != 'Error':
                 success_count += 1
                 results.append(result)
-            
-            if i % 5 == 0:  # Log de progresso a cada 5 arquivos
-                logging.info(f"Progresso do processamento: {i}/{total_files} ({(i/total_files)*100:.1f}%)")
     
     logging.info(f"Processamento de PDF concluído. {success_count} de {total_files} arquivos processados com sucesso")
-    return results
\ No newline at end of file
+    return results
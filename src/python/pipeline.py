@@ -0,0 +1,243 @@
+import time
+import queue
+import logging
+import threading
+import contextvars
+
+logger = logging.getLogger(__name__)
+
+# Marca o fim do fluxo de uma fila.
+_DONE = object()
+
+
+class PipelineAborted(Exception):
+    """Levantada dentro de uma etapa quando outra etapa falhou."""
+
+
+class StageStats:
+    """Contadores de uma etapa: itens produzidos e tempo ocupado vs. esperando."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.waiting = 0.0
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def busy(self):
+        return max(0.0, self.elapsed - self.waiting)
+
+    @property
+    def throughput(self):
+        return self.items / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "items": self.items,
+            "elapsed_s": round(self.elapsed, 3),
+            "busy_s": round(self.busy, 3),
+            "items_per_s": round(self.throughput, 3),
+        }
+
+
+class QueueStats:
+    """Amostras de profundidade de uma fila limitada."""
+
+    def __init__(self, name, q):
+        self.name = name
+        self.queue = q
+        self.samples = 0
+        self.total_depth = 0
+        self.max_depth = 0
+
+    def sample(self):
+        depth = self.queue.qsize()
+        self.samples += 1
+        self.total_depth += depth
+        self.max_depth = max(self.max_depth, depth)
+        return depth
+
+    def as_dict(self):
+        return {
+            "maxsize": self.queue.maxsize,
+            "max_depth": self.max_depth,
+            "avg_depth": round(self.total_depth / self.samples, 2) if self.samples else 0.0,
+        }
+
+
+class Pipeline:
+    """
+    Pipeline produtor/consumidor com uma thread por etapa e filas limitadas.
+
+    As etapas rodam em paralelo; como cada fila tem tamanho máximo, uma etapa
+    rápida bloqueia quando a seguinte está atrasada, e o consumo de memória
+    fica constante independentemente do tamanho do acervo. Se qualquer etapa
+    falhar, as demais são interrompidas e o erro é relançado por `run()`.
+    """
+
+    def __init__(self, report_interval=30.0, poll_interval=0.5):
+        self.report_interval = report_interval
+        self.poll_interval = poll_interval
+        self.stages = []
+        self.queues = []
+        self.errors = []
+        self._stop = threading.Event()
+
+    def add_queue(self, name, maxsize):
+        q = queue.Queue(maxsize=maxsize)
+        self.queues.append(QueueStats(name, q))
+        return q
+
+    def add_stage(self, name, target, inbox=None, outbox=None, batch_size=None, max_wait=None):
+        """
+        Registra uma etapa.
+
+        `target` recebe `emit` (função que envia um item para `outbox`) e,
+        se houver `inbox`, um iterador com os itens da fila de entrada como
+        primeiro argumento. Com `batch_size`, o iterador produz listas de até
+        `batch_size` itens, liberadas antes se `max_wait` segundos se passarem
+        desde o primeiro item do lote.
+        """
+        stats = StageStats(name)
+        self.stages.append((stats, target, inbox, outbox, batch_size, max_wait))
+        return stats
+
+    def _put(self, q, item, stats):
+        start = time.monotonic()
+        try:
+            while True:
+                if self._stop.is_set():
+                    raise PipelineAborted()
+                try:
+                    q.put(item, timeout=self.poll_interval)
+                    return
+                except queue.Full:
+                    continue
+        finally:
+            stats.waiting += time.monotonic() - start
+
+    def _get(self, q, stats, timeout=None):
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        try:
+            while True:
+                if self._stop.is_set():
+                    raise PipelineAborted()
+                wait = self.poll_interval
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        raise queue.Empty()
+                try:
+                    return q.get(timeout=wait)
+                except queue.Empty:
+                    continue
+        finally:
+            stats.waiting += time.monotonic() - start
+
+    def _consume(self, q, stats):
+        while True:
+            item = self._get(q, stats)
+            if item is _DONE:
+                return
+            yield item
+
+    def _consume_batches(self, q, stats, batch_size, max_wait):
+        while True:
+            item = self._get(q, stats)
+            if item is _DONE:
+                return
+            batch = [item]
+            first_at = time.monotonic()
+            while len(batch) < batch_size:
+                remaining = None
+                if max_wait is not None:
+                    remaining = max_wait - (time.monotonic() - first_at)
+                    if remaining <= 0:
+                        break
+                try:
+                    item = self._get(q, stats, timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    yield batch
+                    return
+                batch.append(item)
+            yield batch
+
+    def _run_stage(self, stats, target, inbox, outbox, batch_size, max_wait):
+        stats.started = time.monotonic()
+
+        def emit(item):
+            if outbox is not None:
+                self._put(outbox, item, stats)
+            stats.items += 1
+
+        try:
+            if inbox is None:
+                target(emit)
+            elif batch_size:
+                target(self._consume_batches(inbox, stats, batch_size, max_wait), emit)
+            else:
+                target(self._consume(inbox, stats), emit)
+        except PipelineAborted:
+            pass
+        except Exception as e:
+            logger.error(f"Etapa '{stats.name}' falhou: {e}", exc_info=True)
+            self.errors.append(e)
+            self._stop.set()
+        finally:
+            stats.finished = time.monotonic()
+            if outbox is not None and not self._stop.is_set():
+                try:
+                    self._put(outbox, _DONE, stats)
+                except PipelineAborted:
+                    pass
+
+    def report(self):
+        """Estado atual: vazão por etapa e profundidade das filas."""
+        for q in self.queues:
+            q.sample()
+        return {
+            "stages": {stats.name: stats.as_dict() for stats, *_ in self.stages},
+            "queues": {q.name: q.as_dict() for q in self.queues},
+        }
+
+    def _log_progress(self):
+        parts = [f"{stats.name}: {stats.items} ({stats.throughput:.2f}/s)" for stats, *_ in self.stages]
+        parts += [f"fila {q.name}: {q.sample()}/{q.queue.maxsize}" for q in self.queues]
+        logger.info("Pipeline | " + " | ".join(parts))
+
+    def run(self):
+        threads = [
+            # Cada etapa roda no contexto de quem chamou `run` (ex.: o id da execução nos logs).
+            threading.Thread(
+                target=contextvars.copy_context().run, args=(self._run_stage, *stage),
+                name=f"pipeline-{stage[0].name}", daemon=True
+            )
+            for stage in self.stages
+        ]
+        for thread in threads:
+            thread.start()
+
+        next_report = time.monotonic() + self.report_interval
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=self.poll_interval)
+            for q in self.queues:
+                q.sample()
+            if time.monotonic() >= next_report:
+                self._log_progress()
+                next_report = time.monotonic() + self.report_interval
+
+        self._log_progress()
+        if self.errors:
+            raise self.errors[0]
+        return self.report()
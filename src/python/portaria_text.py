@@ -0,0 +1,36 @@
+import re
+
+# Constantes e funções sobre o texto das portarias usadas tanto pela
+# extração (pdf_processor.py) quanto pela API, pelo índice lexical e pelo
+# planejador de consultas. Sem dependências: importá-lo não carrega o
+# PyMuPDF nem o OCR nos workers da API.
+
+# Número e ano de uma portaria ("Portaria nº 123/2024").
+PORTARIA_NUMBER = r'portaria\s+n[°º]?\s*(?P<number>\d+)\s*\/\s*(?P<year>\d{4})'
+
+# Título completo no cabeçalho do documento ("PORTARIA Nº 123/2024/MPC/PA").
+# O flag inline (?i) não é usado; 'flags=re.IGNORECASE' já lida com maiúsculas/minúsculas.
+PORTARIA_PATTERN = re.compile(
+    r'(' + PORTARIA_NUMBER + r'\s*\/\s*mpc\s*\/\s*pa)',
+    flags=re.IGNORECASE
+)
+
+# Referência a uma portaria em uma consulta ("portaria nº 12/2024", "Portaria 12").
+# Mais tolerante que o PORTARIA_PATTERN dos títulos: o "nº" pode faltar ou vir
+# escrito como "n.", "n°" ou "no", e o ano é opcional. É a mesma para o
+# planejador de consultas e para a busca exata do índice lexical.
+PORTARIA_REFERENCE = re.compile(
+    r'\bportaria\s+(?:n[°ºo]?\.?\s*)?(?P<number>\d+)(?:\s*\/\s*(?P<year>\d{4}))?',
+    flags=re.IGNORECASE
+)
+
+# Separa as páginas no texto extraído, para que os trechos indexados saibam de que página vêm.
+PAGE_SEPARATOR = '\f'
+
+# Tamanho do resumo de um trecho exibido nos resultados da busca.
+SNIPPET_LENGTH = 250
+
+
+def make_snippet(text, length=SNIPPET_LENGTH):
+    """Resumo de um trecho: o início do texto, com reticências se ele for cortado."""
+    return (text[:length] + '...') if len(text) > length else text
@@ -0,0 +1,193 @@
+import re
+import copy
+import logging
+
+from qdrant_client.http.models import Filter, FieldCondition, MatchAny, MatchValue, Range
+
+from embedding_cache import normalize_query
+from portaria_text import PORTARIA_PATTERN, PORTARIA_REFERENCE
+
+logger = logging.getLogger(__name__)
+
+# Incrementar quando os metadados derivados do texto mudarem; a ingestão
+# recalcula os metadados dos documentos já indexados com outra versão.
+METADATA_VERSION = 1
+
+MONTHS = {
+    'janeiro': 1, 'fevereiro': 2, 'marco': 3, 'abril': 4, 'maio': 5, 'junho': 6,
+    'julho': 7, 'agosto': 8, 'setembro': 9, 'outubro': 10, 'novembro': 11, 'dezembro': 12,
+}
+
+# Tipos de portaria e os radicais (sem acentos) que os identificam.
+DOC_TYPES = {
+    'designacao': ('designa',),
+    'nomeacao': ('nomea', 'nomear'),
+    'exoneracao': ('exonera',),
+    'ferias': ('ferias',),
+    'diarias': ('diaria',),
+    'licenca': ('licenca',),
+    'substituicao': ('substitui',),
+    'dispensa': ('dispens',),
+    'cessao': ('cessao', 'ceder', 'cedid'),
+    'aposentadoria': ('aposenta',),
+    'comissao': ('comissao', 'grupo de trabalho'),
+    'gratificacao': ('gratifica',),
+    'delegacao': ('delega',),
+    'teletrabalho': ('teletrabalho',),
+}
+
+_DOC_TYPE_PATTERNS = {
+    doc_type: re.compile(r'\b(?:' + '|'.join(re.escape(stem) for stem in stems) + r')')
+    for doc_type, stems in DOC_TYPES.items()
+}
+
+YEAR = r'(19\d{2}|20\d{2})'
+_MONTH = r'(' + '|'.join(MONTHS) + r')'
+_YEAR_PATTERN = re.compile(r'\b' + YEAR + r'\b')
+_YEAR_RANGE_PATTERNS = [
+    re.compile(r'\b(?:entre|de)\s+' + YEAR + r'\s+(?:e|a|ate)\s+' + YEAR + r'\b'),
+    re.compile(r'\b' + YEAR + r'\s*[-–]\s*' + YEAR + r'\b'),
+]
+_YEAR_FROM_PATTERN = re.compile(r'\b(desde|a partir de|apos|depois de)\s+(?:' + _MONTH + r'\s+de\s+)?' + YEAR + r'\b')
+_YEAR_TO_PATTERN = re.compile(r'\b(ate|antes de)\s+(?:' + _MONTH + r'\s+de\s+)?' + YEAR + r'\b')
+# Um mês só vira filtro com contexto de data ("em março", "no mês de março",
+# "março de 2023", "março/2023", "03/2023"): sozinho, "marco" (sem acento)
+# também é substantivo ("marco legal").
+_MONTH_PATTERNS = [
+    re.compile(r'\b(?:em|durante|mes de)\s+' + _MONTH + r'\b'),
+    re.compile(r'\b' + _MONTH + r'\s*(?:de|/)\s*' + YEAR + r'\b'),
+]
+_NUMERIC_MONTH_PATTERN = re.compile(r'\b(0?[1-9]|1[0-2])\s*/\s*' + YEAR + r'\b')
+_DATE_PATTERN = re.compile(r'\b\d{1,2}\s+de\s+' + _MONTH + r'\s+de\s+' + YEAR + r'\b')
+# "nº 12", "nº 12/2024" sem a palavra "portaria", aplicado ao texto sem
+# normalizar acentos; a referência completa é a PORTARIA_REFERENCE.
+_NUMBER_PATTERN = re.compile(r'\bn[º°]\s*(?P<number>\d{1,4})(?:\s*/\s*(?P<year>\d{4}))?', flags=re.IGNORECASE)
+
+
+def detect_doc_types(normalized_text):
+    return sorted(
+        doc_type for doc_type, pattern in _DOC_TYPE_PATTERNS.items()
+        if pattern.search(normalized_text)
+    )
+
+
+def document_metadata(title, text):
+    """
+    Metadados de filtragem de um documento, indexados no payload de cada trecho.
+
+    `number` vem do título; `month` da data por extenso mais ao final do
+    texto (a data de assinatura); `doc_types` dos radicais encontrados na
+    parte dispositiva (após "resolve"), ou no texto todo se ela não existir.
+    """
+    match = PORTARIA_PATTERN.search(title or '')
+    normalized = normalize_query(text)
+    dates = _DATE_PATTERN.findall(normalized)
+    _, _, dispositive = normalized.partition('resolve')
+    return {
+        "number": int(match.group('number')) if match else None,
+        "month": MONTHS[dates[-1][0]] if dates else None,
+        "doc_types": detect_doc_types(dispositive or normalized),
+    }
+
+
+class QueryPlan:
+    """
+    Restrições de metadados extraídas de uma consulta.
+
+    `years` (anos citados) ou `year_from`/`year_to` (intervalo), `months`,
+    `number` (número da portaria) e `doc_types` (tipos de portaria).
+    """
+
+    def __init__(self, years=None, year_from=None, year_to=None, months=None, number=None, doc_types=None):
+        self.years = years or []
+        self.year_from = year_from
+        self.year_to = year_to
+        self.months = months or []
+        self.number = number
+        self.doc_types = doc_types or []
+
+    @property
+    def is_filtered(self):
+        return bool(
+            self.years or self.year_from or self.year_to or self.months
+            or self.number is not None or self.doc_types
+        )
+
+    # Restrições abandonadas, uma de cada vez e nesta ordem, quando a busca
+    # não encontra nada: tipo, mês e ano. O número da portaria é mantido.
+    RELAXATION_ORDER = (('doc_types',), ('months',), ('years', 'year_from', 'year_to'))
+
+    def relaxed(self):
+        """Cópia do plano sem a próxima restrição de RELAXATION_ORDER, ou None se não restar nenhuma."""
+        for fields in self.RELAXATION_ORDER:
+            if any(getattr(self, field) for field in fields):
+                plan = copy.copy(self)
+                for field in fields:
+                    setattr(plan, field, [] if isinstance(getattr(self, field), list) else None)
+                return plan
+        return None
+
+    def to_filter(self):
+        """Filtro do Qdrant equivalente ao plano, ou None se não houver restrições."""
+        must = []
+        if self.year_from or self.year_to:
+            must.append(FieldCondition(key="year", range=Range(gte=self.year_from, lte=self.year_to)))
+        elif len(self.years) == 1:
+            must.append(FieldCondition(key="year", match=MatchValue(value=self.years[0])))
+        elif self.years:
+            must.append(FieldCondition(key="year", match=MatchAny(any=self.years)))
+        if self.months:
+            must.append(FieldCondition(key="month", match=MatchAny(any=self.months)))
+        if self.number is not None:
+            must.append(FieldCondition(key="number", match=MatchValue(value=self.number)))
+        if self.doc_types:
+            must.append(FieldCondition(key="doc_types", match=MatchAny(any=self.doc_types)))
+        return Filter(must=must) if must else None
+
+    def __repr__(self):
+        fields = {name: value for name, value in vars(self).items() if value not in (None, [])}
+        return f"QueryPlan({fields})"
+
+
+def plan_query(query: str) -> QueryPlan:
+    """Agente 2: extrai da consulta anos, intervalos de anos, meses, número e tipo de portaria."""
+    normalized = normalize_query(query)
+    plan = QueryPlan()
+
+    references = [*PORTARIA_REFERENCE.finditer(query), *_NUMBER_PATTERN.finditer(query)]
+    for match in references:
+        # "portaria 2023" cita um ano, não um número.
+        if match.group('year') or not _YEAR_PATTERN.fullmatch(match.group('number')):
+            plan.number = int(match.group('number'))
+            if match.group('year'):
+                plan.years = [int(match.group('year'))]
+            # "12/2024" é o número da portaria, não um mês.
+            normalized = normalized.replace(normalize_query(match.group(0)), ' ')
+            break
+
+    for pattern in _YEAR_RANGE_PATTERNS:
+        match = pattern.search(normalized)
+        if match:
+            first, last = sorted(int(year) for year in match.groups())
+            plan.year_from, plan.year_to = first, last
+            break
+    else:
+        # Meses usados como limite de um intervalo ("desde março de 2023") não viram filtro de mês.
+        match = _YEAR_FROM_PATTERN.search(normalized)
+        if match:
+            year = int(match.group(3))
+            plan.year_from = year + 1 if match.group(1) in ('apos', 'depois de') and not match.group(2) else year
+            normalized = normalized.replace(match.group(0), ' ')
+        match = _YEAR_TO_PATTERN.search(normalized)
+        if match:
+            year = int(match.group(3))
+            plan.year_to = year - 1 if match.group(1) == 'antes de' and not match.group(2) else year
+            normalized = normalized.replace(match.group(0), ' ')
+        if not (plan.year_from or plan.year_to) and not plan.years:
+            plan.years = sorted({int(year) for year in _YEAR_PATTERN.findall(normalized)})
+
+    months = {MONTHS[match.group(1)] for pattern in _MONTH_PATTERNS for match in pattern.finditer(normalized)}
+    months.update(int(match.group(1)) for match in _NUMERIC_MONTH_PATTERN.finditer(normalized))
+    plan.months = sorted(months)
+    plan.doc_types = detect_doc_types(normalized)
+    return plan
@@ -1,39 +1,99 @@
+import time
+
+# Início da importação, para medir o tempo de inicialização da API (ver `warmup`).
+IMPORT_STARTED = time.perf_counter()
+
 import os
 import logging
+import functools
 import uuid
 import re
-from flask import Flask, request, jsonify
+import json
+import base64
+import hashlib
+import gzip
+import sqlite3
+from flask import Flask, Response, request, jsonify, stream_with_context, g
 from qdrant_client import QdrantClient
 from langchain_core.prompts import PromptTemplate
-from qdrant_client.http.models import Filter, FieldCondition, MatchValue
+from qdrant_client.http.models import PointGroup, ScoredPoint, SearchRequest
+import numpy as np
 
 from langchain_gemini import llm, embed_model
+from portaria_text import PAGE_SEPARATOR, make_snippet
+from embedding_cache import CachedEmbeddings, normalize_query
+from answer_cache import AnswerCache
+from context_builder import ContextBuilder
+from lexical_index import LexicalIndex, parse_portaria_reference, reciprocal_rank_fusion
+from query_planner import plan_query
+from index_version import IndexVersion
+from single_flight import SingleFlight
+from vector_store import LocalVectorStore
+from collection_profiles import CollectionProfile
+from document_store import DocumentStore
+from lazy_resource import LazyResource
+from warmup import Warmup, ReadinessProbe
+from metrics import (
+    metrics, LOG_FORMAT, PROMETHEUS_CONTENT_TYPE, install_request_id_logging, new_request_id, request_id_var
+)
 from settings import settings
 
 
 app = Flask(__name__)
 
-qdrant_client = QdrantClient(
-    url=settings.QDRANT_URL,
-    timeout=60.0
+# Criado no primeiro uso (e de novo em cada worker após um fork): a API sobe
+# mesmo com o Qdrant ainda indisponível, e o /readyz indica quando ele responde.
+qdrant_client = LazyResource(
+    lambda: QdrantClient(url=settings.QDRANT_URL, timeout=60.0),
+    "qdrant_client"
+)
+
+# Cache dos embeddings de consulta (LRU em memória + SQLite compartilhado entre workers).
+query_embedder = CachedEmbeddings(
+    embed_model,
+    maxsize=settings.EMBEDDING_CACHE_SIZE,
+    persistent_path=settings.EMBEDDING_CACHE_PATH,
+    max_persistent_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
 )
 
-TEXT_DIR = "/app/extracted_texts"
+# Cache de respostas do /ask, invalidado quando a ingestão renova a versão do índice.
+answer_cache = AnswerCache(maxsize=settings.ANSWER_CACHE_SIZE, ttl=settings.ANSWER_CACHE_TTL)
+# Janelas de resultados do /search: as páginas seguintes à primeira não refazem a busca.
+search_windows = AnswerCache(maxsize=settings.SEARCH_WINDOW_CACHE_SIZE, ttl=settings.SEARCH_WINDOW_CACHE_TTL)
+index_version = IndexVersion(settings.INDEX_VERSION_PATH)
+
+# Índice lexical (BM25) mantido pela ingestão, usado na busca híbrida e nas consultas exatas.
+lexical_index = LexicalIndex(settings.LEXICAL_INDEX_PATH, readonly=True)
+
+# Parâmetros de busca (ef do HNSW, rescoring da quantização) do perfil da coleção.
+search_params = CollectionProfile.from_settings(settings).search_params()
+
+# Cópia local dos vetores gravada pela ingestão: backend de busca sem o
+# Qdrant (VECTOR_BACKEND=local) ou reserva quando ele falha (fallback).
+local_store = LocalVectorStore(settings.VECTOR_STORE_PATH)
+
+# Textos extraídos pela ingestão (arquivo de dados mapeado em memória), servidos pelo /document.
+document_store = DocumentStore(settings.DOCUMENT_STORE_PATH, readonly=True, page_separator=PAGE_SEPARATOR)
 
-# Configuração do Logger para registrar eventos e erros.
-logging.basicConfig(level=settings.LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Pedidos idênticos simultâneos compartilham uma só recuperação e uma só geração da resposta.
+retrieval_flight = SingleFlight(wait_timeout=settings.SINGLE_FLIGHT_WAIT_TIMEOUT)
+answer_flight = SingleFlight(wait_timeout=settings.SINGLE_FLIGHT_WAIT_TIMEOUT)
+
+# Configuração do Logger para registrar eventos e erros, com o id de cada pedido.
+logging.basicConfig(level=settings.LOG_LEVEL, format=LOG_FORMAT)
+install_request_id_logging()
 logger = logging.getLogger(__name__)
+
+# Contadores já mantidos pelos componentes, expostos no /metrics.
+metrics.register_collector("rag_answer_cache", answer_cache.stats, "Cache de respostas do /ask.")
+metrics.register_collector("rag_search_windows", search_windows.stats, "Janelas de resultados do /search.")
+metrics.register_collector("rag_embedding_cache", query_embedder.stats, "Cache dos embeddings de consulta.")
+metrics.register_collector("rag_retrieval_flight", retrieval_flight.stats, "Coalescência de buscas idênticas.")
+metrics.register_collector("rag_answer_flight", answer_flight.stats, "Coalescência de respostas idênticas.")
 #
 # --- FIM DA CORREÇÃO ---
 
 
-# Agente 2: Função para extrair o ano
-def extract_year_from_query(query: str):
-    """Extrai um ano de 4 dígitos da string de busca."""
-    match = re.search(r'\b(20\d{2})\b', query)
-    return int(match.group(1)) if match else None
-
-
 # Definição do prompt e da cadeia de RAG
 prompt_template = """
 Você é um assistente de pesquisa altamente preciso e especializado em documentos do Ministério Público de Contas do Estado do Pará (MPC-PA). Sua tarefa é responder à pergunta do usuário baseando-se estritamente no contexto das portarias fornecidas.
@@ -54,153 +114,1241 @@ Você é um assistente de pesquisa altamente preciso e especializado em document
 **Resposta Concisa:**
 """
 prompt = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
-rag_chain = prompt | llm
+rag_chain = LazyResource(lambda: prompt | llm.get(), "rag_chain")
 
+# Seleção dos trechos do contexto dentro do orçamento de tokens.
+context_builder = ContextBuilder(
+    token_budget=settings.CONTEXT_TOKEN_BUDGET,
+    mmr_lambda=settings.CONTEXT_MMR_LAMBDA,
+    dedup_threshold=settings.CONTEXT_DEDUP_THRESHOLD,
+    chars_per_token=settings.CONTEXT_CHARS_PER_TOKEN
+)
 
-@app.route('/ask', methods=['POST'])
-def ask_question():
-    data = request.get_json()
-    question = data.get('question')
+# Muda sempre que o prompt, o modelo de chat ou a montagem do contexto mudam,
+# invalidando o cache de respostas.
+PROMPT_VERSION = hashlib.sha256(
+    f"{getattr(llm, 'model', '')}|{context_builder.version}|{prompt_template}".encode('utf-8')
+).hexdigest()[:16]
 
-    if not question:
-        return jsonify({"error": "Nenhuma pergunta fornecida"}), 400
 
+NO_DOCUMENTS_ANSWER = "Não encontrei nenhuma portaria relevante para responder a sua pergunta."
+
+# Campos do payload que o /search usa; o texto completo dos trechos não é trazido do Qdrant.
+SEARCH_PAYLOAD_FIELDS = ["source", "title", "snippet", "page"]
+
+
+# Sondagens de saúde e /metrics: fora das métricas por rota e do limite de concorrência.
+PROBE_ROUTES = ("/metrics", "/healthz", "/readyz")
+
+
+def describe_collection(info):
+    """Registra os metadados da coleção lidos no aquecimento e avisa se a dimensão não bate com a do modelo."""
+    size = getattr(info.config.params.vectors, 'size', None)
+    if size is not None and size != settings.EMBEDDING_DIM:
+        logger.warning(f"A coleção '{settings.QDRANT_COLLECTION}' tem vetores de {size} dimensões; "
+                       f"EMBEDDING_DIM é {settings.EMBEDDING_DIM}.")
+    logger.info(f"Coleção '{settings.QDRANT_COLLECTION}': {info.points_count} pontos, status {info.status}.")
+
+
+def warm_models():
+    """Constrói o modelo de embeddings e a cadeia do LLM (sem chamar a API)."""
+    embed_model.get()
+    rag_chain.get()
+
+
+def preload_query_embeddings():
+    """Carrega no LRU os embeddings de consulta mais recentes do cache persistente."""
+    count = query_embedder.preload(settings.WARMUP_PRELOAD_QUERIES)
+    logger.info(f"Aquecimento: {count} embeddings de consulta carregados do cache persistente.")
+
+
+def vector_backend_status(qdrant_error=None):
+    """(pronto, detalhes) do backend vetorial, dado o erro da sondagem do Qdrant (None se ele respondeu)."""
+    if settings.VECTOR_BACKEND == "local":
+        return local_store.available(), {"backend": "local"}
+    if qdrant_error is None:
+        return True, {"backend": "qdrant"}
+    details = {"backend": "qdrant", "error": str(qdrant_error)}
+    if settings.VECTOR_BACKEND == "fallback" and local_store.available():
+        # Os pedidos serão atendidos pelo armazenamento local.
+        return True, {**details, "backend": "local (fallback)"}
+    return False, details
+
+
+def build_query_filter(plan):
+    """Agente 2: monta o filtro de metadados e o limite de busca a partir do plano da consulta."""
+    query_filter = plan.to_filter()
+    if query_filter is None:
+        return None, settings.RETRIEVAL_LIMIT
+
+    logger.info(f"Agente 2: Ativando filtro de metadados no Qdrant: {plan}")
+    metrics.counter("rag_filtered_searches_total", "Buscas com filtro de metadados.").inc()
+    return query_filter, settings.FILTERED_RETRIEVAL_LIMIT
+
+
+def vector_backend(qdrant_call, local_call):
+    """
+    Executa uma operação no backend vetorial de `VECTOR_BACKEND`: no Qdrant
+    (`qdrant_call`), no armazenamento local (`local_call`) ou no Qdrant
+    recorrendo ao armazenamento local se ele falhar ("fallback").
+    """
+    if settings.VECTOR_BACKEND == "local":
+        return local_call()
     try:
-        year_constraint = extract_year_from_query(question)
-        query_filter = None
-        limit = settings.RETRIEVAL_LIMIT
-
-        if year_constraint:
-            logger.info(f"Agente 2: Ativando filtro de metadados no Qdrant para o ano: {year_constraint}")
-            query_filter = Filter(
-                must=[
-                    FieldCondition(key="year", match=MatchValue(value=year_constraint))
-                ]
-            )
-            limit = settings.FILTERED_RETRIEVAL_LIMIT
+        return qdrant_call()
+    except Exception as e:
+        if settings.VECTOR_BACKEND != "fallback" or not local_store.available():
+            raise
+        logger.warning(f"Falha no Qdrant ({e}); usando o armazenamento vetorial local.")
+        metrics.counter("rag_vector_fallbacks_total", "Operações atendidas pelo armazenamento local após falha do Qdrant.").inc()
+        return local_call()
+
+
+def search_groups_request(query_vector, query_filter, limit, with_vectors=False, with_payload=True):
+    """Argumentos do `search_groups` do Qdrant (cliente síncrono ou assíncrono): trechos agrupados por arquivo de origem."""
+    return {
+        "collection_name": settings.QDRANT_COLLECTION,
+        "query_vector": query_vector,
+        "group_by": "source",
+        "query_filter": query_filter,
+        "limit": limit,
+        "group_size": settings.CHUNKS_PER_SOURCE,
+        "search_params": search_params,
+        "with_payload": with_payload,
+        "with_vectors": with_vectors,
+    }
+
+
+def search_vectors(query_vector, query_filter, limit, with_vectors=False, with_payload=True):
+    """Busca vetorial, agrupada por arquivo de origem."""
+    return vector_backend(
+        lambda: qdrant_client.search_groups(
+            **search_groups_request(query_vector, query_filter, limit, with_vectors, with_payload)
+        ).groups,
+        lambda: local_store.search_groups(
+            query_vector, query_filter, limit, settings.CHUNKS_PER_SOURCE, with_payload, with_vectors
+        )
+    )
+
+
+def group_hits(hits, limit):
+    """Agrupa por portaria, como o `search_groups`, os trechos de uma busca não agrupada."""
+    groups = {}
+    for hit in hits:
+        source_hits = groups.get(hit.payload['source'])
+        if source_hits is None:
+            if len(groups) >= limit:
+                continue
+            source_hits = groups[hit.payload['source']] = []
+        if len(source_hits) < settings.CHUNKS_PER_SOURCE:
+            source_hits.append(hit)
+    return [PointGroup(id=source, hits=hits) for source, hits in groups.items()]
+
 
-        logger.info(f"Buscando até {limit} docs para: '{question}'")
-        found_docs = qdrant_client.search(
+def search_vectors_batch(searches, with_vectors=False, with_payload=True):
+    """
+    Várias buscas vetoriais em uma única chamada ao Qdrant (`search_batch`).
+
+    `searches` é uma lista de (vetor, filtro, limite de portarias). A busca
+    em lote não agrupa por arquivo de origem: cada uma traz
+    `BATCH_GROUP_OVERFETCH` vezes os trechos necessários e os grupos são
+    montados aqui.
+    """
+    if not searches:
+        return []
+
+    def qdrant_call():
+        responses = qdrant_client.search_batch(
             collection_name=settings.QDRANT_COLLECTION,
-            query_vector=embed_model.embed_query(question),
-            query_filter=query_filter,
-            limit=limit
+            requests=batch_search_requests(searches, with_vectors, with_payload)
+        )
+        return [group_hits(hits, limit) for hits, (_, _, limit) in zip(responses, searches)]
+
+    return vector_backend(qdrant_call, lambda: local_search_batch(searches, with_vectors, with_payload))
+
+
+def local_search_batch(searches, with_vectors=False, with_payload=True):
+    """As buscas de `search_vectors_batch` no armazenamento local, já agrupadas por portaria."""
+    return [
+        local_store.search_groups(
+            query_vector, query_filter, limit, settings.CHUNKS_PER_SOURCE, with_payload, with_vectors
+        )
+        for query_vector, query_filter, limit in searches
+    ]
+
+
+def batch_search_requests(searches, with_vectors=False, with_payload=True):
+    """Pedidos do `search_batch` para uma lista de (vetor, filtro, limite de portarias)."""
+    return [
+        SearchRequest(
+            vector=query_vector,
+            filter=query_filter,
+            limit=limit * settings.CHUNKS_PER_SOURCE * settings.BATCH_GROUP_OVERFETCH,
+            params=search_params,
+            with_payload=with_payload,
+            with_vector=with_vectors
         )
+        for query_vector, query_filter, limit in searches
+    ]
+
+
+def _lexical_point(row, score):
+    """Converte uma linha do índice lexical no formato dos pontos retornados pelo Qdrant."""
+    return ScoredPoint(
+        id=row['point_id'],
+        version=0,
+        score=score,
+        payload={
+            "source": row['source'],
+            "title": row['title'],
+            "year": row['year'],
+            "page": row['page'],
+            "chunk_index": row['chunk_index'],
+            "page_content": row['text'],
+            "snippet": make_snippet(row['text']),
+        }
+    )
+
+
+def _cosine(a, b):
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / norm if norm else 0.0
+
+
+def fusion_candidates(groups, lexical_rows):
+    """
+    Primeira etapa da fusão: a ordem combinada dos ids, os pontos já
+    trazidos pela busca vetorial (por id) e os ids que faltam ler do Qdrant.
+    """
+    vector_hits = sorted(flatten_groups(groups), key=lambda hit: hit.score, reverse=True)
+    points = {str(hit.id): hit for hit in vector_hits}
+    fused = reciprocal_rank_fusion(
+        [[str(hit.id) for hit in vector_hits], [row['point_id'] for row in lexical_rows]],
+        k=settings.RRF_K
+    )
+    missing = [point_id for point_id, _ in fused if point_id not in points]
+    return fused, points, missing
+
+
+def assemble_fused_groups(fused, points, records, query_vector, limit, with_vectors=False):
+    """Segunda etapa da fusão: completa os pontos com os `records` lidos do Qdrant e reagrupa."""
+    for record in records:
+        points[str(record.id)] = ScoredPoint(
+            id=record.id,
+            version=0,
+            score=_cosine(query_vector, record.vector),
+            payload=record.payload,
+            vector=record.vector if with_vectors else None
+        )
+
+    fused_groups = {}
+    for point_id, _ in fused:
+        point = points.get(point_id)
+        if point is None:
+            # Trecho que não existe mais na coleção (índice lexical atrasado).
+            continue
+        hits = fused_groups.get(point.payload['source'])
+        if hits is None:
+            if len(fused_groups) >= limit:
+                continue
+            hits = fused_groups[point.payload['source']] = []
+        if len(hits) < settings.CHUNKS_PER_SOURCE:
+            hits.append(point)
+    return [PointGroup(id=source, hits=hits) for source, hits in fused_groups.items()]
+
+
+class StageTimeout(Exception):
+    """Uma etapa do pedido (embedding, busca ou geração) excedeu o seu tempo limite (ver rag_api_async.stage)."""
+
+    def __init__(self, stage):
+        super().__init__(f"Tempo esgotado na etapa: {stage}")
+        self.stage = stage
+
+
+# --- Fluxos dos pedidos ---
+#
+# A orquestração de cada pedido é escrita uma só vez, comum às APIs Flask e
+# ASGI, em funções geradoras (`*_flow`): cada `yield (etapa, *argumentos)`
+# pede uma operação de entrada e saída (embedding, busca vetorial, LLM...) e
+# recebe o seu resultado, ou a sua exceção. `Steps.run` executa essas
+# etapas na thread do pedido e `rag_api_async.AsyncSteps.run` no event loop,
+# com chamadas assíncronas e tempos limite. Os fluxos dos pedidos HTTP
+# retornam (status, corpo JSON); cada API só converte isso na sua resposta.
+
+
+def retrieval_flow(query: str, with_vectors=False, with_payload=True, limit=None):
+    """
+    Busca os trechos mais relevantes para a consulta, agrupados por portaria.
+
+    Retorna uma lista de grupos (um por arquivo de origem, do mais ao menos
+    relevante), cada um com até `CHUNKS_PER_SOURCE` trechos em `hits`.
+    Uma consulta que cita uma portaria indexada ("portaria nº 12/2024") é
+    respondida direto pelo índice lexical, sem embedding nem busca
+    vetorial. As demais combinam a busca vetorial do Qdrant com a busca
+    lexical (BM25), ambas restritas pelos filtros do plano da consulta
+    (anos, meses, número e tipo de portaria). Se os filtros não deixarem
+    nenhum resultado, a busca é refeita sem o tipo, depois sem o mês e por
+    fim sem o ano (`QueryPlan.relaxed`).
+    `with_vectors` traz também os vetores, usados na seleção por diversidade
+    do contexto; `with_payload` pode restringir os campos trazidos do Qdrant;
+    `limit` substitui o número de portarias definido pelo plano da consulta.
+    """
+    with metrics.span("rag_stage", stage="exact_lookup"):
+        exact = yield ("exact_groups", query)
+    if exact is not None:
+        return exact
+
+    plan = plan_query(query)
+    query_filter, planned_limit = build_query_filter(plan)
+    limit = limit or planned_limit
+    logger.info(f"Buscando até {limit} portarias para: '{query}'")
+    with metrics.span("rag_stage", stage="embedding"):
+        query_vector = yield ("embed_query", query)
+    with metrics.span("rag_stage", stage="vector_search"):
+        groups = yield ("search_vectors", query_vector, query_filter, limit, with_vectors, with_payload)
+    while not groups and plan.relaxed() is not None:
+        plan = relax_plan(plan)
+        query_filter, _ = build_query_filter(plan)
+        with metrics.span("rag_stage", stage="vector_search"):
+            groups = yield ("search_vectors", query_vector, query_filter, limit, with_vectors, with_payload)
+
+    return (yield from hybrid_flow(query, plan, groups, query_vector, limit, with_vectors, with_payload))
+
+
+def hybrid_flow(query, plan, groups, query_vector, limit, with_vectors=False, with_payload=True):
+    """Combina os grupos da busca vetorial com a busca lexical restrita pelo mesmo plano."""
+    with metrics.span("rag_stage", stage="lexical_search"):
+        try:
+            lexical_rows = yield ("lexical_search", query, plan)
+        except sqlite3.Error:
+            lexical_failure("lexical_search")
+            return groups
+    if not lexical_rows:
+        return groups
+    with metrics.span("rag_stage", stage="fusion"):
+        return (yield from fusion_flow(groups, lexical_rows, query_vector, limit, with_vectors, with_payload))
+
+
+def fusion_flow(groups, lexical_rows, query_vector, limit, with_vectors=False, with_payload=True):
+    """
+    Combina, por Reciprocal Rank Fusion, os trechos da busca vetorial com os
+    da busca lexical e os reagrupa por portaria (até `limit` grupos).
+
+    Trechos encontrados só pela busca lexical são lidos do backend vetorial pelo id;
+    o score exibido continua sendo a similaridade de cosseno com a consulta.
+    """
+    fused, points, missing = fusion_candidates(groups, lexical_rows)
+    records = []
+    if missing:
+        records = yield ("retrieve_points", missing, with_payload)
+    return assemble_fused_groups(fused, points, records, query_vector, limit, with_vectors)
+
+
+def retrieval_batch_flow(queries, with_vectors=False, with_payload=True, limit=None):
+    """
+    Versão em lote do `retrieval_flow`, para várias consultas de uma vez.
+
+    As consultas que não são respondidas pelo índice lexical são vetorizadas
+    em uma única chamada ao modelo de embeddings e buscadas no Qdrant com um
+    único `search_batch` (mais um por etapa de relaxamento dos filtros, só
+    para as que ficaram sem resultado). Retorna, na ordem de `queries`, os grupos de cada
+    consulta ou a exceção que a impediu; falhas do modelo de embeddings ou
+    do Qdrant se propagam.
+    """
+    results, pending = yield ("plan_batch", queries, limit)
+    if not pending:
+        return results
+
+    logger.info(f"Busca em lote: {len(pending)} consultas vetoriais de {len(queries)}.")
+    with metrics.span("rag_stage", stage="embedding_batch"):
+        vectors = yield ("embed_queries", [queries[position] for position, *_ in pending])
+    with metrics.span("rag_stage", stage="vector_search_batch"):
+        group_lists = yield ("search_vectors_batch", batch_searches(vectors, pending), with_vectors, with_payload)
+
+    relaxed = relax_batch(group_lists, pending)
+    while relaxed:
+        retried = yield ("search_vectors_batch", batch_searches(vectors, pending, relaxed), with_vectors, with_payload)
+        for k, groups in zip(relaxed, retried):
+            group_lists[k] = groups
+        relaxed = relax_batch(group_lists, pending)
+
+    fused = yield ("gather", [
+        (hybrid_flow, (queries[position], plan, groups, vector, limit, with_vectors, with_payload))
+        for (position, plan, _, limit), vector, groups in zip(pending, vectors, group_lists)
+    ])
+    for (position, *_), groups in zip(pending, fused):
+        if isinstance(groups, Exception):
+            logger.error(f"Erro na busca híbrida de '{queries[position]}': {groups}")
+        results[position] = groups
+    return results
+
+
+def relax_plan(plan):
+    """O plano sem a próxima restrição a relaxar (ver `QueryPlan.relaxed`), registrando a troca."""
+    relaxed = plan.relaxed()
+    logger.info(f"Nenhum resultado com o filtro {plan}; buscando com {relaxed}.")
+    return relaxed
+
+
+def retrieval_key(query: str, with_vectors=False, with_payload=True, limit=None):
+    """
+    Chave da coalescência de buscas: consulta normalizada, portaria citada,
+    filtros do plano da consulta, parâmetros da busca e versão do índice.
+    """
+    return "|".join([
+        normalize_query(query),
+        repr(parse_portaria_reference(query)),
+        repr(plan_query(query)),
+        repr((with_vectors, with_payload, limit)),
+        index_version.current(),
+    ])
+
+
+def build_context(found_docs, question):
+    """`context_builder.build`, registrando o tempo da montagem e os tamanhos do contexto e do prompt."""
+    with metrics.span("rag_stage", stage="context"):
+        context, sources, stats = context_builder.build(found_docs)
+    metrics.histogram("rag_context_tokens", "Tokens estimados do contexto enviado ao LLM.").observe(stats["tokens"])
+    metrics.histogram("rag_context_chunks", "Trechos selecionados para o contexto.").observe(stats["selected"])
+    metrics.histogram("rag_prompt_chars", "Caracteres do prompt enviado ao LLM.").observe(
+        len(prompt_template) + len(context) + len(question)
+    )
+    return context, sources, stats
+
+
+def lookup_answer(question, found_docs, version=None):
+    """
+    Chave do cache de respostas (pergunta, trechos recuperados e versão do
+    prompt), versão do índice e resposta em cache, ou None. Consultado logo
+    após a recuperação, antes de montar o contexto.
+    """
+    version = version or index_version.current()
+    cache_key = answer_cache.make_key(question, [doc.id for doc in found_docs], PROMPT_VERSION)
+    return cache_key, version, answer_cache.get(cache_key, version)
+
+
+def exact_groups(query: str):
+    """
+    Grupos da portaria citada na consulta, com até `CHUNKS_PER_SOURCE`
+    trechos cada (os primeiros do documento), se ela estiver no índice
+    lexical; senão None. Se o índice não puder ser lido, a consulta segue
+    pela busca vetorial.
+    """
+    reference = parse_portaria_reference(query)
+    if not reference:
+        return None
+    try:
+        rows = lexical_index.find_portaria(*reference)
+    except sqlite3.Error:
+        lexical_failure("exact_lookup")
+        return None
+    if not rows:
+        return None
+    logger.info(f"Portaria nº {reference[0]}/{reference[1]} encontrada no índice lexical.")
+    groups = {}
+    for row in rows:
+        hits = groups.setdefault(row['source'], [])
+        if len(hits) < settings.CHUNKS_PER_SOURCE:
+            hits.append(_lexical_point(row, 1.0))
+    return [PointGroup(id=source, hits=hits) for source, hits in groups.items()]
+
+
+def lexical_failure(stage):
+    """Registra uma leitura do índice lexical que falhou; a busca continua só com os vetores."""
+    logger.warning("Índice lexical indisponível; usando só a busca vetorial.")
+    metrics.counter("rag_lexical_errors_total", "Leituras do índice lexical que falharam.", stage=stage).inc()
+
+
+def plan_batch(queries, limit=None):
+    """
+    Primeira etapa da busca em lote. Retorna `results`, já preenchido com
+    as respostas exatas e os erros, e `pending`: (posição, plano, filtro,
+    limite) de cada consulta que segue para a busca vetorial.
+    """
+    results = [None] * len(queries)
+    pending = []
+    for position, query in enumerate(queries):
+        if not isinstance(query, str) or not query.strip():
+            results[position] = ValueError("Consulta vazia")
+            continue
+        try:
+            exact = exact_groups(query)
+            if exact is not None:
+                results[position] = exact
+                continue
+            plan = plan_query(query)
+            query_filter, planned_limit = build_query_filter(plan)
+            pending.append((position, plan, query_filter, limit or planned_limit))
+        except Exception as e:
+            logger.error(f"Erro ao planejar a consulta '{query}': {e}", exc_info=True)
+            results[position] = e
+    return results, pending
+
+
+def batch_searches(vectors, pending, positions=None):
+    """Buscas vetoriais do lote: (vetor, filtro, limite) das consultas pendentes, ou só das de `positions`."""
+    if positions is None:
+        positions = range(len(pending))
+    return [(vectors[k], pending[k][2], pending[k][3]) for k in positions]
+
+
+def relax_batch(group_lists, pending):
+    """
+    Relaxa o plano (ver `QueryPlan.relaxed`) das consultas do lote que
+    ficaram sem resultado, atualizando o plano e o filtro em `pending`, e
+    retorna as suas posições, a buscar de novo.
+    """
+    relaxed = []
+    for k, groups in enumerate(group_lists):
+        if groups:
+            continue
+        position, plan, _, limit = pending[k]
+        plan = plan.relaxed()
+        if plan is not None:
+            pending[k] = (position, plan, build_query_filter(plan)[0], limit)
+            relaxed.append(k)
+    if relaxed:
+        logger.info(f"{len(relaxed)} consultas do lote sem resultado com os filtros; buscando com filtros mais amplos.")
+    return relaxed
+
+
+def flatten_groups(groups):
+    """Trechos de todos os grupos, na ordem de relevância dos grupos."""
+    return [hit for group in groups for hit in group.hits]
+
+
+def encode_cursor(offset: int) -> str:
+    """Cursor opaco da próxima página do /search."""
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor) -> int:
+    """Posição codificada em um cursor do /search (0 sem cursor). Levanta ValueError se inválido."""
+    if not cursor:
+        return 0
+    try:
+        offset = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))["offset"]
+    except (KeyError, TypeError, UnicodeError, ValueError) as e:
+        raise ValueError("cursor inválido") from e
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError("cursor inválido")
+    return offset
+
+
+def search_window_key(query):
+    """Chave da janela de resultados do /search: a da busca com o limite e os campos do /search."""
+    key = retrieval_key(query, with_payload=SEARCH_PAYLOAD_FIELDS, limit=settings.SEARCH_MAX_RESULTS)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def search_window_flow(query):
+    """
+    Resultados do /search para a consulta: as até SEARCH_MAX_RESULTS
+    portarias da busca, guardadas em `search_windows` para as páginas
+    seguintes. Toda página recorta a mesma janela, então a ordem não muda
+    entre páginas (a fusão com a busca lexical depende do limite).
+    """
+    version = index_version.current()
+    key = search_window_key(query)
+    window = search_windows.get(key, version)
+    if window is None:
+        groups = yield ("retrieve_shared", query, False, SEARCH_PAYLOAD_FIELDS, settings.SEARCH_MAX_RESULTS)
+        window = [search_result(group) for group in groups]
+        search_windows.put(key, window, version)
+    return window
+
+
+def search_page(window, offset, page_size):
+    """Corpo da resposta do /search: a página da janela e o cursor da próxima (nulo na última)."""
+    has_more = len(window) > offset + page_size
+    return {
+        "results": window[offset:offset + page_size],
+        "next_cursor": encode_cursor(offset + page_size) if has_more else None
+    }
+
+
+def batch_items(data, field):
+    """Lista de consultas de um pedido em lote e a mensagem de erro (None se o pedido é válido)."""
+    items = (data or {}).get(field)
+    if not isinstance(items, list) or not items:
+        return None, f"Forneça uma lista não vazia em '{field}'"
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        return None, f"No máximo {settings.BATCH_MAX_ITEMS} itens por lote"
+    return items, None
+
+
+def parse_page_size(data):
+    """`page_size` do pedido, limitado a SEARCH_MAX_PAGE_SIZE. Levanta ValueError/TypeError se inválido."""
+    return max(1, min(int(data.get('page_size') or settings.SEARCH_PAGE_SIZE), settings.SEARCH_MAX_PAGE_SIZE))
+
+
+def batch_error(error, message):
+    """Mensagem de erro de um item do lote: a da validação ou uma genérica."""
+    return str(error) if isinstance(error, ValueError) else message
+
+
+def search_result(group):
+    """Um resultado do /search: a portaria com o resumo do seu trecho mais relevante."""
+    doc = group.hits[0]
+    return {
+        "id": os.path.splitext(doc.payload['source'])[0],
+        "title": doc.payload['title'],
+        "score": doc.score,
+        "page": doc.payload.get('page'),
+        "snippet": doc.payload.get('snippet', '')
+    }
+
+
+def observe_stream(started, llm_started, first_token_at, finished):
+    """Registra os tempos de uma resposta em streaming: LLM, primeiro token e total."""
+    metrics.histogram("rag_stage_seconds", stage="llm").observe(finished - llm_started)
+    metrics.histogram("rag_stream_ttft_seconds", "Tempo até o primeiro token do /ask/stream.").observe(
+        (first_token_at or finished) - started
+    )
+
+
+def sse_event(event: str, data) -> str:
+    """Formata um evento Server-Sent Events com payload JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def ask_flow(data):
+    """Pergunta do /ask: recuperação, cache de respostas e geração da resposta pelo LLM."""
+    question = data.get('question') if data else None
+
+    if not question:
+        return 400, {"error": "Nenhuma pergunta fornecida"}
+
+    try:
+        groups = yield ("retrieve_shared", question, True)
+        found_docs = flatten_groups(groups)
 
         if not found_docs:
-            return jsonify({"answer": "Não encontrei nenhuma portaria relevante para responder a sua pergunta.", "sources": []})
-        
-        logger.info(f"Encontrados {len(found_docs)} documentos relevantes.")
-
-        context = ""
-        sources = []
-        sources_seen = set()
-
-        for doc in found_docs:
-            context += f"Fonte: {doc.payload['source']}\\n"
-            context += f"Título: {doc.payload['title']}\\n"
-            context += f"Conteúdo do trecho: {doc.payload.get('page_content', '')}\\n\\n---\\n\\n"
-            
-            source_filename = doc.payload['source']
-            if source_filename not in sources_seen:
-                sources.append({
-                    "id": os.path.splitext(source_filename)[0],
-                    "title": doc.payload['title']
-                })
-                sources_seen.add(source_filename)
+            return 200, {"answer": NO_DOCUMENTS_ANSWER, "sources": []}
+
+        logger.info(f"Encontrados {len(found_docs)} trechos relevantes em {len(groups)} portarias.")
+
+        cache_key, version, cached = lookup_answer(question, found_docs)
+        if cached is not None:
+            logger.info("Resposta servida do cache.")
+            return 200, cached
+
+        context, sources, _ = yield ("build_context", found_docs, question)
 
         logger.info("Gerando resposta com o LLM...")
-        response = rag_chain.invoke({"context": context, "question": question})
-        answer = response.content
+        # A chave do cache identifica a pergunta e as evidências: pedidos
+        # idênticos em andamento recebem a mesma resposta.
+        answer = yield ("generate_answer", cache_key, context, question)
 
-        return jsonify({
+        result = {
             "answer": answer,
             "sources": sources
-        })
+        }
+        answer_cache.put(cache_key, result, version)
+        return 200, result
 
+    except StageTimeout:
+        raise
     except Exception as e:
         logger.error(f"Erro na API RAG: {e}", exc_info=True)
-        return jsonify({"error": "Ocorreu um erro ao processar sua pergunta."}), 500
+        return 500, {"error": "Ocorreu um erro ao processar sua pergunta."}
 
 
-@app.route('/search', methods=['POST'])
-def search_documents():
-    data = request.get_json()
-    query = data.get('query')
+class AnswerStream:
+    """
+    Resposta do /ask/stream preparada por `ask_stream_flow`. `prelude` são
+    os eventos já prontos: as fontes e, quando o LLM não é necessário
+    (nenhum documento ou resposta em cache), a resposta e o `done`. Senão,
+    `inputs` são as entradas do LLM: a API chama `begin`, passa cada trecho
+    gerado a `token` e termina com `finish` (ou `failed`, se a geração falhar).
+    """
 
-    if not query:
-        return jsonify({"error": "Nenhuma consulta fornecida"}), 400
+    def __init__(self, started, prelude, inputs=None, cache_key=None, version=None, sources=None):
+        self.started = started
+        self.prelude = prelude
+        self.inputs = inputs
+        self.cache_key = cache_key
+        self.version = version
+        self.sources = sources
+        self.llm_started = None
+        self.first_token_at = None
+        self.parts = []
 
-    try:
-        year_constraint = extract_year_from_query(query)
-        query_filter = None
-        limit = settings.RETRIEVAL_LIMIT
-
-        if year_constraint:
-            logger.info(f"Agente 2: Ativando filtro de metadados no Qdrant para o ano: {year_constraint}")
-            query_filter = Filter(
-                must=[
-                    FieldCondition(key="year", match=MatchValue(value=year_constraint))
-                ]
+    @classmethod
+    def ready(cls, started, sources, answer, done):
+        """Resposta que não passa pelo LLM: as fontes, o texto inteiro e o evento `done`."""
+        return cls(started, [
+            sse_event("sources", {"sources": sources}),
+            sse_event("token", {"text": answer}),
+            sse_event("done", done),
+        ])
+
+    def begin(self):
+        """Marca o início da geração e retorna as entradas do LLM."""
+        logger.info("Gerando resposta com o LLM (streaming)...")
+        self.llm_started = time.monotonic()
+        return self.inputs
+
+    def token(self, text):
+        """Evento de um trecho da resposta gerado pelo LLM."""
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+            logger.info(
+                f"Primeiro token em {(self.first_token_at - self.started) * 1000:.0f} ms "
+                f"({(self.first_token_at - self.llm_started) * 1000:.0f} ms no LLM)."
             )
-            limit = settings.FILTERED_RETRIEVAL_LIMIT
-        
-        logger.info(f"Buscando até {limit} portarias para: '{query}'")
-        found_docs = qdrant_client.search(
-            collection_name=settings.QDRANT_COLLECTION,
-            query_vector=embed_model.embed_query(query),
-            query_filter=query_filter,
-            limit=limit
-        )
+        self.parts.append(text)
+        return sse_event("token", {"text": text})
+
+    def finish(self):
+        """Guarda a resposta no cache, registra os tempos e retorna o evento `done`."""
+        finished = time.monotonic()
+        answer_cache.put(self.cache_key, {"answer": "".join(self.parts), "sources": self.sources}, self.version)
+        observe_stream(self.started, self.llm_started, self.first_token_at, finished)
+        ttft_ms = round(((self.first_token_at or finished) - self.started) * 1000, 1)
+        total_ms = round((finished - self.started) * 1000, 1)
+        logger.info(f"Resposta transmitida: TTFT {ttft_ms} ms, total {total_ms} ms.")
+        return sse_event("done", {"cached": False, "ttft_ms": ttft_ms, "total_ms": total_ms})
+
+    def failed(self, error):
+        """Evento de erro de uma geração interrompida por `error`."""
+        logger.error(f"Erro durante o streaming da resposta: {error}", exc_info=not isinstance(error, StageTimeout))
+        return sse_event("error", {"error": "Ocorreu um erro ao gerar a resposta."})
+
+
+def ask_stream_flow(data, started):
+    """Pergunta do /ask/stream: um `AnswerStream`, ou (status, corpo JSON) se o pedido falhar antes do streaming."""
+    question = data.get('question') if data else None
+
+    if not question:
+        return 400, {"error": "Nenhuma pergunta fornecida"}
 
+    try:
+        found_docs = flatten_groups((yield ("retrieve_shared", question, True)))
         if not found_docs:
-            return jsonify({"results": []})
+            return AnswerStream.ready(started, [], NO_DOCUMENTS_ANSWER, {"cached": False})
 
-        results = []
-        for doc in found_docs:
-            snippet = doc.payload.get('page_content', '')
-            results.append({
-                "id": os.path.splitext(doc.payload['source'])[0],
-                "title": doc.payload['title'],
-                "score": doc.score,
-                "snippet": (snippet[:250] + '...') if len(snippet) > 250 else snippet
-            })
-        
-        return jsonify({"results": results})
+        # O cache é consultado antes de montar o contexto, como no /ask.
+        cache_key, version, cached = lookup_answer(question, found_docs)
+        if cached is not None:
+            logger.info("Resposta servida do cache.")
+            total_ms = round((time.monotonic() - started) * 1000, 1)
+            return AnswerStream.ready(started, cached["sources"], cached["answer"], {"cached": True, "total_ms": total_ms})
 
+        context, sources, _ = yield ("build_context", found_docs, question)
+    except StageTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"Erro na API RAG: {e}", exc_info=True)
+        return 500, {"error": "Ocorreu um erro ao processar sua pergunta."}
+
+    return AnswerStream(
+        started, [sse_event("sources", {"sources": sources})],
+        {"context": context, "question": question}, cache_key, version, sources
+    )
+
+
+def search_flow(data):
+    """
+    Busca paginada: `page_size` resultados a partir do `cursor` recebido
+    (início, se ausente). A resposta traz `next_cursor`, nulo na última página.
+    """
+    query = data.get('query') if data else None
+
+    if not query:
+        return 400, {"error": "Nenhuma consulta fornecida"}
+
+    try:
+        offset = decode_cursor(data.get('cursor'))
+        page_size = parse_page_size(data)
+    except (TypeError, ValueError):
+        return 400, {"error": "Parâmetros de paginação inválidos"}
+
+    try:
+        window = yield from search_window_flow(query)
+    except StageTimeout:
+        raise
     except Exception as e:
         logger.error(f"Erro na API de busca semântica: {e}", exc_info=True)
-        return jsonify({"error": "Ocorreu um erro ao processar sua busca."}), 500
+        return 500, {"error": "Ocorreu um erro ao processar sua busca."}
+    return 200, search_page(window, offset, page_size)
+
+
+def search_batch_flow(data):
+    """
+    Várias buscas em um pedido: `queries` (lista) e `page_size` opcional.
+    Retorna, na mesma ordem, a primeira página de resultados de cada
+    consulta ou o erro daquela consulta.
+    """
+    queries, error = batch_items(data, 'queries')
+    if error:
+        return 400, {"error": error}
+    try:
+        page_size = parse_page_size(data)
+    except (TypeError, ValueError):
+        return 400, {"error": "Parâmetros de paginação inválidos"}
+
+    try:
+        retrieved = yield from retrieval_batch_flow(queries, False, SEARCH_PAYLOAD_FIELDS, page_size)
+    except StageTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"Erro na API de busca em lote: {e}", exc_info=True)
+        return 500, {"error": "Ocorreu um erro ao processar as buscas."}
+
+    return 200, {"results": batch_search_items(queries, retrieved, page_size)}
+
+
+def ask_batch_flow(data):
+    """
+    Várias perguntas em um pedido (`questions`). A recuperação é feita em
+    lote e as respostas são geradas com até `BATCH_LLM_CONCURRENCY`
+    chamadas simultâneas ao LLM; respostas em cache não chamam o LLM.
+    Retorna, na mesma ordem, a resposta de cada pergunta ou o seu erro.
+    """
+    questions, error = batch_items(data, 'questions')
+    if error:
+        return 400, {"error": error}
+
+    try:
+        retrieved = yield from retrieval_batch_flow(questions, True)
+    except StageTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"Erro na API RAG em lote: {e}", exc_info=True)
+        return 500, {"error": "Ocorreu um erro ao processar as perguntas."}
+
+    version = index_version.current()
+    items, pending = yield ("prepare_batch_answers", questions, retrieved, version)
+    if pending:
+        logger.info(f"Gerando {len(pending)} respostas com o LLM (até {settings.BATCH_LLM_CONCURRENCY} simultâneas)...")
+        with metrics.span("rag_stage", stage="llm_batch"):
+            responses = yield ("generate_answers", [inputs for *_, inputs in pending])
+        finish_batch_answers(items, pending, responses, version)
+    return 200, {"results": items}
+
+
+def batch_search_items(queries, retrieved, page_size):
+    """Itens da resposta do /search/batch: os resultados ou o erro de cada consulta."""
+    items = []
+    for query, groups in zip(queries, retrieved):
+        if isinstance(groups, Exception):
+            items.append({"query": query, "error": batch_error(groups, "Ocorreu um erro ao processar sua busca.")})
+        else:
+            items.append({"query": query, "results": [search_result(group) for group in groups[:page_size]]})
+    return items
+
+
+def prepare_batch_answers(questions, retrieved, version):
+    """
+    Preenche os itens do /ask/batch que não precisam do LLM (erros, nenhum
+    documento, respostas em cache) e monta o contexto dos demais. Retorna
+    (itens, pendentes), com (posição, chave do cache, fontes, entradas do LLM).
+    """
+    items = [None] * len(questions)
+    pending = []
+    for position, (question, groups) in enumerate(zip(questions, retrieved)):
+        if isinstance(groups, Exception):
+            items[position] = {"question": question, "error": batch_error(groups, "Ocorreu um erro ao processar sua pergunta.")}
+            continue
+        found_docs = flatten_groups(groups)
+        if not found_docs:
+            items[position] = {"question": question, "answer": NO_DOCUMENTS_ANSWER, "sources": []}
+            continue
+
+        cache_key, _, cached = lookup_answer(question, found_docs, version)
+        if cached is not None:
+            items[position] = {"question": question, **cached}
+            continue
+        context, sources, _ = build_context(found_docs, question)
+        pending.append((position, cache_key, sources, {"context": context, "question": question}))
+    return items, pending
+
+
+def finish_batch_answers(items, pending, responses, version):
+    """Completa os itens pendentes com as respostas do LLM (ou o erro de cada uma)."""
+    for (position, cache_key, sources, inputs), response in zip(pending, responses):
+        if isinstance(response, Exception):
+            logger.error(f"Erro ao gerar a resposta de '{inputs['question']}': {response}")
+            items[position] = {"question": inputs['question'], "error": "Ocorreu um erro ao gerar a resposta."}
+            continue
+        result = {"answer": response.content, "sources": sources}
+        answer_cache.put(cache_key, result, version)
+        items[position] = {"question": inputs['question'], **result}
+
+
+def warm_vector_backend_flow():
+    """Abre a conexão com o Qdrant e lê os metadados da coleção (ou confere o armazenamento local)."""
+    if settings.VECTOR_BACKEND == "local":
+        if not local_store.available():
+            raise RuntimeError("Armazenamento vetorial local indisponível.")
+        return
+    describe_collection((yield ("get_collection",)))
+
+
+def check_vector_backend_flow():
+    """Verificação do /readyz: se o backend vetorial responde (ver `vector_backend_status`)."""
+    error = None
+    if settings.VECTOR_BACKEND != "local":
+        try:
+            yield ("count_points",)
+        except Exception as e:
+            error = e
+    return vector_backend_status(error)
+
+
+class Steps:
+    """
+    Executa os fluxos dos pedidos na API Flask: cada etapa pedida por um
+    fluxo é o método de mesmo nome, chamado na thread do pedido.
+    """
+
+    def run(self, flow, *args):
+        """Executa `flow(*args)` até o fim, atendendo às etapas que ele pede, e retorna o seu resultado."""
+        steps = flow(*args)
+        result, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            name, *step_args = step
+            try:
+                result, error = getattr(self, name)(*step_args), None
+            except Exception as e:
+                result, error = None, e
+
+    def gather(self, flows):
+        """Vários fluxos, dados por (função, argumentos), um após o outro; a exceção de um deles é o seu resultado."""
+        results = []
+        for flow, args in flows:
+            try:
+                results.append(self.run(flow, *args))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def exact_groups(self, query):
+        return exact_groups(query)
+
+    def plan_batch(self, queries, limit):
+        return plan_batch(queries, limit)
+
+    def embed_query(self, query):
+        return query_embedder.embed_query(query)
+
+    def embed_queries(self, queries):
+        return query_embedder.embed_queries(queries)
+
+    def search_vectors(self, query_vector, query_filter, limit, with_vectors, with_payload):
+        return search_vectors(query_vector, query_filter, limit, with_vectors, with_payload)
+
+    def search_vectors_batch(self, searches, with_vectors, with_payload):
+        return search_vectors_batch(searches, with_vectors, with_payload)
+
+    def lexical_search(self, query, plan):
+        return lexical_index.search(query, limit=settings.LEXICAL_LIMIT, plan=plan)
+
+    def retrieve_points(self, ids, with_payload):
+        return vector_backend(
+            lambda: qdrant_client.retrieve(
+                collection_name=settings.QDRANT_COLLECTION, ids=ids, with_payload=with_payload, with_vectors=True
+            ),
+            lambda: local_store.retrieve(ids, with_payload=with_payload, with_vectors=True)
+        )
+
+    def retrieve_shared(self, query, with_vectors=False, with_payload=True, limit=None):
+        """`retrieval_flow`, com buscas idênticas simultâneas compartilhando uma só execução."""
+        return retrieval_flight.do(
+            retrieval_key(query, with_vectors, with_payload, limit),
+            self.run, retrieval_flow, query, with_vectors, with_payload, limit
+        )
+
+    def build_context(self, found_docs, question):
+        return build_context(found_docs, question)
+
+    def prepare_batch_answers(self, questions, retrieved, version):
+        return prepare_batch_answers(questions, retrieved, version)
+
+    def generate_answer(self, cache_key, context, question):
+        """Resposta do LLM; pedidos com a mesma chave do cache em andamento recebem a mesma."""
+        return answer_flight.do(cache_key, self._invoke_llm, context, question)
+
+    def _invoke_llm(self, context, question):
+        with metrics.span("rag_stage", stage="llm"):
+            return rag_chain.invoke({"context": context, "question": question}).content
+
+    def generate_answers(self, inputs):
+        return rag_chain.batch(
+            inputs,
+            config={"max_concurrency": settings.BATCH_LLM_CONCURRENCY},
+            return_exceptions=True
+        )
+
+    def get_collection(self):
+        return qdrant_client.get_collection(settings.QDRANT_COLLECTION)
+
+    def count_points(self):
+        return qdrant_client.count(collection_name=settings.QDRANT_COLLECTION, exact=False)
+
+
+steps = Steps()
+
+
+def startup_checks(steps):
+    """
+    Aquecimento de cada processo da API e verificações do /readyz, com o
+    backend vetorial acessado pelas etapas de `steps` (síncronas ou assíncronas).
+    """
+    warmup = Warmup(
+        [
+            ("vector_backend", functools.partial(steps.run, warm_vector_backend_flow)),
+            ("models", warm_models),
+            ("embedding_cache", preload_query_embeddings),
+        ],
+        import_budget=settings.STARTUP_IMPORT_BUDGET,
+        warmup_budget=settings.STARTUP_WARMUP_BUDGET
+    )
+    readiness = ReadinessProbe(
+        [
+            ("warmup", lambda: (warmup.done, warmup.snapshot())),
+            ("vector_backend", functools.partial(steps.run, check_vector_backend_flow)),
+        ],
+        interval=settings.READINESS_CHECK_INTERVAL
+    )
+    metrics.register_collector("rag_startup", warmup.stats, "Tempos de importação e de aquecimento da API.")
+    return warmup, readiness
+
+
+warmup, readiness = startup_checks(steps)
+
+
+def json_response(result):
+    status, body = result
+    return jsonify(body), status
+
+
+@app.route('/ask', methods=['POST'])
+def ask_question():
+    return json_response(steps.run(ask_flow, request.get_json()))
+
+
+@app.route('/ask/stream', methods=['POST'])
+def ask_question_stream():
+    """
+    Variante do /ask em Server-Sent Events.
+
+    Envia primeiro as fontes recuperadas (evento `sources`), depois os
+    trechos da resposta à medida que o LLM os gera (eventos `token`) e, ao
+    final, um evento `done` com o tempo até o primeiro token e o tempo total.
+    Se o cliente desconectar, a geração é cancelada.
+    """
+    stream = steps.run(ask_stream_flow, request.get_json(), time.monotonic())
+    if not isinstance(stream, AnswerStream):
+        return json_response(stream)
+
+    def generate():
+        yield from stream.prelude
+        if stream.inputs is None:
+            return
+
+        chunks = rag_chain.stream(stream.begin())
+        try:
+            for chunk in chunks:
+                if chunk.content:
+                    yield stream.token(chunk.content)
+        except GeneratorExit:
+            # O cliente desconectou: fechar o stream interrompe a chamada ao LLM.
+            logger.info("Cliente desconectou; geração da resposta cancelada.")
+            chunks.close()
+            raise
+        except Exception as e:
+            yield stream.failed(e)
+            return
+        yield stream.finish()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/search', methods=['POST'])
+def search_documents():
+    return json_response(steps.run(search_flow, request.get_json()))
+
+
+@app.route('/search/batch', methods=['POST'])
+def search_documents_batch():
+    return json_response(steps.run(search_batch_flow, request.get_json()))
+
+
+@app.route('/ask/batch', methods=['POST'])
+def ask_questions_batch():
+    return json_response(steps.run(ask_batch_flow, request.get_json()))
+
+
+def parse_document_range(args):
+    """
+    Parte pedida do documento, a partir da query string: ("page", n) com
+    `page`, ("range", offset, length) com `offset`/`length` (em caracteres)
+    ou ("full",). Levanta ValueError se os parâmetros forem inválidos.
+    """
+    if args.get('page') is not None:
+        page = int(args['page'])
+        if page < 1:
+            raise ValueError(page)
+        return ("page", page)
+    if args.get('offset') is not None or args.get('length') is not None:
+        offset = int(args.get('offset') or 0)
+        length = int(args.get('length') or settings.DOCUMENT_MAX_RANGE)
+        if offset < 0 or length < 1:
+            raise ValueError((offset, length))
+        return ("range", offset, min(length, settings.DOCUMENT_MAX_RANGE))
+    return ("full",)
+
+
+def load_document(doc_id, part=("full",)):
+    """
+    Texto de uma portaria para o /document (inteiro, uma página ou um
+    trecho), com o ETag da parte pedida. Retorna (None, None) se o
+    documento não existir e ({}, etag) se a página ou o trecho estiver fora do texto.
+    """
+    sanitized_doc_id = re.sub(r'[^\w\-_\.]', '_', doc_id)
+    stored = document_store.get(sanitized_doc_id)
+    if stored is None:
+        logger.error(f"Documento NÃO ENCONTRADO no armazenamento: '{sanitized_doc_id}'")
+        logger.info(f"(ID original recebido do frontend: '{doc_id}')")
+        return None, None
+
+    etag = f'W/"{stored.etag}-{"-".join(str(value) for value in part)}"'
+    document = {"_id": doc_id, "title": f"Conteúdo Completo: {doc_id}", "pages": stored.page_count}
+    if part[0] == "page":
+        content = stored.page(part[1])
+        if content is None:
+            return {}, etag
+        document.update(page=part[1], content=content)
+        return document, etag
+
+    content = stored.text().replace(PAGE_SEPARATOR, '\n\n')
+    if part[0] == "range":
+        offset, length = part[1], part[2]
+        if offset >= len(content) and content:
+            return {}, etag
+        document.update(offset=offset, content=content[offset:offset + length])
+    else:
+        document["content"] = content
+    document["total_length"] = len(content)
+    return document, etag
+
+
+def etag_matches(if_none_match, etag):
+    """Se o cabeçalho If-None-Match do pedido cobre o ETag (comparação fraca)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    weak = etag[2:] if etag.startswith('W/') else etag
+    return any(
+        (candidate.strip()[2:] if candidate.strip().startswith('W/') else candidate.strip()) == weak
+        for candidate in if_none_match.split(',')
+    )
+
+
+def document_response(doc_id, args, headers):
+    """
+    Resposta do /document, comum às APIs Flask e ASGI: (status, corpo JSON
+    em bytes, cabeçalhos). Atende If-None-Match com 304 e comprime o corpo
+    com gzip quando o cliente aceita e ele passa de DOCUMENT_GZIP_MIN_BYTES.
+    """
+    def error(message, status):
+        return status, json.dumps({"error": message}, ensure_ascii=False).encode('utf-8'), {}
+
+    try:
+        part = parse_document_range(args)
+    except ValueError:
+        return error("Parâmetros inválidos: page, offset e length devem ser inteiros positivos.", 400)
+
+    document, etag = load_document(doc_id, part)
+    if document is None:
+        return error("Arquivo de texto completo não encontrado no servidor.", 404)
+    if not document:
+        return error("Página ou trecho fora do documento.", 416)
+
+    response_headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(headers.get('If-None-Match'), etag):
+        return 304, b"", response_headers
+
+    body = json.dumps(document, ensure_ascii=False).encode('utf-8')
+    if len(body) >= settings.DOCUMENT_GZIP_MIN_BYTES and 'gzip' in (headers.get('Accept-Encoding') or '').lower():
+        body = gzip.compress(body, compresslevel=5)
+        response_headers["Content-Encoding"] = "gzip"
+    return 200, body, response_headers
+
+
+@app.before_request
+def start_request():
+    """Id do pedido (X-Request-ID recebido ou novo), incluído nos logs do pedido."""
+    g.request_started = time.perf_counter()
+    request_id_var.set(new_request_id(request.headers.get('X-Request-ID')))
+    # O servidor WSGI não avisa quando o worker sobe: o primeiro pedido (em
+    # geral o /readyz do healthcheck) inicia o aquecimento deste processo.
+    warmup.start()
+
+
+@app.after_request
+def finish_request(response):
+    response.headers['X-Request-ID'] = request_id_var.get()
+    observe_request(
+        request.url_rule.rule if request.url_rule else "other", response.status_code,
+        time.perf_counter() - g.get('request_started', time.perf_counter())
+    )
+    return response
+
+
+def observe_request(route, status, seconds):
+    """Registra a duração e o status de um pedido HTTP (em respostas em streaming, até o início do envio)."""
+    if route in PROBE_ROUTES:
+        return
+    metrics.histogram("rag_request_seconds", "Duração dos pedidos por rota.", route=route).observe(seconds)
+    metrics.counter("rag_requests_total", "Pedidos por rota e status.", route=route, status=status).inc()
+
+
+@app.route('/healthz', methods=['GET'])
+def liveness():
+    """Liveness: o processo está de pé e atende pedidos, sem consultar nenhuma dependência."""
+    return jsonify({"status": "ok", "pid": os.getpid()})
+
+
+@app.route('/readyz', methods=['GET'])
+def readiness_check():
+    """Readiness: 200 depois do aquecimento e com o backend vetorial respondendo; 503 antes disso."""
+    report = readiness.check()
+    return jsonify(report), 200 if report["ready"] else 503
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.prometheus(), mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE)
 
 
 @app.route('/document/<doc_id>', methods=['GET'])
 def get_document(doc_id):
     try:
-        sanitized_doc_id = re.sub(r'[^\w\-_\.]', '_', doc_id)
-        
-        filename = f"{sanitized_doc_id}.txt"
-        filepath = os.path.join(TEXT_DIR, filename)
-
-        if not os.path.exists(filepath):
-            logger.error(f"Arquivo de texto NÃO ENCONTRADO em: {filepath}")
-            logger.info(f"(ID original recebido do frontend: '{doc_id}')")
-            return jsonify({"error": "Arquivo de texto completo não encontrado no servidor."}), 404
-
-        with open(filepath, 'r', encoding='utf-8') as f:
-            full_content = f.read()
-            cleaned_content = full_content.split('Text: ', 1)[1].strip() if 'Text: ' in full_content else full_content
-
-        response_data = {
-            "_id": doc_id,
-            "title": f"Conteúdo Completo: {doc_id}",
-            "content": cleaned_content
-        }
-        return jsonify(response_data)
-        
+        status, body, headers = document_response(doc_id, request.args, request.headers)
+        return Response(body, status=status, headers=headers, mimetype='application/json')
+
     except Exception as e:
         logger.error(f"Erro ao buscar documento {doc_id}: {e}", exc_info=True)
         return jsonify({"error": "Erro interno ao buscar o documento."}), 500
 
 
+warmup.set_import_seconds(time.perf_counter() - IMPORT_STARTED)
+
+
 if __name__ == '__main__':
+    warmup.start()
     app.run(host='0.0.0.0', port=5001)
\ No newline at end of file
@@ -0,0 +1,381 @@
+import time
+
+# Início da importação, para medir o tempo de inicialização da API (ver `warmup`).
+IMPORT_STARTED = time.perf_counter()
+
+import os
+import asyncio
+import logging
+import contextlib
+
+from qdrant_client import AsyncQdrantClient
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import rag_api
+from rag_api import (
+    PROBE_ROUTES, AnswerStream, StageTimeout,
+    ask_batch_flow, ask_flow, ask_stream_flow, build_context, lexical_index, local_store, observe_request,
+    prepare_batch_answers, query_embedder, rag_chain, retrieval_flow, search_batch_flow, search_flow, startup_checks
+)
+from concurrency_limiter import ConcurrencyLimiter, ConcurrencyLimitMiddleware
+from single_flight import AsyncSingleFlight
+from lazy_resource import LazyResource
+from metrics import metrics, PROMETHEUS_CONTENT_TYPE, new_request_id, request_id_var
+from settings import settings
+
+# Variante ASGI da API (rag_api.py): mesmas rotas e respostas, com os mesmos
+# fluxos dos pedidos, mas as chamadas ao modelo de embeddings, ao Qdrant e
+# ao LLM são assíncronas, de modo que um único processo atende centenas de
+# pedidos simultâneos sem uma thread por pedido.
+# Execução: uvicorn rag_api_async:app --host 0.0.0.0 --port 5001
+
+logger = logging.getLogger(__name__)
+
+# Criado no primeiro uso, já dentro do event loop do worker (ver rag_api.qdrant_client).
+async_qdrant_client = LazyResource(
+    lambda: AsyncQdrantClient(url=settings.QDRANT_URL, timeout=60.0),
+    "async_qdrant_client"
+)
+
+limiter = ConcurrencyLimiter(
+    max_concurrency=settings.ASYNC_MAX_CONCURRENCY,
+    max_queue=settings.ASYNC_MAX_QUEUE,
+    queue_timeout=settings.ASYNC_QUEUE_TIMEOUT,
+    retry_after=settings.ASYNC_RETRY_AFTER
+)
+
+# Pedidos idênticos simultâneos compartilham uma só recuperação e uma só geração da resposta.
+retrieval_flight = AsyncSingleFlight()
+answer_flight = AsyncSingleFlight()
+
+# Substituem no /metrics os contadores da versão WSGI, que não são usados aqui.
+metrics.register_collector("rag_retrieval_flight", retrieval_flight.stats, "Coalescência de buscas idênticas.")
+metrics.register_collector("rag_answer_flight", answer_flight.stats, "Coalescência de respostas idênticas.")
+metrics.register_collector("rag_concurrency", limiter.stats, "Pedidos em andamento, na fila e recusados.")
+
+
+async def stage(awaitable, timeout, name):
+    """Aguarda `awaitable` por até `timeout` segundos; levanta StageTimeout se estourar."""
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Tempo esgotado na etapa '{name}' ({timeout}s).")
+        metrics.counter("rag_stage_timeouts_total", "Etapas que excederam o tempo limite.", stage=name).inc()
+        raise StageTimeout(name) from None
+
+
+async def vector_backend(qdrant_call, local_call, *args):
+    """
+    Versão assíncrona de `rag_api.vector_backend`: `qdrant_call()` é uma
+    corrotina e `local_call(*args)` roda em uma thread, fora do event loop.
+    """
+    if settings.VECTOR_BACKEND == "local":
+        return await asyncio.to_thread(local_call, *args)
+    try:
+        return await stage(qdrant_call(), settings.SEARCH_TIMEOUT, "busca vetorial")
+    except Exception as e:
+        if settings.VECTOR_BACKEND != "fallback" or not local_store.available():
+            raise
+        logger.warning(f"Falha no Qdrant ({e}); usando o armazenamento vetorial local.")
+        return await asyncio.to_thread(local_call, *args)
+
+
+class AsyncSteps:
+    """
+    Executa os fluxos dos pedidos (ver `rag_api.Steps`) no event loop: as
+    chamadas ao modelo de embeddings, ao Qdrant e ao LLM são assíncronas e
+    têm tempo limite; o SQLite e a CPU (índice lexical, contexto) rodam em threads.
+    """
+
+    async def run(self, flow, *args):
+        """Executa `flow(*args)` até o fim, aguardando as etapas que ele pede, e retorna o seu resultado."""
+        steps = flow(*args)
+        result, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            name, *step_args = step
+            try:
+                result, error = await getattr(self, name)(*step_args), None
+            except Exception as e:
+                result, error = None, e
+
+    async def gather(self, flows):
+        """Vários fluxos, dados por (função, argumentos), ao mesmo tempo; a exceção de um deles é o seu resultado."""
+        return await asyncio.gather(*(self.run(flow, *args) for flow, args in flows), return_exceptions=True)
+
+    async def exact_groups(self, query):
+        return await asyncio.to_thread(rag_api.exact_groups, query)
+
+    async def plan_batch(self, queries, limit):
+        return await asyncio.to_thread(rag_api.plan_batch, queries, limit)
+
+    async def embed_query(self, query):
+        return await stage(query_embedder.aembed_query(query), settings.EMBED_TIMEOUT, "embedding")
+
+    async def embed_queries(self, queries):
+        return await stage(query_embedder.aembed_queries(queries), settings.EMBED_TIMEOUT, "embedding")
+
+    async def search_vectors(self, query_vector, query_filter, limit, with_vectors, with_payload):
+        async def qdrant_call():
+            response = await async_qdrant_client.search_groups(
+                **rag_api.search_groups_request(query_vector, query_filter, limit, with_vectors, with_payload)
+            )
+            return response.groups
+
+        return await vector_backend(
+            qdrant_call, local_store.search_groups,
+            query_vector, query_filter, limit, settings.CHUNKS_PER_SOURCE, with_payload, with_vectors
+        )
+
+    async def search_vectors_batch(self, searches, with_vectors, with_payload):
+        if not searches:
+            return []
+
+        async def qdrant_call():
+            responses = await async_qdrant_client.search_batch(
+                collection_name=settings.QDRANT_COLLECTION,
+                requests=rag_api.batch_search_requests(searches, with_vectors, with_payload)
+            )
+            return [rag_api.group_hits(hits, limit) for hits, (_, _, limit) in zip(responses, searches)]
+
+        return await vector_backend(qdrant_call, rag_api.local_search_batch, searches, with_vectors, with_payload)
+
+    async def lexical_search(self, query, plan):
+        return await asyncio.to_thread(lexical_index.search, query, settings.LEXICAL_LIMIT, plan)
+
+    async def retrieve_points(self, ids, with_payload):
+        return await vector_backend(
+            lambda: async_qdrant_client.retrieve(
+                collection_name=settings.QDRANT_COLLECTION, ids=ids, with_payload=with_payload, with_vectors=True
+            ),
+            local_store.retrieve, ids, with_payload, True
+        )
+
+    async def retrieve_shared(self, query, with_vectors=False, with_payload=True, limit=None):
+        """`retrieval_flow`, com buscas idênticas simultâneas compartilhando uma só execução."""
+        return await retrieval_flight.do(
+            rag_api.retrieval_key(query, with_vectors, with_payload, limit),
+            self.run, retrieval_flow, query, with_vectors, with_payload, limit
+        )
+
+    async def build_context(self, found_docs, question):
+        # A montagem do contexto (seleção MMR) usa a CPU: roda fora do event loop.
+        return await asyncio.to_thread(build_context, found_docs, question)
+
+    async def prepare_batch_answers(self, questions, retrieved, version):
+        return await asyncio.to_thread(prepare_batch_answers, questions, retrieved, version)
+
+    async def generate_answer(self, cache_key, context, question):
+        """Resposta do LLM; pedidos com a mesma chave do cache em andamento recebem a mesma."""
+        return await answer_flight.do(cache_key, self._invoke_llm, context, question)
+
+    async def _invoke_llm(self, context, question):
+        with metrics.span("rag_stage", stage="llm"):
+            response = await stage(
+                rag_chain.ainvoke({"context": context, "question": question}),
+                settings.LLM_TIMEOUT, "geração da resposta"
+            )
+        return response.content
+
+    async def generate_answers(self, inputs):
+        return await stage(rag_chain.abatch(
+            inputs,
+            config={"max_concurrency": settings.BATCH_LLM_CONCURRENCY},
+            return_exceptions=True
+        ), settings.LLM_TIMEOUT, "geração das respostas")
+
+    async def get_collection(self):
+        return await async_qdrant_client.get_collection(settings.QDRANT_COLLECTION)
+
+    async def count_points(self):
+        return await asyncio.wait_for(
+            async_qdrant_client.count(collection_name=settings.QDRANT_COLLECTION, exact=False),
+            settings.SEARCH_TIMEOUT
+        )
+
+
+steps = AsyncSteps()
+
+# Substituem o aquecimento e as verificações da versão WSGI, que usam o cliente síncrono.
+warmup, readiness = startup_checks(steps)
+
+
+def error_response(message, status_code):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+def json_response(result):
+    status, body = result
+    return JSONResponse(body, status_code=status)
+
+
+async def read_json(request):
+    """Corpo JSON do pedido, ou None se não for um objeto JSON válido."""
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def ask_question(request):
+    return json_response(await steps.run(ask_flow, await read_json(request)))
+
+
+async def ask_question_stream(request):
+    """
+    Variante do /ask em Server-Sent Events (ver rag_api.ask_question_stream).
+    O tempo limite da geração vale para a espera de cada trecho da resposta.
+    """
+    stream = await steps.run(ask_stream_flow, await read_json(request), time.monotonic())
+    if not isinstance(stream, AnswerStream):
+        return json_response(stream)
+
+    async def generate():
+        for event in stream.prelude:
+            yield event
+        if stream.inputs is None:
+            return
+
+        chunks = rag_chain.astream(stream.begin())
+        try:
+            while True:
+                try:
+                    chunk = await stage(chunks.__anext__(), settings.LLM_TIMEOUT, "geração da resposta")
+                except StopAsyncIteration:
+                    break
+                if chunk.content:
+                    yield stream.token(chunk.content)
+        except asyncio.CancelledError:
+            # O cliente desconectou: a tarefa é cancelada e a chamada ao LLM, interrompida.
+            logger.info("Cliente desconectou; geração da resposta cancelada.")
+            raise
+        except Exception as e:
+            yield stream.failed(e)
+            return
+        finally:
+            await chunks.aclose()
+        yield stream.finish()
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def search_documents(request):
+    return json_response(await steps.run(search_flow, await read_json(request)))
+
+
+async def search_documents_batch(request):
+    return json_response(await steps.run(search_batch_flow, await read_json(request)))
+
+
+async def ask_questions_batch(request):
+    return json_response(await steps.run(ask_batch_flow, await read_json(request)))
+
+
+async def get_document(request):
+    doc_id = request.path_params['doc_id']
+    try:
+        status, body, headers = await asyncio.to_thread(
+            rag_api.document_response, doc_id, request.query_params, request.headers
+        )
+        return Response(body, status_code=status, headers=headers, media_type='application/json')
+
+    except Exception as e:
+        logger.error(f"Erro ao buscar documento {doc_id}: {e}", exc_info=True)
+        return error_response("Erro interno ao buscar o documento.", 500)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # O aquecimento roda em segundo plano: o servidor já aceita pedidos (o
+    # /healthz responde) e o /readyz passa a 200 quando ele termina.
+    task = asyncio.create_task(warmup.arun())
+    yield
+    task.cancel()
+
+
+async def liveness(request):
+    """Liveness: o processo está de pé e o event loop responde, sem consultar nenhuma dependência."""
+    return JSONResponse({"status": "ok", "pid": os.getpid()})
+
+
+async def readiness_check(request):
+    """Readiness: 200 depois do aquecimento e com o backend vetorial respondendo; 503 antes disso."""
+    report = await readiness.acheck()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+async def get_metrics(request):
+    return Response(metrics.prometheus(), headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+
+class RequestContextMiddleware:
+    """
+    Middleware ASGI que define o id de cada pedido (X-Request-ID recebido ou
+    novo), devolvido no cabeçalho da resposta e incluído nos logs, e
+    registra a duração e o status do pedido por rota no /metrics.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = new_request_id(headers.get(b"x-request-id", b"").decode('latin-1'))
+        token = request_id_var.set(request_id)
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode('latin-1'))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            route = scope.get("route")
+            observe_request(getattr(route, "path", "other"), status["code"], time.perf_counter() - started)
+            request_id_var.reset(token)
+
+
+async def stage_timeout_handler(request, exc):
+    return error_response("O serviço demorou demais para responder. Tente novamente.", 504)
+
+
+app = Starlette(
+    routes=[
+        Route('/ask', ask_question, methods=['POST']),
+        Route('/ask/stream', ask_question_stream, methods=['POST']),
+        Route('/ask/batch', ask_questions_batch, methods=['POST']),
+        Route('/search', search_documents, methods=['POST']),
+        Route('/search/batch', search_documents_batch, methods=['POST']),
+        Route('/document/{doc_id}', get_document, methods=['GET']),
+        Route('/metrics', get_metrics, methods=['GET']),
+        Route('/healthz', liveness, methods=['GET']),
+        Route('/readyz', readiness_check, methods=['GET']),
+    ],
+    middleware=[
+        Middleware(RequestContextMiddleware),
+        Middleware(ConcurrencyLimitMiddleware, limiter=limiter, exempt_paths=PROBE_ROUTES),
+    ],
+    exception_handlers={StageTimeout: stage_timeout_handler},
+    lifespan=lifespan,
+)
+
+warmup.set_import_seconds(time.perf_counter() - IMPORT_STARTED)
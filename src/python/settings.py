@@ -7,14 +7,230 @@ class Settings:
     def __init__(self):
         self.MPC_PORTARIAS_URL = os.environ.get("MPC_PORTARIAS_URL", "https://www.mpc.pa.gov.br/transparencia/portarias")
         self.QDRANT_URL = os.environ.get("QDRANT_URL", "http://qdrant:6333")
+        # Nome consultado pela API. É um alias do Qdrant que aponta para a
+        # coleção versionada atual (`<nome>_v<timestamp>`).
         self.QDRANT_COLLECTION = os.environ.get("QDRANT_COLLECTION", "portarias_mpc")
         self.GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
+        # "gemini" ou "fake": modelos locais e determinísticos (fake_models.py),
+        # com as latências simuladas abaixo (segundos), para benchmarks sem a API.
+        self.MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "gemini").lower()
+        self.FAKE_EMBED_LATENCY = float(os.environ.get("FAKE_EMBED_LATENCY", 0.05))
+        self.FAKE_EMBED_LATENCY_PER_TEXT = float(os.environ.get("FAKE_EMBED_LATENCY_PER_TEXT", 0.002))
+        self.FAKE_LLM_LATENCY = float(os.environ.get("FAKE_LLM_LATENCY", 0.3))
+        self.FAKE_LLM_TOKEN_LATENCY = float(os.environ.get("FAKE_LLM_TOKEN_LATENCY", 0.01))
         self.LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
         
+        # Limites de busca contam portarias; de cada uma vêm até CHUNKS_PER_SOURCE trechos.
         self.RETRIEVAL_LIMIT = int(os.environ.get("RETRIEVAL_LIMIT", 20))
         # --- INÍCIO DA MODIFICAÇÃO ---
-        # Novo limite, maior, para ser usado em buscas filtradas por metadados (como o ano).
-        self.FILTERED_RETRIEVAL_LIMIT = int(os.environ.get("FILTERED_RETRIEVAL_LIMIT", 200))
+        # Limite para buscas filtradas por metadados (ano, mês, número, tipo).
+        # Os campos filtrados têm índices de payload no Qdrant, então o filtro
+        # é aplicado durante a busca e não é preciso trazer centenas de pontos.
+        self.FILTERED_RETRIEVAL_LIMIT = int(os.environ.get("FILTERED_RETRIEVAL_LIMIT", 40))
         # --- FIM DA MODIFICAÇÃO ---
 
+        # Manifesto da ingestão incremental (sha256 de cada PDF). Quando vazio,
+        # é gravado junto dos PDFs baixados.
+        self.INGEST_MANIFEST_PATH = os.environ.get("INGEST_MANIFEST_PATH")
+        # Força a recriação completa da coleção a cada execução do ingestor.
+        self.INGEST_FULL_REBUILD = os.environ.get("INGEST_FULL_REBUILD", "false").lower() in ("1", "true", "yes")
+        # Relatório JSON de cada execução do main.py (tempos por etapa, filas,
+        # métricas e erro, se houver). Quando vazio, é gravado junto dos PDFs.
+        self.INGEST_REPORT_PATH = os.environ.get("INGEST_REPORT_PATH")
+
+        # Reconstrução com troca de alias: versões antigas mantidas após a troca,
+        # fração mínima de pontos em relação à coleção atual e amostras de validação.
+        self.QDRANT_KEEP_VERSIONS = int(os.environ.get("QDRANT_KEEP_VERSIONS", 1))
+        # Perfil de armazenamento das coleções (ver collection_profiles.py):
+        # "ram" (tudo em memória, sem quantização), "scalar" (int8 em RAM e
+        # vetores originais em disco), "product" (quantização por produto) ou
+        # "disk" (vetores, payloads e grafo HNSW em disco). Cada variável
+        # QDRANT_* abaixo, se definida, substitui a opção do perfil; a API e a
+        # ingestão devem usar o mesmo perfil.
+        self.QDRANT_PROFILE = os.environ.get("QDRANT_PROFILE", "ram").lower()
+        flag = lambda value: value.lower() in ("1", "true", "yes")
+        self.QDRANT_PROFILE_OVERRIDES = {
+            option: parse(os.environ[name])
+            for option, name, parse in [
+                ("quantization", "QDRANT_QUANTIZATION", lambda value: None if value.lower() == "none" else value.lower()),
+                ("product_compression", "QDRANT_PQ_COMPRESSION", str),
+                ("rescore", "QDRANT_QUANTIZATION_RESCORE", flag),
+                ("oversampling", "QDRANT_QUANTIZATION_OVERSAMPLING", float),
+                ("on_disk_vectors", "QDRANT_ON_DISK_VECTORS", flag),
+                ("on_disk_payload", "QDRANT_ON_DISK_PAYLOAD", flag),
+                ("hnsw_m", "QDRANT_HNSW_M", int),
+                ("hnsw_ef_construct", "QDRANT_HNSW_EF_CONSTRUCT", int),
+                ("hnsw_on_disk", "QDRANT_HNSW_ON_DISK", flag),
+                ("hnsw_ef", "QDRANT_HNSW_EF", int),
+            ]
+            if os.environ.get(name)
+        }
+        self.EMBEDDING_DIM = int(os.environ.get("EMBEDDING_DIM", 768))
+        self.REBUILD_MIN_POINT_RATIO = float(os.environ.get("REBUILD_MIN_POINT_RATIO", 0.9))
+        self.REBUILD_SAMPLE_SIZE = int(os.environ.get("REBUILD_SAMPLE_SIZE", 20))
+        self.REBUILD_SAMPLE_QUERIES = [
+            q.strip() for q in os.environ.get(
+                "REBUILD_SAMPLE_QUERIES", "portaria de designação de servidor;concessão de férias"
+            ).split(";") if q.strip()
+        ]
+
+        # Pool de processos da extração/OCR: número de processos (0 = todos os
+        # núcleos), tempo limite por PDF em segundos e PDFs por processo antes
+        # de reciclá-lo.
+        self.EXTRACTION_WORKERS = int(os.environ.get("EXTRACTION_WORKERS", 0))
+        self.EXTRACTION_TIMEOUT = float(os.environ.get("EXTRACTION_TIMEOUT", 180))
+        self.EXTRACTION_MAX_TASKS_PER_CHILD = int(os.environ.get("EXTRACTION_MAX_TASKS_PER_CHILD", 50))
+
+        # OCR das páginas digitalizadas (ocr_engine.py): idioma, resolução da
+        # página e da faixa do cabeçalho (fração superior da altura), modo de
+        # renderização ("gray", "binary" ou "rgb"), modo de segmentação do
+        # Tesseract e tempo limite por página (s). O cabeçalho só é relido em
+        # OCR_HEADER_DPI quando o OCR da primeira página não traz o título.
+        # Os textos reconhecidos ficam em cache pelo hash da imagem da página.
+        self.OCR_LANG = os.environ.get("OCR_LANG", "por")
+        self.OCR_DPI = int(os.environ.get("OCR_DPI", 300))
+        self.OCR_HEADER_DPI = int(os.environ.get("OCR_HEADER_DPI", 400))
+        self.OCR_HEADER_FRACTION = float(os.environ.get("OCR_HEADER_FRACTION", 0.25))
+        self.OCR_RENDER_MODE = os.environ.get("OCR_RENDER_MODE", "gray").lower()
+        self.OCR_PSM = int(os.environ.get("OCR_PSM", 3))
+        self.OCR_PAGE_TIMEOUT = float(os.environ.get("OCR_PAGE_TIMEOUT", 60))
+        self.OCR_CACHE_PATH = os.environ.get("OCR_CACHE_PATH", "/app/pdfs/.ocr_cache.sqlite3")
+        self.OCR_CACHE_MAX_ENTRIES = int(os.environ.get("OCR_CACHE_MAX_ENTRIES", 200000))
+        self.TESSDATA_PATH = os.environ.get("TESSDATA_PATH", "")
+        # "tesseract" ou "fake" (OCR simulado, com FAKE_OCR_LATENCY segundos por imagem).
+        self.OCR_BACKEND = os.environ.get("OCR_BACKEND", "tesseract").lower()
+        self.FAKE_OCR_LATENCY = float(os.environ.get("FAKE_OCR_LATENCY", 0.5))
+
+        # Pipeline de ingestão: tamanho das filas entre as etapas, lotes de
+        # vetorização/gravação (liberados após EMBED_BATCH_MAX_WAIT segundos
+        # mesmo incompletos) e intervalo dos relatórios de progresso.
+        self.PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 64))
+        self.EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 100))
+        self.EMBED_BATCH_MAX_WAIT = float(os.environ.get("EMBED_BATCH_MAX_WAIT", 5.0))
+        self.UPSERT_BATCH_SIZE = int(os.environ.get("UPSERT_BATCH_SIZE", 100))
+        self.PIPELINE_REPORT_INTERVAL = float(os.environ.get("PIPELINE_REPORT_INTERVAL", 30.0))
+
+        # Cliente de embeddings da ingestão: requisições por minuto (0 = sem
+        # limite), chamadas simultâneas, menor lote (o maior é EMBED_BATCH_SIZE;
+        # o tamanho se ajusta à latência alvo em segundos), tentativas e espera
+        # (base e máximo, em segundos) entre elas, textos lembrados para não
+        # vetorizar conteúdo repetido e arquivo com os trechos que falharam
+        # (vazio: junto dos PDFs).
+        self.EMBED_REQUESTS_PER_MINUTE = float(os.environ.get("EMBED_REQUESTS_PER_MINUTE", 600))
+        self.EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", 4))
+        self.EMBED_MIN_BATCH_SIZE = int(os.environ.get("EMBED_MIN_BATCH_SIZE", 8))
+        self.EMBED_TARGET_LATENCY = float(os.environ.get("EMBED_TARGET_LATENCY", 10.0))
+        self.EMBED_MAX_RETRIES = int(os.environ.get("EMBED_MAX_RETRIES", 5))
+        self.EMBED_BACKOFF_BASE = float(os.environ.get("EMBED_BACKOFF_BASE", 1.0))
+        self.EMBED_BACKOFF_MAX = float(os.environ.get("EMBED_BACKOFF_MAX", 60.0))
+        self.EMBED_DEDUP_CACHE_SIZE = int(os.environ.get("EMBED_DEDUP_CACHE_SIZE", 20000))
+        self.EMBED_FAILURES_PATH = os.environ.get("EMBED_FAILURES_PATH")
+
+        # Divisão do texto extraído em trechos (em caracteres) para indexação.
+        self.CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", 1200))
+        self.CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", 200))
+        self.CHUNKS_PER_SOURCE = int(os.environ.get("CHUNKS_PER_SOURCE", 3))
+
+        # Paginação do /search: resultados por página (padrão e máximo) e
+        # total de portarias que se pode percorrer avançando as páginas. A
+        # primeira página busca essa janela (com o payload reduzido aos campos
+        # exibidos) e a guarda por SEARCH_WINDOW_CACHE_TTL segundos; as páginas
+        # seguintes só a recortam, sem refazer a busca.
+        self.SEARCH_PAGE_SIZE = int(os.environ.get("SEARCH_PAGE_SIZE", 10))
+        self.SEARCH_MAX_PAGE_SIZE = int(os.environ.get("SEARCH_MAX_PAGE_SIZE", 50))
+        self.SEARCH_MAX_RESULTS = int(os.environ.get("SEARCH_MAX_RESULTS", 100))
+        self.SEARCH_WINDOW_CACHE_SIZE = int(os.environ.get("SEARCH_WINDOW_CACHE_SIZE", 256))
+        self.SEARCH_WINDOW_CACHE_TTL = float(os.environ.get("SEARCH_WINDOW_CACHE_TTL", 600))
+
+        # Rotas em lote (/search/batch e /ask/batch): itens por pedido, chamadas
+        # simultâneas ao LLM e quantas vezes os trechos necessários são pedidos
+        # ao Qdrant (a busca em lote não agrupa por portaria).
+        self.BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 50))
+        self.BATCH_LLM_CONCURRENCY = int(os.environ.get("BATCH_LLM_CONCURRENCY", 4))
+        self.BATCH_GROUP_OVERFETCH = int(os.environ.get("BATCH_GROUP_OVERFETCH", 2))
+
+        # API assíncrona (rag_api_async.py): pedidos simultâneos, fila de espera
+        # (posições e segundos) e o Retry-After das respostas 429/503; tempo
+        # limite (s) do embedding, das buscas no Qdrant e da geração pelo LLM.
+        self.ASYNC_MAX_CONCURRENCY = int(os.environ.get("ASYNC_MAX_CONCURRENCY", 256))
+        self.ASYNC_MAX_QUEUE = int(os.environ.get("ASYNC_MAX_QUEUE", 512))
+        self.ASYNC_QUEUE_TIMEOUT = float(os.environ.get("ASYNC_QUEUE_TIMEOUT", 10.0))
+        self.ASYNC_RETRY_AFTER = int(os.environ.get("ASYNC_RETRY_AFTER", 5))
+        self.EMBED_TIMEOUT = float(os.environ.get("EMBED_TIMEOUT", 10.0))
+        self.SEARCH_TIMEOUT = float(os.environ.get("SEARCH_TIMEOUT", 10.0))
+        self.LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 60.0))
+
+        # Coalescência de pedidos idênticos simultâneos na API WSGI: tempo máximo
+        # (s) que um pedido espera pelo idêntico em andamento antes de seguir sozinho.
+        self.SINGLE_FLIGHT_WAIT_TIMEOUT = float(os.environ.get("SINGLE_FLIGHT_WAIT_TIMEOUT", 120.0))
+
+        # Índice lexical (BM25) dos trechos, no volume compartilhado, mantido
+        # pela ingestão. Na busca híbrida, trechos trazidos pela busca lexical
+        # e constante k da fusão por posição (Reciprocal Rank Fusion).
+        self.LEXICAL_INDEX_PATH = os.environ.get("LEXICAL_INDEX_PATH", "/app/extracted_texts/.lexical_index.sqlite3")
+        self.LEXICAL_LIMIT = int(os.environ.get("LEXICAL_LIMIT", 50))
+        self.RRF_K = int(os.environ.get("RRF_K", 60))
+
+        # Cópia local dos vetores (memmap float32 ou int8), regravada pela
+        # ingestão e usada para restaurar a coleção sem revetorizar. Backend de
+        # busca da API: "qdrant", "local" (só o arquivo, sem servidor) ou
+        # "fallback" (Qdrant, recorrendo ao arquivo se ele falhar).
+        self.VECTOR_STORE_PATH = os.environ.get("VECTOR_STORE_PATH", "/app/extracted_texts/.vector_store.bin")
+        self.VECTOR_STORE_DTYPE = os.environ.get("VECTOR_STORE_DTYPE", "float32")
+        self.VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "fallback").lower()
+
+        # Textos extraídos: arquivo de dados só de acréscimo mais índice, no
+        # volume compartilhado; a API o mapeia em memória para o /document.
+        # A ingestão publica o índice a cada N documentos e compacta o arquivo
+        # quando as versões antigas passam da fração indicada. No /document,
+        # respostas a partir deste tamanho (bytes) vão com gzip, se o cliente
+        # aceitar, e um trecho pedido por offset/length tem este limite (caracteres).
+        self.DOCUMENT_STORE_PATH = os.environ.get("DOCUMENT_STORE_PATH", "/app/extracted_texts/documents")
+        self.DOCUMENT_STORE_COMMIT_EVERY = int(os.environ.get("DOCUMENT_STORE_COMMIT_EVERY", 50))
+        self.DOCUMENT_STORE_COMPACT_RATIO = float(os.environ.get("DOCUMENT_STORE_COMPACT_RATIO", 0.5))
+        self.DOCUMENT_GZIP_MIN_BYTES = int(os.environ.get("DOCUMENT_GZIP_MIN_BYTES", 1024))
+        self.DOCUMENT_MAX_RANGE = int(os.environ.get("DOCUMENT_MAX_RANGE", 200000))
+
+        # Download: páginas da listagem a percorrer, downloads simultâneos (no
+        # total e por host) e se o crawl para na primeira página sem PDFs novos.
+        # Para uma carga histórica completa, use CRAWL_STOP_ON_KNOWN=false.
+        self.CRAWL_MAX_PAGES = int(os.environ.get("CRAWL_MAX_PAGES", 50))
+        self.CRAWL_STOP_ON_KNOWN = os.environ.get("CRAWL_STOP_ON_KNOWN", "true").lower() in ("1", "true", "yes")
+        self.DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", 8))
+        self.DOWNLOAD_PER_HOST = int(os.environ.get("DOWNLOAD_PER_HOST", 4))
+
+        # Cache dos embeddings de consulta da API: entradas no LRU de cada
+        # processo e arquivo SQLite compartilhado entre os workers (vazio desativa).
+        self.EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", 2048))
+        self.EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "/tmp/rag_cache/query_embeddings.sqlite3")
+        self.EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", 50000))
+
+        # Token de versão do índice, no volume compartilhado entre o ingestor e
+        # a API; a ingestão o renova e a API descarta caches derivados do índice.
+        self.INDEX_VERSION_PATH = os.environ.get("INDEX_VERSION_PATH", "/app/extracted_texts/.index_version")
+
+        # Cache de respostas do /ask: número máximo de respostas e validade (s).
+        self.ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", 1024))
+        self.ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", 6 * 3600))
+
+        # Montagem do contexto do /ask: orçamento de tokens, peso da relevância
+        # vs. diversidade no MMR (1 = só relevância), similaridade a partir da
+        # qual um trecho é considerado duplicado e caracteres por token estimados.
+        self.CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 6000))
+        self.CONTEXT_MMR_LAMBDA = float(os.environ.get("CONTEXT_MMR_LAMBDA", 0.7))
+        self.CONTEXT_DEDUP_THRESHOLD = float(os.environ.get("CONTEXT_DEDUP_THRESHOLD", 0.97))
+        self.CONTEXT_CHARS_PER_TOKEN = float(os.environ.get("CONTEXT_CHARS_PER_TOKEN", 4.0))
+
+        # Inicialização da API: os clientes e modelos são criados no primeiro
+        # uso, e o aquecimento (em segundo plano, uma vez por processo) abre as
+        # conexões, lê os metadados da coleção e carrega no LRU os embeddings
+        # mais usados do cache persistente (WARMUP_PRELOAD_QUERIES, 0 desativa).
+        # O /readyz só responde 200 depois dele e revalida o backend vetorial a
+        # cada READINESS_CHECK_INTERVAL segundos. Acima dos orçamentos (s) de
+        # importação e de aquecimento, um aviso vai para o log.
+        self.WARMUP_PRELOAD_QUERIES = int(os.environ.get("WARMUP_PRELOAD_QUERIES", 512))
+        self.READINESS_CHECK_INTERVAL = float(os.environ.get("READINESS_CHECK_INTERVAL", 5.0))
+        self.STARTUP_IMPORT_BUDGET = float(os.environ.get("STARTUP_IMPORT_BUDGET", 3.0))
+        self.STARTUP_WARMUP_BUDGET = float(os.environ.get("STARTUP_WARMUP_BUDGET", 10.0))
+
 settings = Settings()
\ No newline at end of file
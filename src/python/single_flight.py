@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalescência de chamadas idênticas simultâneas ("single-flight"), entre threads.
+
+    A primeira chamada com uma chave (a líder) executa a função; as que
+    chegam enquanto ela roda esperam e recebem o mesmo resultado, ou a mesma
+    exceção. A chave é liberada assim que a líder termina: nada é guardado
+    depois disso (esse é o papel dos caches), e uma falha não é repassada a
+    pedidos que chegam depois, que tentam de novo. Uma seguidora que espera
+    mais que `wait_timeout` segundos executa a função por conta própria, e
+    o mesmo acontece se a líder for interrompida sem uma exceção comum
+    (ex.: KeyboardInterrupt, ou GeneratorExit em uma resposta em streaming).
+    """
+
+    def __init__(self, wait_timeout=None):
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.counters = {"leaders": 0, "coalesced": 0, "errors": 0, "wait_timeouts": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.counters["leaders"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            logger.info("Pedido idêntico em andamento; aguardando o resultado compartilhado.")
+            if not call.done.wait(self.wait_timeout):
+                with self._lock:
+                    self.counters["wait_timeouts"] += 1
+                logger.warning("Tempo de espera pelo pedido idêntico esgotado; executando separadamente.")
+                return fn(*args, **kwargs)
+            if isinstance(call.error, Exception):
+                raise call.error
+            if call.error is not None:
+                logger.warning("O pedido idêntico foi interrompido; executando separadamente.")
+                return fn(*args, **kwargs)
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            if isinstance(e, Exception):
+                with self._lock:
+                    self.counters["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls), **self.counters}
+
+
+class AsyncSingleFlight:
+    """
+    Versão para asyncio do `SingleFlight`, com a mesma semântica.
+
+    A função roda em uma tarefa própria, que todas as chamadas aguardam
+    protegidas (`asyncio.shield`): se o cliente da líder desconecta, as
+    seguidoras continuam esperando o mesmo resultado. Tempos limite ficam a
+    cargo da própria função.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self.counters = {"leaders": 0, "coalesced": 0, "errors": 0}
+
+    async def do(self, key, fn, *args, **kwargs):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._tasks[key] = task
+            task.add_done_callback(lambda finished: self._finish(key, finished))
+            self.counters["leaders"] += 1
+        else:
+            logger.info("Pedido idêntico em andamento; aguardando o resultado compartilhado.")
+            self.counters["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Lê a exceção mesmo que ninguém mais aguarde a tarefa.
+        if not task.cancelled() and task.exception() is not None:
+            self.counters["errors"] += 1
+
+    def stats(self):
+        return {"in_flight": len(self._tasks), **self.counters}
@@ -0,0 +1,155 @@
+import os
+import random
+
+import fitz
+
+# Gerador de portarias sintéticas para os benchmarks offline: PDFs com
+# camada de texto ou digitalizados (páginas só com imagem, que passam pelo
+# OCR), com número, ano, data e assunto variados, e consultas de amostra
+# sobre o acervo gerado.
+
+MONTH_NAMES = [
+    'janeiro', 'fevereiro', 'março', 'abril', 'maio', 'junho',
+    'julho', 'agosto', 'setembro', 'outubro', 'novembro', 'dezembro',
+]
+
+SERVERS = [
+    'Ana Paula Ferreira', 'Carlos Eduardo Lima', 'Mariana Souza Costa', 'João Batista Rocha',
+    'Fernanda Alves Pinto', 'Ricardo Nogueira', 'Luciana Barros', 'Paulo Henrique Dias',
+]
+
+# (tipo, assunto usado nas consultas, texto da parte dispositiva)
+SUBJECTS = [
+    ('designacao', 'designação de fiscal de contrato',
+     'DESIGNAR o(a) servidor(a) {server} para exercer as funções de fiscal do Contrato nº {contract}/{year}, '
+     'firmado com a empresa responsável pela manutenção predial da sede do Ministério Público de Contas.'),
+    ('ferias', 'férias de servidor',
+     'CONCEDER ao(à) servidor(a) {server} trinta dias de férias regulamentares, referentes ao exercício de {year}, '
+     'a serem usufruídas a partir de {day} de {month} de {year}.'),
+    ('diarias', 'diárias de viagem',
+     'AUTORIZAR o pagamento de {days} diárias ao(à) servidor(a) {server}, que se deslocará ao município de '
+     'Marabá para participar de inspeção in loco na prefeitura municipal.'),
+    ('nomeacao', 'nomeação para cargo em comissão',
+     'NOMEAR {server} para exercer o cargo em comissão de Assessor Técnico, a contar de {day} de {month} de {year}.'),
+    ('exoneracao', 'exoneração a pedido',
+     'EXONERAR, a pedido, o(a) servidor(a) {server} do cargo em comissão de Assessor Técnico, '
+     'a contar de {day} de {month} de {year}.'),
+    ('licenca', 'licença para capacitação',
+     'CONCEDER ao(à) servidor(a) {server} licença para capacitação por noventa dias, para participar de '
+     'curso de especialização em auditoria governamental.'),
+    ('comissao', 'comissão de licitação',
+     'CONSTITUIR comissão permanente de licitação, composta pelos servidores {server} e {other}, '
+     'sob a presidência do(a) primeiro(a), com mandato de um ano.'),
+    ('teletrabalho', 'teletrabalho',
+     'AUTORIZAR o regime de teletrabalho para o(a) servidor(a) {server}, pelo período de seis meses, '
+     'com metas de produtividade definidas pela chefia imediata.'),
+]
+
+PREAMBLE = (
+    'O PROCURADOR-GERAL DE CONTAS DO MINISTÉRIO PÚBLICO DE CONTAS DO ESTADO DO PARÁ, no uso das atribuições '
+    'que lhe confere a Lei Complementar Estadual nº 9, de 27 de janeiro de 1992, e considerando o que consta '
+    'do Processo Administrativo nº {process}/{year},'
+)
+
+FILLER = (
+    'Considerando a necessidade de assegurar a continuidade dos serviços prestados pelo órgão, a observância '
+    'dos princípios da legalidade, da eficiência e da publicidade, bem como as normas internas que disciplinam '
+    'a gestão de pessoas e a execução orçamentária e financeira no âmbito do Ministério Público de Contas.'
+)
+
+
+class SyntheticPortaria:
+    def __init__(self, filename, number, year, month, doc_type, subject, pages, scanned, text):
+        self.filename = filename
+        self.number = number
+        self.year = year
+        self.month = month
+        self.doc_type = doc_type
+        self.subject = subject
+        self.pages = pages
+        self.scanned = scanned
+        self.text = text
+
+
+def portaria_text(number, year, rng, pages=1):
+    """Texto de uma portaria (uma lista de páginas), com o número e o ano no cabeçalho."""
+    doc_type, subject, body = rng.choice(SUBJECTS)
+    month = rng.randint(1, 12)
+    day = rng.randint(1, 28)
+    server, other = rng.sample(SERVERS, 2)
+    fields = {
+        "server": server, "other": other, "year": year, "day": day, "month": MONTH_NAMES[month - 1],
+        "contract": rng.randint(1, 99), "days": rng.randint(1, 5), "process": rng.randint(1000, 9999),
+    }
+    first = "\n\n".join([
+        f"PORTARIA Nº {number}/{year}/MPC/PA",
+        PREAMBLE.format(**fields),
+        "RESOLVE:",
+        body.format(**fields),
+        "Publique-se, registre-se e cumpra-se.",
+        f"Belém, {day} de {MONTH_NAMES[month - 1]} de {year}.",
+    ])
+    texts = [first]
+    for page in range(2, pages + 1):
+        texts.append(f"(continuação da Portaria nº {number}/{year})\n\n" + "\n\n".join([FILLER] * rng.randint(2, 5)))
+    return doc_type, subject, month, texts
+
+
+def write_text_pdf(path, pages):
+    with fitz.open() as doc:
+        for text in pages:
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(60, 60, 540, 790), text, fontsize=10)
+        doc.save(path)
+
+
+def write_scanned_pdf(path, pages, dpi=150):
+    """PDF "digitalizado": cada página é só a imagem do texto renderizado, sem camada de texto."""
+    with fitz.open() as source, fitz.open() as doc:
+        for text in pages:
+            page = source.new_page()
+            page.insert_textbox(fitz.Rect(60, 60, 540, 790), text, fontsize=10)
+            image = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY).tobytes("png")
+            scanned = doc.new_page(width=page.rect.width, height=page.rect.height)
+            scanned.insert_image(scanned.rect, stream=image)
+        doc.save(path)
+
+
+def generate_corpus(directory, count, scanned_ratio=0.1, max_pages=3, first_year=2018, last_year=2024, seed=42):
+    """Gera `count` portarias em `directory` e retorna a lista de `SyntheticPortaria`."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    corpus = []
+    numbers = {}
+    for _ in range(count):
+        year = rng.randint(first_year, last_year)
+        number = numbers[year] = numbers.get(year, 0) + 1
+        pages = rng.randint(1, max_pages)
+        scanned = rng.random() < scanned_ratio
+        doc_type, subject, month, texts = portaria_text(number, year, rng, pages)
+        filename = f"portaria_{number:03d}-{year}.pdf"
+        path = os.path.join(directory, filename)
+        if scanned:
+            write_scanned_pdf(path, texts)
+        else:
+            write_text_pdf(path, texts)
+        corpus.append(SyntheticPortaria(filename, number, year, month, doc_type, subject, pages, scanned, "\f".join(texts)))
+    return corpus
+
+
+def sample_queries(corpus, count, seed=42):
+    """Consultas sobre o acervo gerado: por assunto, por assunto e ano, por mês e pela portaria citada."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        item = rng.choice(corpus)
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(f"portarias sobre {item.subject}")
+        elif kind < 0.7:
+            queries.append(f"{item.subject} em {item.year}")
+        elif kind < 0.85:
+            queries.append(f"{item.subject} em {MONTH_NAMES[item.month - 1]} de {item.year}")
+        else:
+            queries.append(f"portaria nº {item.number}/{item.year}")
+    return queries
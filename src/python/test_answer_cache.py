@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+
+import answer_cache
+import rag_api
+from answer_cache import AnswerCache
+from index_version import IndexVersion
+
+# Cache de respostas do /ask (answer_cache.py): remoção LRU, expiração,
+# descarte ao mudar a versão do índice (index_version.py) e estabilidade
+# da chave entre versões do prompt.
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_least_recently_used_answer_is_evicted():
+    cache = AnswerCache(maxsize=2)
+    cache.put("a", "resposta a", "v1")
+    cache.put("b", "resposta b", "v1")
+    assert cache.get("a", "v1") == "resposta a"
+    cache.put("c", "resposta c", "v1")
+
+    assert cache.get("b", "v1") is None
+    assert (cache.get("a", "v1"), cache.get("c", "v1")) == ("resposta a", "resposta c")
+    assert cache.stats() == {"hits": 3, "misses": 1, "expired": 0, "invalidations": 0, "entries": 2}
+
+
+def test_answers_expire_after_the_ttl(clock):
+    cache = AnswerCache(ttl=60)
+    cache.put("a", "resposta", "v1")
+
+    clock[0] += 60
+    assert cache.get("a", "v1") == "resposta"
+    clock[0] += 1
+    assert cache.get("a", "v1") is None
+    assert cache.stats()["expired"] == 1 and cache.stats()["entries"] == 0
+
+
+def test_new_index_version_discards_the_answers(tmp_path):
+    version = IndexVersion(str(tmp_path / ".index_version"))
+    cache = AnswerCache()
+    assert version.current() == "none"
+    cache.put("a", "resposta", version.current())
+
+    token = version.bump()
+
+    assert version.current() == token
+    assert cache.get("a", version.current()) is None
+    assert cache.stats()["invalidations"] == 1
+    cache.put("a", "nova resposta", version.current())
+    assert cache.get("a", IndexVersion(version.path).current()) == "nova resposta"
+
+
+def test_key_is_stable_across_equivalent_questions_but_not_prompt_versions():
+    key = AnswerCache.make_key("Quem é o fiscal do contrato?", [3, 1], "prompt-1")
+
+    assert AnswerCache.make_key("  quem e o FISCAL do   contrato? ", [3, 1], "prompt-1") == key
+    assert AnswerCache.make_key("Quem é o fiscal do contrato?", [3, 1], "prompt-2") != key
+    assert AnswerCache.make_key("Quem é o fiscal do contrato?", [1, 3], "prompt-1") != key
+    assert AnswerCache.make_key("Quem é o fiscal do contrato?", [3], "prompt-1") != key
+
+
+def test_api_lookup_misses_after_a_prompt_change(monkeypatch):
+    monkeypatch.setattr(rag_api, 'answer_cache', AnswerCache())
+    docs = [SimpleNamespace(id=3), SimpleNamespace(id=1)]
+    key, version, _ = rag_api.lookup_answer("Quem é o fiscal?", docs, version="v1")
+    rag_api.answer_cache.put(key, {"answer": "Fulano."}, version)
+
+    assert rag_api.lookup_answer("quem e o fiscal?", docs, version="v1")[2] == {"answer": "Fulano."}
+    monkeypatch.setattr(rag_api, 'PROMPT_VERSION', rag_api.PROMPT_VERSION + "-novo")
+    assert rag_api.lookup_answer("Quem é o fiscal?", docs, version="v1")[2] is None
@@ -0,0 +1,136 @@
+import gzip
+import json
+import os
+
+import pytest
+
+import rag_api
+from document_store import DocumentStore
+from settings import settings
+
+# Armazenamento dos textos extraídos (document_store.py) em um diretório
+# temporário: gravação só de acréscimo, compactação, um leitor que perde a
+# corrida com a compactação e as respostas do /document (ETag, página e trecho).
+
+PAGES = ["Página um: PORTARIA Nº 12/2024/MPC/PA.", "Página dois: RESOLVE designar.", "Página três: cumpra-se."]
+
+
+@pytest.fixture
+def store(tmp_path):
+    writer = DocumentStore(str(tmp_path), page_separator='\f')
+    writer.put("portaria_012-2024", "\f".join(PAGES), title="PORTARIA Nº 12/2024/MPC/PA", year=2024)
+    writer.commit()
+    yield writer
+    writer.close()
+
+
+def test_committed_documents_are_read_by_page(store, tmp_path):
+    reader = DocumentStore(str(tmp_path), readonly=True, page_separator='\f')
+
+    document = reader.get("portaria_012-2024")
+
+    assert (document.title, document.year, document.page_count) == ("PORTARIA Nº 12/2024/MPC/PA", 2024, 3)
+    assert [document.page(number) for number in (1, 2, 3)] == PAGES
+    assert document.page(0) is None and document.page(4) is None
+    assert document.text() == "\f".join(PAGES)
+    assert reader.get("outra") is None
+
+
+def test_uncommitted_writes_are_not_visible_to_readers(store, tmp_path):
+    reader = DocumentStore(str(tmp_path), readonly=True, page_separator='\f')
+    store.put("portaria_013-2024", "Texto novo.")
+
+    assert "portaria_013-2024" in store
+    assert "portaria_013-2024" not in reader
+    store.commit()
+    assert reader.get("portaria_013-2024").text() == "Texto novo."
+
+
+def test_identical_text_is_not_appended_and_compaction_drops_old_versions(store, tmp_path):
+    size = os.path.getsize(tmp_path / "documents.0.dat")
+    store.put("portaria_012-2024", "\f".join(PAGES), title="título corrigido")
+    store.commit()
+    assert os.path.getsize(tmp_path / "documents.0.dat") == size
+
+    store.put("portaria_012-2024", "Texto revisado.")
+    store.put("portaria_014-2024", "Outra portaria.")
+    store.delete("portaria_014-2024")
+    assert store.compact(min_garbage_ratio=0.5)
+
+    assert sorted(os.listdir(tmp_path)) == ["documents.1.dat", "index.json"]
+    assert os.path.getsize(tmp_path / "documents.1.dat") == len("Texto revisado.".encode('utf-8'))
+    reader = DocumentStore(str(tmp_path), readonly=True, page_separator='\f')
+    assert reader.ids() == ["portaria_012-2024"]
+    assert reader.get("portaria_012-2024").text() == "Texto revisado."
+    assert not store.compact(min_garbage_ratio=0.5)
+
+
+def test_reader_rereads_the_index_when_compaction_wins_the_race(store, tmp_path, monkeypatch):
+    reader = DocumentStore(str(tmp_path), readonly=True, page_separator='\f')
+    store.put("portaria_012-2024", "Texto revisado.")
+    store.commit()
+    read_index = reader._read_index
+    reads = []
+
+    def read_then_compact():
+        # O leitor carrega o índice da geração 0; antes de abrir os dados,
+        # a compactação publica a geração 1 e apaga a 0.
+        index = read_index()
+        reads.append(index['generation'])
+        if len(reads) == 1:
+            assert store.compact(min_garbage_ratio=0.1)
+        return index
+
+    monkeypatch.setattr(reader, '_read_index', read_then_compact)
+
+    assert reader.get("portaria_012-2024").text() == "Texto revisado."
+    assert reads == [0, 1]
+
+
+@pytest.fixture
+def documents(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_api, 'document_store', DocumentStore(str(tmp_path), readonly=True, page_separator='\f'))
+
+
+def respond(args=None, headers=None):
+    status, body, response_headers = rag_api.document_response("portaria_012-2024", args or {}, headers or {})
+    if response_headers.get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    return status, json.loads(body) if body else None, response_headers
+
+
+def test_document_etag_answers_304(documents):
+    status, document, headers = respond()
+    etag = headers["ETag"]
+
+    assert status == 200 and document["content"] == "\n\n".join(PAGES)
+    assert respond(headers={"If-None-Match": etag})[0] == 304
+    assert respond(headers={"If-None-Match": f'"outro", {etag[2:]}'})[0] == 304
+    assert respond(headers={"If-None-Match": '"outro"'})[0] == 200
+    # Cada parte do documento tem o seu ETag.
+    assert respond({"page": "2"})[2]["ETag"] != etag
+
+
+def test_document_page_and_range(documents):
+    status, page, _ = respond({"page": "2"})
+    assert (status, page["page"], page["content"], page["pages"]) == (200, 2, PAGES[1], 3)
+
+    status, part, _ = respond({"offset": "6", "length": "10"})
+    assert (status, part["offset"], part["content"]) == (200, 6, "\n\n".join(PAGES)[6:16])
+    assert part["total_length"] == len("\n\n".join(PAGES))
+
+    assert respond({"page": "4"})[0] == 416
+    assert respond({"offset": "100000"})[0] == 416
+    assert respond({"page": "0"})[0] == 400
+    assert respond({"length": "abc"})[0] == 400
+    assert rag_api.document_response("inexistente", {}, {})[0] == 404
+
+
+def test_document_is_gzipped_when_accepted(documents, monkeypatch):
+    monkeypatch.setattr(settings, 'DOCUMENT_GZIP_MIN_BYTES', 10)
+
+    status, document, headers = respond(headers={"Accept-Encoding": "gzip, br"})
+
+    assert status == 200 and headers["Content-Encoding"] == "gzip"
+    assert document["content"] == "\n\n".join(PAGES)
+    assert "Content-Encoding" not in respond()[2]
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+
+from embedding_cache import CachedEmbeddings
+
+# Cache de embeddings das consultas (embedding_cache.py).
+
+
+class StubModel:
+    """Modelo de embeddings que conta as chamadas e devolve um vetor por texto."""
+
+    model = "stub-embedding"
+    task_type = "RETRIEVAL_QUERY"
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return [float(len(text)), 1.0]
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+
+def record_persistent_threads(cache):
+    """Registra a thread de cada acesso à camada persistente."""
+    threads = []
+    store = cache.persistent
+    get, put = store.get, store.put
+    store.get = lambda key: threads.append(threading.get_ident()) or get(key)
+    store.put = lambda key, vector: threads.append(threading.get_ident()) or put(key, vector)
+    return threads
+
+
+def test_async_lookups_use_the_persistent_tier_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    CachedEmbeddings(StubModel(), persistent_path=path).embed_query("férias em 2023")
+    cache = CachedEmbeddings(StubModel(), persistent_path=path)
+    threads = record_persistent_threads(cache)
+
+    async def lookups():
+        loop_thread = threading.get_ident()
+        single = await cache.aembed_query("férias em 2023")
+        batch = await cache.aembed_queries(["Férias em 2023", "diárias", "diárias"])
+        return loop_thread, single, batch
+
+    loop_thread, single, batch = asyncio.run(lookups())
+
+    assert single == batch[0] == [14.0, 1.0]
+    assert batch[1] == batch[2]
+    assert cache.model.calls == [["diárias"]]
+    assert cache.stats()["persistent_hits"] == 1
+    assert threads and loop_thread not in threads
+
+
+def test_memory_tier_evicts_the_least_recently_used():
+    cache = CachedEmbeddings(StubModel(), maxsize=2)
+    cache.embed_query("férias")
+    cache.embed_query("diárias")
+    cache.embed_query("férias")
+    cache.embed_query("licença")
+
+    # "diárias" era a menos usada: é a única que volta ao modelo.
+    for text in ("férias", "licença", "diárias"):
+        cache.embed_query(text)
+
+    assert cache.model.calls == [["férias"], ["diárias"], ["licença"], ["diárias"]]
+    assert len(cache.memory) == 2
+
+
+def test_persistent_tier_keeps_the_most_recently_used(tmp_path, monkeypatch):
+    clock = iter(range(1000))
+    monkeypatch.setattr("embedding_cache.time.time", lambda: float(next(clock)))
+    cache = CachedEmbeddings(StubModel(), persistent_path=str(tmp_path / "embeddings.sqlite3"), max_persistent_entries=10)
+    cache.embed_queries([f"portaria {number}" for number in range(12)])
+
+    cache.persistent.evict()
+
+    kept = {key for key, _ in cache.persistent.recent(100)}
+    assert kept == {cache._key(f"portaria {number}") for number in range(3, 12)}
+
+
+def test_key_is_stable_for_equivalent_text_and_changes_with_the_model(tmp_path, monkeypatch):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = CachedEmbeddings(StubModel(), persistent_path=path)
+    cache.embed_query("Férias  em 2023")
+
+    same = CachedEmbeddings(StubModel(), persistent_path=path)
+    assert same._key(" ferias EM 2023 ") == cache._key("Férias  em 2023")
+    assert same.embed_query("ferias em 2023") == [15.0, 1.0]
+    assert same.model.calls == []
+
+    other_task = StubModel()
+    other_task.task_type = "RETRIEVAL_DOCUMENT"
+    assert CachedEmbeddings(other_task, persistent_path=path)._key("férias em 2023") != cache._key("férias em 2023")
+    # Uma nova versão do formato ignora as entradas persistidas.
+    monkeypatch.setattr("embedding_cache.CACHE_FORMAT_VERSION", 2)
+    upgraded = CachedEmbeddings(StubModel(), persistent_path=path)
+    upgraded.embed_query("férias em 2023")
+    assert upgraded.model.calls == [["férias em 2023"]]
@@ -0,0 +1,68 @@
+import os
+import signal
+import time
+
+from pdf_processor import ExtractionPool
+
+# Pool de extração (pdf_processor.ExtractionPool) com workers simulados. O
+# nome de cada "PDF" diz o que o worker faz com ele: "ok" responde depois de
+# alguns milissegundos, "segfault" e "exit" derrubam o processo e "slow"
+# passa do tempo limite. Os workers ficam no nível do módulo para que os
+# processos filhos ('spawn') os importem.
+
+
+def fake_worker(path):
+    name = os.path.basename(path)
+    kind, number = os.path.splitext(name)[0].split('-')
+    if kind == 'segfault':
+        os.kill(os.getpid(), signal.SIGSEGV)
+    elif kind == 'exit':
+        os._exit(1)
+    elif kind == 'slow':
+        time.sleep(60)
+    # Os de número maior terminam antes, fora da ordem da entrada.
+    time.sleep(max(0, 12 - int(number)) * 0.02)
+    return {'filename': name, 'title': f"PORTARIA Nº {number}"}
+
+
+def run(paths, **kwargs):
+    with ExtractionPool(max_workers=3, worker=fake_worker, progress_every=0, **kwargs) as pool:
+        return list(pool.imap(iter(paths)))
+
+
+def reasons(results):
+    return {path: result.get('reason') for path, result in results}
+
+
+def test_results_follow_the_input_order():
+    paths = [f"ok-{number}.pdf" for number in range(1, 11)]
+
+    results = run(paths)
+
+    assert [path for path, _ in results] == paths
+    assert [result['filename'] for _, result in results] == paths
+
+
+def test_crashing_workers_are_discarded_without_losing_the_others():
+    paths = ["ok-1.pdf", "segfault-2.pdf", "ok-3.pdf", "exit-4.pdf", "ok-5.pdf", "ok-6.pdf"]
+
+    results = run(paths)
+
+    assert [path for path, _ in results] == paths
+    assert reasons(results) == {
+        "ok-1.pdf": None, "segfault-2.pdf": 'Falha no processo de extração', "ok-3.pdf": None,
+        "exit-4.pdf": 'Falha no processo de extração', "ok-5.pdf": None, "ok-6.pdf": None,
+    }
+
+
+def test_slow_worker_times_out_and_the_pool_recovers():
+    paths = ["ok-1.pdf", "slow-2.pdf", "ok-3.pdf", "ok-4.pdf", "ok-5.pdf"]
+
+    started = time.monotonic()
+    results = run(paths, timeout=5)
+
+    assert time.monotonic() - started < 30
+    assert [path for path, _ in results] == paths
+    assert reasons(results) == {
+        "ok-1.pdf": None, "slow-2.pdf": 'Tempo limite excedido', "ok-3.pdf": None, "ok-4.pdf": None, "ok-5.pdf": None,
+    }
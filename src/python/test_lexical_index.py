@@ -0,0 +1,104 @@
+import sqlite3
+
+import pytest
+
+from lexical_index import LexicalIndex, parse_portaria_reference, reciprocal_rank_fusion
+from query_planner import plan_query
+
+# Índice lexical (lexical_index.py) em um arquivo temporário: BM25 com os
+# filtros do plano da consulta, busca exata por número/ano, leituras
+# durante uma gravação (WAL), publicação de uma reconstrução e falhas do SQLite.
+
+
+def chunk(point_id, source, year, text, number=None, chunk_index=0, month=None):
+    return {
+        "point_id": point_id, "source": source, "title": f"PORTARIA Nº {number or 1}/{year}/MPC/PA",
+        "year": year, "month": month, "number": number, "doc_types": [], "page": 1,
+        "chunk_index": chunk_index, "text": text,
+    }
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    path = str(tmp_path / "lexical.sqlite")
+    writer = LexicalIndex.create(path, "portarias_v1")
+    writer.upsert_chunks([
+        chunk("a", "portaria_001-2023.pdf", 2023, "Concede férias ao servidor João.", number=1),
+        chunk("b", "portaria_002-2023.pdf", 2023, "Designa fiscal do contrato de limpeza; o fiscal acompanha o contrato.", number=2),
+        chunk("c", "portaria_003-2024.pdf", 2024, "Designa fiscal do contrato de vigilância.", number=3),
+        chunk("d", "portaria_003-2024.pdf", 2024, "Publique-se e cumpra-se.", number=3, chunk_index=1),
+    ])
+    writer.close()
+    return path
+
+
+def test_bm25_ranks_and_filters_by_plan(index_path):
+    index = LexicalIndex(index_path, readonly=True)
+
+    ranked = [row['point_id'] for row in index.search("fiscal do contrato")]
+    filtered = [row['point_id'] for row in index.search("fiscal do contrato em 2024", plan=plan_query("em 2024"))]
+
+    # O trecho que repete os termos vem primeiro; o de férias não contém nenhum.
+    assert ranked == ["b", "c"]
+    assert filtered == ["c"]
+    assert index.search("de para com") == []
+
+
+def test_find_portaria_returns_the_document_chunks_in_order(index_path):
+    index = LexicalIndex(index_path, readonly=True)
+
+    rows = index.find_portaria(*parse_portaria_reference("o que diz a portaria nº 3/2024?"))
+
+    assert [(row['source'], row['chunk_index']) for row in rows] == [
+        ("portaria_003-2024.pdf", 0), ("portaria_003-2024.pdf", 1)
+    ]
+    assert index.find_portaria(9, 2024) == []
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+
+    assert [item for item, _ in fused] == ["a", "c", "b"]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+
+
+def test_readers_are_not_blocked_by_a_write_in_progress(index_path):
+    writer = LexicalIndex(index_path)
+    reader = LexicalIndex(index_path, readonly=True)
+    conn = writer._connection()
+    conn.execute("BEGIN EXCLUSIVE")
+    conn.execute("DELETE FROM chunks WHERE point_id = 'a'")
+
+    try:
+        # Com o WAL, a leitura vê o último estado gravado sem esperar pela transação.
+        assert [row['point_id'] for row in reader.search("férias")] == ["a"]
+    finally:
+        conn.rollback()
+        writer.close()
+
+
+def test_publish_replaces_the_content_under_open_readers(index_path, tmp_path):
+    reader = LexicalIndex(index_path, readonly=True)
+    live = LexicalIndex(index_path)
+    assert [row['point_id'] for row in reader.search("férias")] == ["a"]
+
+    building = LexicalIndex.create(index_path + ".building", "portarias_v2")
+    building.upsert_chunks([chunk("e", "portaria_001-2025.pdf", 2025, "Concede férias à servidora Ana.", number=1)])
+    published = building.publish(index_path)
+
+    assert [row['point_id'] for row in reader.search("férias")] == ["e"]
+    assert published.collection() == "portarias_v2"
+    assert not any(path.name.startswith("lexical.sqlite.building") for path in tmp_path.iterdir())
+    live.close()
+    published.close()
+
+
+def test_sqlite_errors_are_not_reported_as_misses(tmp_path):
+    path = tmp_path / "corrompido.sqlite"
+    path.write_bytes("isto não é um banco SQLite".encode("utf-8") * 100)
+    index = LexicalIndex(str(path), readonly=True)
+
+    with pytest.raises(sqlite3.DatabaseError):
+        index.search("fiscal do contrato")
+    with pytest.raises(sqlite3.DatabaseError):
+        index.find_portaria(3, 2024)
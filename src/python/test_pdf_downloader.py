@@ -0,0 +1,110 @@
+import os
+import json
+
+import pytest
+
+from local_portal import LocalPortal
+from pdf_downloader import STATE_FILENAME, iter_pdfs
+
+# Crawler e downloads contra o portal local (local_portal.py): paginação,
+# parada nas páginas já conhecidas, GETs condicionais e gravação atômica.
+
+
+def write_pdf(directory, name, content):
+    with open(os.path.join(directory, name), 'wb') as f:
+        f.write(b'%PDF-1.4\n' + content)
+
+
+@pytest.fixture
+def portal(tmp_path):
+    source = tmp_path / "portal"
+    source.mkdir()
+    for number in range(1, 6):
+        write_pdf(source, f"portaria_{number:03d}-2024.pdf", f"portaria {number}".encode())
+    with LocalPortal(str(source), per_page=2) as portal:
+        yield portal
+
+
+def crawl(portal, output_dir, **kwargs):
+    kwargs.setdefault('max_pages', 10)
+    return sorted(iter_pdfs(portal.url, str(output_dir), max_workers=2, per_host=2, **kwargs))
+
+
+def load_state(output_dir):
+    with open(os.path.join(output_dir, STATE_FILENAME), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_follows_pagination_and_records_validators(portal, tmp_path):
+    output = tmp_path / "pdfs"
+
+    assert crawl(portal, output) == sorted(portal.filenames())
+    assert len(portal.listing_requests()) == 3
+    assert not [name for name in os.listdir(output) if name.endswith('.part')]
+    for name in portal.filenames():
+        with open(output / name, 'rb') as served, open(os.path.join(portal.directory, name), 'rb') as original:
+            assert served.read() == original.read()
+
+    state = load_state(output)
+    assert len(state) == 5
+    assert all(record['etag'] and record['last_modified'] for record in state.values())
+
+
+def test_unchanged_pdfs_are_revalidated_with_304(portal, tmp_path):
+    output = tmp_path / "pdfs"
+    crawl(portal, output)
+    portal.requests.clear()
+
+    assert crawl(portal, output, stop_on_known=False) == sorted(portal.filenames())
+    pdf_requests = portal.pdf_requests()
+    assert len(pdf_requests) == 5
+    assert all(status == 304 and 'If-None-Match' in headers for _, status, headers in pdf_requests)
+
+
+def test_changed_pdf_is_downloaded_again(portal, tmp_path):
+    output = tmp_path / "pdfs"
+    crawl(portal, output)
+    changed = portal.filenames()[-1]
+    write_pdf(portal.directory, changed, b"nova versao")
+    portal.requests.clear()
+
+    crawl(portal, output, stop_on_known=False)
+    statuses = {os.path.basename(path): status for path, status, _ in portal.pdf_requests()}
+    assert statuses.pop(changed) == 200
+    assert set(statuses.values()) == {304}
+    with open(output / changed, 'rb') as f:
+        assert f.read().endswith(b"nova versao")
+
+
+def test_stops_at_first_page_already_known(portal, tmp_path):
+    output = tmp_path / "pdfs"
+    crawl(portal, output)
+    portal.requests.clear()
+
+    # Página 1 toda conhecida: nenhuma outra página é buscada.
+    crawl(portal, output, stop_on_known=True)
+    assert len(portal.listing_requests()) == 1
+
+    # Uma portaria nova na página 1 faz o crawl seguir até a próxima página toda conhecida.
+    write_pdf(portal.directory, "portaria_006-2024.pdf", b"portaria 6")
+    portal.requests.clear()
+    downloaded = crawl(portal, output, stop_on_known=True)
+    assert "portaria_006-2024.pdf" in downloaded
+    assert len(portal.listing_requests()) == 2
+    assert os.path.exists(output / "portaria_006-2024.pdf")
+
+
+def test_max_pages_limits_the_crawl(portal, tmp_path):
+    assert len(crawl(portal, tmp_path / "pdfs", max_pages=1)) == 2
+    assert len(portal.listing_requests()) == 1
+
+
+def test_validators_saved_when_closed_early(portal, tmp_path):
+    output = tmp_path / "pdfs"
+    pdfs = iter_pdfs(portal.url, str(output), max_pages=10, max_workers=1, per_host=1)
+    first = next(pdfs)
+    pdfs.close()
+
+    state = load_state(output)
+    assert any(record['filename'] == first for record in state.values())
+    assert all(os.path.exists(output / record['filename']) for record in state.values())
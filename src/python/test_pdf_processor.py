@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+import ocr_engine
+from pdf_processor import process_single_pdf
+from synthetic_portarias import portaria_text, write_scanned_pdf, write_text_pdf
+
+# Extração de um PDF (pdf_processor.py) com o OCR simulado: quantas vezes o
+# Tesseract é chamado por PDF digitalizado e de onde vêm o título e o ano.
+
+
+class CountingOcrWorker:
+    """Worker de OCR que devolve os textos de `texts`, em ordem, e conta as chamadas."""
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self.calls = 0
+
+    def recognize(self, image):
+        self.calls += 1
+        return self.texts.pop(0) if self.texts else ""
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def ocr(monkeypatch):
+    def install(texts):
+        worker = CountingOcrWorker(texts)
+        monkeypatch.setattr(ocr_engine, '_engine', ocr_engine.OcrEngine(worker=worker))
+        return worker
+    return install
+
+
+def scanned_pdf(tmp_path, pages=3):
+    _, _, _, texts = portaria_text(123, 2024, random.Random(7), pages)
+    path = tmp_path / "portaria_123-2024.pdf"
+    write_scanned_pdf(str(path), texts, dpi=50)
+    return str(path), texts
+
+
+def test_scanned_pdf_is_recognized_once_per_page(ocr, tmp_path):
+    path, texts = scanned_pdf(tmp_path)
+    worker = ocr(texts)
+
+    result = process_single_pdf(path)
+
+    assert worker.calls == len(texts)
+    assert result['title'] == "PORTARIA Nº 123/2024/MPC/PA"
+    assert result['year'] == 2024
+    assert result['pages'] == result['ocr_pages'] == len(texts)
+    assert ocr_engine.get_engine().stats()['headers'] == 0
+
+
+def test_header_is_reread_only_when_page_ocr_misses_the_title(ocr, tmp_path):
+    path, texts = scanned_pdf(tmp_path, pages=2)
+    without_title = texts[0].split("\n\n", 1)[1]
+    # O cabeçalho é relido logo após a primeira página, antes do OCR das seguintes.
+    worker = ocr([without_title, "PORTARIA Nº 123/2024/MPC/PA", texts[1]])
+
+    result = process_single_pdf(path)
+
+    assert worker.calls == len(texts) + 1
+    assert (result['title'], result['year']) == ("PORTARIA Nº 123/2024/MPC/PA", 2024)
+
+
+def test_text_pdf_skips_ocr(ocr, tmp_path):
+    _, _, _, texts = portaria_text(5, 2023, random.Random(3), 2)
+    path = tmp_path / "portaria_005-2023.pdf"
+    write_text_pdf(str(path), texts)
+    worker = ocr([])
+
+    result = process_single_pdf(str(path))
+
+    assert worker.calls == 0
+    assert (result['year'], result['ocr_pages']) == (2023, 0)
+
+
+def test_scanned_pdf_in_another_language_is_rejected_after_one_ocr(ocr, tmp_path):
+    path, _ = scanned_pdf(tmp_path)
+    worker = ocr(["The quick brown fox jumps over the lazy dog while the committee reviews the annual budget report."])
+
+    result = process_single_pdf(path)
+
+    assert result['reason'] == 'Não está em português'
+    assert worker.calls == 1
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import Pipeline
+
+# Pipeline produtor/consumidor (pipeline.py): filas limitadas, lotes e
+# interrupção de todas as etapas quando uma delas falha.
+
+
+def produce(items):
+    def target(emit):
+        for item in items:
+            emit(item)
+    return target
+
+
+def collect(into, delay=0.0):
+    def target(inbox, emit):
+        for item in inbox:
+            time.sleep(delay)
+            into.append(item)
+    return target
+
+
+def test_bounded_queue_holds_back_a_fast_producer():
+    pipeline = Pipeline(poll_interval=0.05)
+    q = pipeline.add_queue("itens", maxsize=2)
+    produced, consumed = [], []
+    ahead = []
+    lock = threading.Lock()
+
+    def producer(emit):
+        for item in range(30):
+            with lock:
+                produced.append(item)
+                ahead.append(len(produced) - len(consumed))
+            emit(item)
+
+    def consumer(inbox, emit):
+        for item in inbox:
+            time.sleep(0.01)
+            with lock:
+                consumed.append(item)
+
+    pipeline.add_stage("produz", producer, outbox=q)
+    pipeline.add_stage("consome", consumer, inbox=q)
+    report = pipeline.run()
+
+    assert consumed == list(range(30))
+    # Na fila, no consumidor e no `emit` bloqueado do produtor: nunca mais que isso.
+    assert max(ahead) <= q.maxsize + 2
+    assert report["queues"]["itens"]["max_depth"] <= q.maxsize
+    assert report["stages"]["produz"]["items"] == 30
+
+
+def test_batches_are_released_by_size_or_wait():
+    pipeline = Pipeline(poll_interval=0.05)
+    q = pipeline.add_queue("itens", maxsize=10)
+    batches = []
+
+    def producer(emit):
+        for item in range(5):
+            emit(item)
+        time.sleep(0.3)
+        emit(5)
+
+    pipeline.add_stage("produz", producer, outbox=q)
+    pipeline.add_stage("lotes", collect(batches), inbox=q, batch_size=3, max_wait=0.1)
+    pipeline.run()
+
+    assert batches == [[0, 1, 2], [3, 4], [5]]
+
+
+def test_stage_error_is_raised_by_run():
+    pipeline = Pipeline(poll_interval=0.05)
+    inbox = pipeline.add_queue("entrada", maxsize=2)
+    outbox = pipeline.add_queue("saida", maxsize=2)
+    received = []
+
+    def fails_on_three(items, emit):
+        for item in items:
+            if item == 3:
+                raise ValueError("item inválido")
+            emit(item)
+
+    pipeline.add_stage("produz", produce(range(10)), outbox=inbox)
+    pipeline.add_stage("transforma", fails_on_three, inbox=inbox, outbox=outbox)
+    pipeline.add_stage("consome", collect(received), inbox=outbox)
+
+    with pytest.raises(ValueError, match="item inválido"):
+        pipeline.run()
+    assert received == [0, 1, 2][:len(received)]
+
+
+def test_failure_stops_blocked_stages():
+    pipeline = Pipeline(poll_interval=0.05)
+    q = pipeline.add_queue("itens", maxsize=1)
+
+    def endless(emit):
+        item = 0
+        while True:
+            emit(item)
+            item += 1
+
+    def fails_after_two(items, emit):
+        for count, _ in enumerate(items, 1):
+            if count == 2:
+                raise RuntimeError("falha no consumidor")
+
+    pipeline.add_stage("produz", endless, outbox=q)
+    pipeline.add_stage("consome", fails_after_two, inbox=q)
+
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="falha no consumidor"):
+        pipeline.run()
+    assert time.monotonic() - started < 5
+    # O produtor, bloqueado na fila cheia, foi interrompido e a sua etapa terminou.
+    assert all(stats.finished is not None for stats, *_ in pipeline.stages)
+    assert not any(thread.name.startswith("pipeline-") for thread in threading.enumerate())
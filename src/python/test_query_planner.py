@@ -0,0 +1,87 @@
+import pytest
+
+from lexical_index import parse_portaria_reference
+from query_planner import plan_query
+
+# Planejador de consultas (query_planner.py): filtros extraídos do texto e a
+# ordem em que eles são relaxados quando a busca não encontra nada.
+
+
+@pytest.mark.parametrize("query", [
+    "qual o marco legal das nomeações",
+    "portarias de maio",
+    "portaria 5/2023 de março",
+])
+def test_month_without_date_context_is_not_a_filter(query):
+    assert plan_query(query).months == []
+
+
+@pytest.mark.parametrize("query, months", [
+    ("férias em março", [3]),
+    ("portarias de março de 2023", [3]),
+    ("designações março/2021", [3]),
+    ("nomeação 03/2023", [3]),
+    ("no mês de maio", [5]),
+])
+def test_month_with_date_context(query, months):
+    assert plan_query(query).months == months
+
+
+def test_month_used_as_range_limit_is_not_a_filter():
+    plan = plan_query("desde março de 2023")
+    assert (plan.year_from, plan.months) == (2023, [])
+
+
+@pytest.mark.parametrize("query, reference", [
+    ("portaria nº 12/2024", (12, 2024)),
+    ("Portaria 12/2024", (12, 2024)),
+    ("portaria n. 45/2023", (45, 2023)),
+    ("portaria no 5/2023", (5, 2023)),
+    ("portaria n° 7 / 2022", (7, 2022)),
+])
+def test_planner_and_lexical_index_agree_on_references(query, reference):
+    plan = plan_query(query)
+    assert (plan.number, plan.years) == (reference[0], [reference[1]])
+    assert plan.months == []
+    assert parse_portaria_reference(query) == reference
+
+
+def test_reference_without_year():
+    assert plan_query("Portaria 12").number == 12
+    assert parse_portaria_reference("Portaria 12") is None
+    assert parse_portaria_reference("portaria 12 e portaria 5/2023") == (5, 2023)
+
+
+def test_year_is_not_taken_as_a_number():
+    plan = plan_query("portaria 2023")
+    assert (plan.number, plan.years) == (None, [2023])
+
+
+def test_relaxation_drops_type_then_month_then_year():
+    plan = plan_query("férias em março de 2023")
+    assert (plan.doc_types, plan.months, plan.years) == (['ferias'], [3], [2023])
+
+    steps = []
+    while plan is not None:
+        steps.append((plan.doc_types, plan.months, plan.years))
+        plan = plan.relaxed()
+    assert steps == [
+        (['ferias'], [3], [2023]),
+        ([], [3], [2023]),
+        ([], [], [2023]),
+        ([], [], []),
+    ]
+
+
+def test_relaxation_keeps_the_number_and_leaves_the_original_plan():
+    plan = plan_query("portaria nº 12/2024 sobre férias")
+    relaxed = plan.relaxed().relaxed()
+    assert (relaxed.number, relaxed.years, relaxed.doc_types) == (12, [], [])
+    assert relaxed.relaxed() is None
+    assert (plan.years, plan.doc_types) == ([2024], ['ferias'])
+
+
+def test_relaxed_range_has_no_filter():
+    plan = plan_query("exonerações entre 2020 e 2022").relaxed()
+    assert (plan.year_from, plan.year_to) == (2020, 2022)
+    assert plan.relaxed().to_filter() is None
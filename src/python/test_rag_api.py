@@ -0,0 +1,236 @@
+import asyncio
+import sqlite3
+
+import pytest
+from qdrant_client.http.models import PointGroup, ScoredPoint
+
+import rag_api
+import rag_api_async
+from lexical_index import LexicalIndex
+from query_planner import plan_query
+
+# Orquestração dos pedidos (fluxos de rag_api.py, executados pelas etapas
+# síncronas e assíncronas), com o modelo de embeddings, o Qdrant e o índice
+# lexical substituídos por funções locais.
+
+
+class StubEmbedder:
+    def embed_query(self, query):
+        return [0.0]
+
+    def embed_queries(self, queries):
+        return [[0.0] for _ in queries]
+
+
+def filter_keys(query_filter):
+    return sorted(condition.key for condition in query_filter.must) if query_filter else []
+
+
+@pytest.fixture
+def retrieval(monkeypatch):
+    """
+    Busca vetorial que só encontra resultados quando o filtro não tem mais
+    as chaves em `empty_with`; a busca lexical registra o plano final de cada consulta.
+    """
+    searches = []
+    plans = {}
+    empty_with = {'doc_types', 'month'}
+
+    def search_vectors(query_vector, query_filter, limit, *args):
+        searches.append(filter_keys(query_filter))
+        return [] if empty_with & set(filter_keys(query_filter)) else ['grupo']
+
+    def search_vectors_batch(batch, *args):
+        return [search_vectors(vector, query_filter, limit) for vector, query_filter, limit in batch]
+
+    def lexical_search(query, plan):
+        plans[query] = plan
+        return []
+
+    async def alexical_search(self, query, plan):
+        return lexical_search(query, plan)
+
+    monkeypatch.setattr(rag_api, 'query_embedder', StubEmbedder())
+    monkeypatch.setattr(rag_api, 'exact_groups', lambda query: None)
+    monkeypatch.setattr(rag_api, 'search_vectors', search_vectors)
+    monkeypatch.setattr(rag_api, 'search_vectors_batch', search_vectors_batch)
+    monkeypatch.setattr(rag_api.Steps, 'lexical_search', lambda self, query, plan: lexical_search(query, plan))
+    monkeypatch.setattr(rag_api_async.AsyncSteps, 'lexical_search', alexical_search)
+    return searches, plans
+
+
+def test_filters_are_relaxed_until_there_are_results(retrieval):
+    searches, plans = retrieval
+    query = "férias em março de 2023"
+
+    groups = rag_api.steps.run(rag_api.retrieval_flow, query)
+
+    plan = plans[query]
+    assert groups == ['grupo']
+    assert (plan.doc_types, plan.months, plan.years) == ([], [], [2023])
+    assert searches == [['doc_types', 'month', 'year'], ['month', 'year'], ['year']]
+
+
+def test_batch_relaxes_only_the_queries_without_results(retrieval):
+    searches, plans = retrieval
+    queries = ["férias em março de 2023", "portarias de 2022"]
+
+    results = rag_api.steps.run(rag_api.retrieval_batch_flow, queries)
+
+    assert results == [['grupo'], ['grupo']]
+    assert (plans[queries[0]].doc_types, plans[queries[0]].months) == ([], [])
+    assert plans[queries[1]].years == [2022]
+    # Um search_batch com as duas consultas e uma busca por etapa de relaxamento da primeira.
+    assert searches == [['doc_types', 'month', 'year'], ['year'], ['month', 'year'], ['year']]
+
+
+def test_async_steps_run_the_same_flow(retrieval, monkeypatch):
+    searches, plans = retrieval
+    query = "férias em março de 2023"
+
+    async def search_vectors(self, *args):
+        return rag_api.search_vectors(*args)
+
+    async def embed_query(self, query):
+        return [0.0]
+
+    monkeypatch.setattr(rag_api_async.AsyncSteps, 'search_vectors', search_vectors)
+    monkeypatch.setattr(rag_api_async.AsyncSteps, 'embed_query', embed_query)
+
+    groups = asyncio.run(rag_api_async.steps.run(rag_api.retrieval_flow, query))
+
+    assert groups == ['grupo']
+    assert plans[query].years == [2023] and plans[query].months == []
+    assert searches == [['doc_types', 'month', 'year'], ['month', 'year'], ['year']]
+
+
+def test_step_errors_reach_the_flow(monkeypatch):
+    def fail(self, *args):
+        raise RuntimeError("Qdrant indisponível")
+
+    monkeypatch.setattr(rag_api.Steps, 'retrieve_shared', fail)
+
+    status, body = rag_api.steps.run(rag_api.ask_flow, {"question": "quem foi nomeado?"})
+
+    assert status == 500 and "error" in body
+
+
+class Hit:
+    def __init__(self, id):
+        self.id = id
+        self.score = 1.0
+        self.payload = {"source": f"{id}.pdf", "title": f"PORTARIA Nº {id}/2024/MPC/PA", "text": "texto"}
+
+
+class Group:
+    def __init__(self, id):
+        self.id = f"{id}.pdf"
+        self.hits = [Hit(id)]
+
+
+class Record:
+    def __init__(self, id, vector):
+        self.id = id
+        self.vector = vector
+        self.payload = {"source": f"{id}.pdf", "title": f"PORTARIA Nº {id}/2024/MPC/PA", "text": "texto"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Sem o aquecimento que o primeiro pedido iniciaria (Qdrant e modelos reais).
+    monkeypatch.setattr(rag_api.warmup, 'start', lambda: None)
+    return rag_api.app.test_client()
+
+
+def sse_events(body):
+    return [block.split("\n", 1)[0][len("event: "):] for block in body.strip().split("\n\n")]
+
+
+def test_stream_cache_hit_skips_the_context(client, monkeypatch):
+    question = "quem foi designado fiscal do contrato?"
+    groups = [Group(1), Group(2)]
+    built = []
+    monkeypatch.setattr(rag_api.Steps, 'retrieve_shared', lambda self, *args: groups)
+    monkeypatch.setattr(rag_api.Steps, 'build_context', lambda self, found_docs, question: built.append(question))
+    cached = {"answer": "Resposta em cache.", "sources": [{"id": "1"}]}
+    cache_key, version, _ = rag_api.lookup_answer(question, rag_api.flatten_groups(groups))
+    rag_api.answer_cache.put(cache_key, cached, version)
+
+    response = client.post('/ask/stream', json={"question": question})
+    body = response.get_data(as_text=True)
+
+    assert sse_events(body) == ["sources", "token", "done"]
+    assert '"Resposta em cache."' in body and '"cached": true' in body
+    assert built == []
+
+
+def lexical_row(point_id, source, text, chunk_index=0):
+    return {
+        "point_id": point_id, "source": source, "title": "PORTARIA Nº 123/2024/MPC/PA", "year": 2024,
+        "number": 123, "page": 1, "chunk_index": chunk_index, "text": text,
+    }
+
+
+@pytest.fixture
+def lexical(monkeypatch, tmp_path):
+    """Índice lexical temporário no lugar do da API."""
+    path = str(tmp_path / "lexical.sqlite")
+    writer = LexicalIndex.create(path, "portarias_v1")
+    monkeypatch.setattr(rag_api, 'lexical_index', LexicalIndex(path, readonly=True))
+    yield writer
+    writer.close()
+
+
+def test_exact_reference_skips_the_embedder(lexical, monkeypatch):
+    lexical.upsert_chunks([
+        lexical_row(f"p{k}", "portaria_123-2024.pdf", f"Trecho {k} da portaria.", k) for k in range(5)
+    ])
+    embedded = []
+    monkeypatch.setattr(rag_api.Steps, 'embed_query', lambda self, query: embedded.append(query))
+
+    groups = rag_api.steps.run(rag_api.retrieval_flow, "portaria nº 123/2024")
+
+    assert embedded == []
+    assert [group.id for group in groups] == ["portaria_123-2024.pdf"]
+    # Como na busca vetorial: até CHUNKS_PER_SOURCE trechos, os primeiros do documento.
+    assert [hit.id for hit in groups[0].hits] == [f"p{k}" for k in range(rag_api.settings.CHUNKS_PER_SOURCE)]
+
+
+def test_fusion_orders_by_reciprocal_rank(lexical, monkeypatch):
+    lexical.upsert_chunks([
+        lexical_row("b", "b.pdf", "fiscal do contrato de limpeza, fiscal do contrato"),
+        lexical_row("c", "c.pdf", "fiscal do contrato de vigilância"),
+    ])
+    vector_groups = [
+        PointGroup(id=f"{id}.pdf", hits=[ScoredPoint(id=id, version=0, score=score, payload={"source": f"{id}.pdf"})])
+        for id, score in [("a", 0.9), ("b", 0.5)]
+    ]
+    retrieved = []
+
+    def retrieve_points(self, ids, with_payload):
+        retrieved.extend(ids)
+        return [Record(point_id, [1.0, 0.0]) for point_id in ids]
+
+    monkeypatch.setattr(rag_api.Steps, 'retrieve_points', retrieve_points)
+
+    groups = rag_api.steps.run(
+        rag_api.hybrid_flow, "fiscal do contrato", plan_query("fiscal do contrato"), vector_groups, [1.0, 0.0], 10
+    )
+
+    # "b" está nas duas listas; "a" é o primeiro da vetorial e "c" o segundo da lexical.
+    assert [group.id for group in groups] == ["b.pdf", "a.pdf", "c.pdf"]
+    assert retrieved == ["c"]
+
+
+def test_lexical_failure_falls_back_to_the_vector_results(monkeypatch):
+    def locked(self, query, plan):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(rag_api.Steps, 'lexical_search', locked)
+    vector_groups = [Group("a")]
+
+    groups = rag_api.steps.run(
+        rag_api.hybrid_flow, "fiscal do contrato", plan_query("fiscal do contrato"), vector_groups, [1.0, 0.0], 10
+    )
+
+    assert groups == vector_groups
@@ -0,0 +1,179 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import AsyncSingleFlight, SingleFlight
+
+# Coalescência de chamadas idênticas (single_flight.py): seguidoras recebem
+# o resultado da líder, falhas não ficam para os pedidos seguintes e
+# seguidoras não ficam presas a uma líder lenta ou interrompida.
+
+
+class Leader:
+    """Função que bloqueia até `release` e conta as execuções."""
+
+    def __init__(self, result="resposta", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class Interrupted(BaseException):
+    pass
+
+
+def in_threads(flight, fn, count):
+    """Chama `flight.do` em `count` threads; a primeira é a líder. Retorna os resultados (ou exceções)."""
+    results = [None] * count
+
+    def call(position):
+        try:
+            results[position] = flight.do("chave", fn)
+        except BaseException as e:
+            results[position] = e
+
+    threads = [threading.Thread(target=call, args=(position,)) for position in range(count)]
+    threads[0].start()
+    fn.started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while flight.stats()["coalesced"] < count - 1:
+        time.sleep(0.01)
+    fn.release.set()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_followers_share_the_leader_result():
+    flight = SingleFlight()
+    fn = Leader()
+
+    results = in_threads(flight, fn, 4)
+
+    assert results == ["resposta"] * 4
+    assert fn.calls == 1
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 3, "errors": 0, "wait_timeouts": 0}
+
+
+def test_errors_reach_the_followers_but_not_later_callers():
+    flight = SingleFlight()
+    error = ValueError("Qdrant indisponível")
+
+    results = in_threads(flight, Leader(error=error), 3)
+
+    assert results == [error] * 3
+    assert flight.stats()["errors"] == 1
+    assert flight.do("chave", lambda: "nova tentativa") == "nova tentativa"
+
+
+def test_follower_runs_alone_after_wait_timeout():
+    flight = SingleFlight(wait_timeout=0.05)
+    fn = Leader()
+    leader = threading.Thread(target=flight.do, args=("chave", fn))
+    leader.start()
+    fn.started.wait(5)
+
+    try:
+        assert flight.do("chave", lambda: "própria") == "própria"
+        assert flight.stats()["wait_timeouts"] == 1
+    finally:
+        fn.release.set()
+        leader.join(5)
+
+
+def test_interrupted_leader_does_not_hand_none_to_followers():
+    flight = SingleFlight()
+    fn = Leader(error=Interrupted())
+    follower_calls = []
+
+    def follower():
+        follower_calls.append(1)
+        return "própria"
+
+    results = [None, None]
+
+    def lead():
+        try:
+            flight.do("chave", fn)
+        except Interrupted as e:
+            results[0] = e
+
+    def follow():
+        results[1] = flight.do("chave", follower)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    fn.started.wait(5)
+    waiting = threading.Thread(target=follow)
+    waiting.start()
+    while flight.stats()["coalesced"] < 1:
+        time.sleep(0.01)
+    fn.release.set()
+    leader.join(5)
+    waiting.join(5)
+
+    assert isinstance(results[0], Interrupted)
+    assert results[1] == "própria" and follower_calls == [1]
+    assert flight.stats()["errors"] == 0
+
+
+def test_async_followers_share_the_result_and_errors_do_not_stick():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        calls = []
+        release = asyncio.Event()
+
+        async def fn(result):
+            calls.append(result)
+            await release.wait()
+            if result is None:
+                raise ValueError("falhou")
+            return result
+
+        first = [asyncio.ensure_future(flight.do("chave", fn, None)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        errors = await asyncio.gather(*first, return_exceptions=True)
+        retry = await flight.do("chave", fn, "ok")
+        return calls, errors, retry, flight.stats()
+
+    calls, errors, retry, stats = asyncio.run(scenario())
+
+    assert calls == [None, "ok"]
+    assert all(isinstance(error, ValueError) for error in errors) and len(set(map(id, errors))) == 1
+    assert retry == "ok"
+    assert stats == {"in_flight": 0, "leaders": 2, "coalesced": 2, "errors": 1}
+
+
+def test_async_leader_disconnect_does_not_cancel_followers():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        release = asyncio.Event()
+
+        async def fn():
+            await release.wait()
+            return "resposta"
+
+        leader = asyncio.ensure_future(flight.do("chave", fn))
+        follower = asyncio.ensure_future(flight.do("chave", fn))
+        await asyncio.sleep(0)
+        leader.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == "resposta"
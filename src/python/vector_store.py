@@ -0,0 +1,407 @@
+import os
+import json
+import struct
+import logging
+import tempfile
+import threading
+from array import array
+
+import numpy as np
+from qdrant_client.http.models import MatchAny, MatchValue, PointGroup, Record, ScoredPoint
+
+logger = logging.getLogger(__name__)
+
+# Incrementar quando o layout do arquivo mudar; um arquivo de outra versão é ignorado.
+STORE_FORMAT_VERSION = 1
+MAGIC = b"MPCVEC"
+# Início de cada seção alinhado a 64 bytes, para o memmap ler direto do arquivo.
+ALIGNMENT = 64
+# Linhas da matriz multiplicadas por vez: limita a memória temporária no int8.
+SCORE_BLOCK_ROWS = 16384
+# Metadados de filtragem gravados como colunas inteiras (0 = sem valor).
+FILTER_COLUMNS = ("year", "month", "number")
+DTYPES = {"float32": np.float32, "int8": np.int8}
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class VectorStoreWriter:
+    """
+    Monta um arquivo do `LocalVectorStore` a partir dos pontos de uma coleção.
+
+    Os vetores são normalizados (a busca é por cosseno) e, com
+    `dtype="int8"`, quantizados por linha (um fator de escala float32 por
+    ponto, ~4x menor que float32). Vetores e payloads vão para arquivos
+    temporários à medida que chegam; `publish` junta tudo em um arquivo
+    novo e o coloca no lugar de `path` de uma só vez (`os.replace`).
+    """
+
+    def __init__(self, path, dtype="float32", doc_types=()):
+        if dtype not in DTYPES:
+            raise ValueError(f"Tipo de vetor não suportado: {dtype}")
+        self.path = path
+        self.dtype = dtype
+        self.doc_types = list(doc_types)
+        self._doc_type_bits = {doc_type: 1 << bit for bit, doc_type in enumerate(self.doc_types)}
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        self._vectors = tempfile.TemporaryFile(dir=directory)
+        self._payloads = tempfile.TemporaryFile(dir=directory)
+        self.dim = None
+        self.ids = []
+        self.sources = {}
+        self.source_ids = array('i')
+        self.columns = {name: array('i') for name in FILTER_COLUMNS}
+        self.doc_type_masks = array('q')
+        self.scales = array('f')
+        self.payload_offsets = array('q', [0])
+
+    def add(self, point_id, vector, payload):
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.dim is None:
+            self.dim = len(vector)
+        elif len(vector) != self.dim:
+            raise ValueError(f"Vetor de {len(vector)} dimensões em uma coleção de {self.dim}")
+        norm = float(np.linalg.norm(vector))
+        if norm:
+            vector = vector / norm
+        if self.dtype == "int8":
+            scale = float(np.abs(vector).max()) / 127 or 1.0
+            self._vectors.write(np.round(vector / scale).astype(np.int8).tobytes())
+            self.scales.append(scale)
+        else:
+            self._vectors.write(vector.astype(np.float32).tobytes())
+
+        self.ids.append(str(point_id))
+        self.source_ids.append(self.sources.setdefault(payload['source'], len(self.sources)))
+        for name in FILTER_COLUMNS:
+            self.columns[name].append(payload.get(name) or 0)
+        mask = 0
+        for doc_type in payload.get('doc_types') or []:
+            mask |= self._doc_type_bits.get(doc_type, 0)
+        self.doc_type_masks.append(mask)
+        encoded = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self._payloads.write(encoded)
+        self.payload_offsets.append(self.payload_offsets[-1] + len(encoded))
+
+    def publish(self, **metadata):
+        """
+        Grava o arquivo e o publica em `path`. `metadata` (ex.: coleção de
+        origem, modelo de embeddings) fica no cabeçalho. Retorna o número de pontos.
+        """
+        count = len(self.ids)
+        sections = [("vectors", self._vectors, DTYPES[self.dtype], (count, self.dim or 0))]
+        if self.dtype == "int8":
+            sections.append(("scales", self.scales, np.float32, (count,)))
+        sections += [("source_ids", self.source_ids, np.int32, (count,))]
+        sections += [(name, self.columns[name], np.int32, (count,)) for name in FILTER_COLUMNS]
+        sections += [
+            ("doc_types", self.doc_type_masks, np.int64, (count,)),
+            ("payload_offsets", self.payload_offsets, np.int64, (count + 1,)),
+            ("payloads", self._payloads, np.uint8, (self.payload_offsets[-1],)),
+            ("ids", json.dumps(self.ids).encode('utf-8'), np.uint8, None),
+        ]
+
+        header = {
+            "format": STORE_FORMAT_VERSION,
+            "dtype": self.dtype,
+            "dim": self.dim or 0,
+            "count": count,
+            "sources": list(self.sources),
+            "doc_types": self.doc_types,
+            **metadata,
+        }
+        # O cabeçalho traz a posição de cada seção, que depende do tamanho do
+        # próprio cabeçalho: reserva-se espaço com folga e preenche-se depois.
+        layout = {}
+        header_bytes = json.dumps({**header, "sections": {}}).encode('utf-8')
+        offset = _aligned(len(MAGIC) + 12 + len(header_bytes) + 128 * len(sections))
+        for name, data, dtype, shape in sections:
+            size = self._size(data, dtype)
+            layout[name] = [offset, np.dtype(dtype).str, list(shape) if shape is not None else [size]]
+            offset = _aligned(offset + size)
+        header_bytes = json.dumps({**header, "sections": layout}).encode('utf-8')
+        if len(MAGIC) + 12 + len(header_bytes) > layout[sections[0][0]][0]:
+            raise RuntimeError("Cabeçalho do armazenamento vetorial maior que o espaço reservado")
+
+        directory = os.path.dirname(self.path) or "."
+        fd, building = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + ".")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(MAGIC + struct.pack('<IQ', STORE_FORMAT_VERSION, len(header_bytes)) + header_bytes)
+                for name, data, _, _ in sections:
+                    f.write(b"\0" * (layout[name][0] - f.tell()))
+                    self._copy(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(building, self.path)
+        except BaseException:
+            if os.path.exists(building):
+                os.remove(building)
+            raise
+        finally:
+            self.close()
+        return count
+
+    @staticmethod
+    def _size(data, dtype):
+        if hasattr(data, 'seek'):
+            return data.seek(0, os.SEEK_END)
+        if isinstance(data, array):
+            return len(data) * np.dtype(dtype).itemsize
+        return len(data)
+
+    @staticmethod
+    def _copy(data, f):
+        if hasattr(data, 'seek'):
+            data.seek(0)
+            while True:
+                block = data.read(1024 * 1024)
+                if not block:
+                    break
+                f.write(block)
+        else:
+            f.write(data.tobytes() if isinstance(data, array) else data)
+
+    def close(self):
+        self._vectors.close()
+        self._payloads.close()
+
+
+class _Snapshot:
+    """Um arquivo aberto: seções mapeadas em memória e índice id -> linha."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            prefix = f.read(len(MAGIC) + 12)
+            if prefix[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"'{path}' não é um armazenamento vetorial")
+            version, header_length = struct.unpack('<IQ', prefix[len(MAGIC):])
+            if version != STORE_FORMAT_VERSION:
+                raise ValueError(f"Formato {version} do armazenamento vetorial não suportado")
+            self.header = json.loads(f.read(header_length))
+
+        self.count = self.header['count']
+        self.dim = self.header['dim']
+        self.sources = self.header['sources']
+        self.doc_type_bits = {doc_type: 1 << bit for bit, doc_type in enumerate(self.header['doc_types'])}
+        self.sections = {}
+        for name, (offset, dtype, shape) in self.header['sections'].items():
+            if not int(np.prod(shape)):
+                self.sections[name] = np.zeros(shape, dtype=dtype)
+            else:
+                self.sections[name] = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=tuple(shape))
+        self.vectors = self.sections['vectors']
+        self.scales = self.sections.get('scales')
+        self.ids = json.loads(self.sections['ids'].tobytes()) if self.count else []
+        self.rows = {point_id: row for row, point_id in enumerate(self.ids)}
+
+    def vector(self, row):
+        vector = np.asarray(self.vectors[row], dtype=np.float32)
+        if self.scales is not None:
+            vector = vector * self.scales[row]
+        return vector
+
+    def payload(self, row, with_payload=True):
+        if not with_payload:
+            return None
+        offsets = self.sections['payload_offsets']
+        payload = json.loads(self.sections['payloads'][offsets[row]:offsets[row + 1]].tobytes())
+        if with_payload is True:
+            return payload
+        return {key: payload[key] for key in with_payload if key in payload}
+
+    def scores(self, query_vector):
+        """Similaridade de cosseno da consulta com todas as linhas, em blocos."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if norm:
+            query = query / norm
+        scores = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, SCORE_BLOCK_ROWS):
+            block = self.vectors[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32, copy=False) @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def mask(self, query_filter):
+        """
+        Linhas que satisfazem o filtro do plano da consulta (`QueryPlan.to_filter`):
+        ano, mês e número por valor, lista ou intervalo, e tipos de portaria.
+        """
+        if query_filter is None:
+            return None
+        if query_filter.should or query_filter.must_not or getattr(query_filter, 'min_should', None):
+            raise ValueError("O armazenamento vetorial local só aceita condições `must`")
+        mask = np.ones(self.count, dtype=bool)
+        for condition in query_filter.must or []:
+            key = getattr(condition, 'key', None)
+            if key == "doc_types" and isinstance(condition.match, MatchAny):
+                bits = 0
+                for doc_type in condition.match.any:
+                    bits |= self.doc_type_bits.get(doc_type, 0)
+                mask &= (self.sections['doc_types'] & bits) != 0
+            elif key in FILTER_COLUMNS:
+                column = self.sections[key]
+                if isinstance(condition.match, MatchValue):
+                    mask &= column == condition.match.value
+                elif isinstance(condition.match, MatchAny):
+                    mask &= np.isin(column, condition.match.any)
+                elif condition.range is not None:
+                    # Sem valor (0) nunca satisfaz um intervalo.
+                    mask &= column != 0
+                    if condition.range.gte is not None:
+                        mask &= column >= condition.range.gte
+                    if condition.range.lte is not None:
+                        mask &= column <= condition.range.lte
+                else:
+                    raise ValueError(f"Condição não suportada no campo '{key}'")
+            else:
+                raise ValueError(f"Condição não suportada no armazenamento vetorial local: {condition}")
+        return mask
+
+    def ranked_rows(self, query_vector, query_filter, candidates):
+        """
+        (linhas, scores) das `candidates` linhas mais similares que passam no
+        filtro, em ordem decrescente. Com `candidates=None`, todas.
+        """
+        scores = self.scores(query_vector)
+        rows = np.arange(self.count)
+        mask = self.mask(query_filter)
+        if mask is not None:
+            rows = rows[mask]
+            scores = scores[mask]
+        if candidates and candidates < len(rows):
+            # Seleção parcial (O(n)); só os candidatos são ordenados.
+            top = np.argpartition(-scores, candidates - 1)[:candidates]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return rows[order], scores[order]
+
+    def point(self, row, score, with_payload=True, with_vectors=False):
+        return ScoredPoint(
+            id=self.ids[row],
+            version=0,
+            score=float(score),
+            payload=self.payload(row, with_payload),
+            vector=self.vector(row).tolist() if with_vectors else None
+        )
+
+
+class LocalVectorStore:
+    """
+    Cópia local e compacta dos vetores de uma coleção do Qdrant, com ids e
+    payloads, em um único arquivo mapeado em memória (float32 ou int8).
+
+    A ingestão regrava o arquivo (`VectorStoreWriter`) ao final de cada
+    execução que altera a coleção e pode restaurar uma coleção a partir
+    dele sem revetorizar nada. A API o usa como backend de busca sem
+    servidor: similaridade de cosseno por força bruta com NumPy, com os
+    filtros de ano, mês, número e tipo do plano da consulta, e agrupamento
+    por portaria como o `search_groups` do Qdrant. O arquivo é reaberto
+    quando a ingestão o substitui.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def _current(self):
+        """O arquivo aberto, reaberto se tiver sido substituído; None se não existir."""
+        try:
+            inode = os.stat(self.path).st_ino
+        except (FileNotFoundError, TypeError):
+            return None
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.inode != inode:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.inode != inode:
+                    snapshot = self._snapshot = _Snapshot(self.path)
+                    logger.info(f"Armazenamento vetorial local carregado: {snapshot.count} pontos de '{self.path}'.")
+        return snapshot
+
+    def _require(self):
+        snapshot = self._current()
+        if snapshot is None:
+            raise FileNotFoundError(f"Armazenamento vetorial local não encontrado: '{self.path}'")
+        return snapshot
+
+    def available(self):
+        try:
+            return self._current() is not None
+        except (OSError, ValueError) as e:
+            logger.error(f"Armazenamento vetorial local ilegível: {e}")
+            return False
+
+    def metadata(self):
+        """Cabeçalho do arquivo (coleção de origem, modelo, contagem...), ou None."""
+        snapshot = self._current()
+        return dict(snapshot.header) if snapshot else None
+
+    def count(self):
+        return self._require().count
+
+    def search(self, query_vector, query_filter=None, limit=10, with_payload=True, with_vectors=False):
+        """Os `limit` trechos mais similares, como o `search` do Qdrant."""
+        snapshot = self._require()
+        rows, scores = snapshot.ranked_rows(query_vector, query_filter, limit)
+        return [snapshot.point(row, score, with_payload, with_vectors) for row, score in zip(rows, scores)]
+
+    def search_groups(self, query_vector, query_filter=None, limit=10, group_size=1,
+                      with_payload=True, with_vectors=False):
+        """
+        Até `limit` portarias com até `group_size` trechos cada, na ordem do
+        melhor trecho, como o `search_groups(group_by="source")` do Qdrant.
+        """
+        snapshot = self._require()
+        # Candidatos suficientes na maioria dos casos; se não bastarem, ordena tudo.
+        candidates = limit * group_size * 4
+        while True:
+            rows, scores = snapshot.ranked_rows(query_vector, query_filter, candidates)
+            groups = {}
+            for row, score in zip(rows, scores):
+                source = snapshot.sources[snapshot.sections['source_ids'][row]]
+                hits = groups.get(source)
+                if hits is None:
+                    if len(groups) >= limit:
+                        continue
+                    hits = groups[source] = []
+                if len(hits) < group_size:
+                    hits.append((row, score))
+            if len(groups) >= limit or candidates is None or len(rows) < candidates:
+                break
+            candidates = None
+        return [
+            PointGroup(id=source, hits=[snapshot.point(row, score, with_payload, with_vectors) for row, score in hits])
+            for source, hits in groups.items()
+        ]
+
+    def retrieve(self, ids, with_payload=True, with_vectors=False):
+        """Pontos pelo id, como o `retrieve` do Qdrant; ids ausentes são ignorados."""
+        snapshot = self._require()
+        records = []
+        for point_id in ids:
+            row = snapshot.rows.get(str(point_id))
+            if row is None:
+                continue
+            records.append(Record(
+                id=snapshot.ids[row],
+                payload=snapshot.payload(row, with_payload),
+                vector=snapshot.vector(row).tolist() if with_vectors else None
+            ))
+        return records
+
+    def iter_points(self, batch_size=256):
+        """Produz lotes de (id, vetor, payload) de todos os pontos, para restaurar a coleção."""
+        snapshot = self._require()
+        for start in range(0, snapshot.count, batch_size):
+            yield [
+                (snapshot.ids[row], snapshot.vector(row).tolist(), snapshot.payload(row))
+                for row in range(start, min(start + batch_size, snapshot.count))
+            ]
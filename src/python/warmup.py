@@ -0,0 +1,179 @@
+import os
+import time
+import asyncio
+import inspect
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """
+    Aquecimento de um processo da API: executa as etapas `steps` (pares de
+    nome e função; em `arun`, também corrotinas) uma vez por processo, de novo no
+    processo filho após um fork. Uma etapa que falha é registrada e não
+    impede as seguintes; o /readyz decide se o processo pode atender assim
+    mesmo.
+
+    Guarda também o tempo de importação da API (`import_seconds`) e compara
+    os dois tempos com os orçamentos `import_budget` e `warmup_budget`.
+    """
+
+    def __init__(self, steps, import_budget=None, warmup_budget=None):
+        self.steps = steps
+        self.import_budget = import_budget
+        self.warmup_budget = warmup_budget
+        self.import_seconds = None
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, pid):
+        self._pid = pid
+        self.done = False
+        self.seconds = None
+        self.results = {}
+
+    def set_import_seconds(self, seconds):
+        self.import_seconds = seconds
+        logger.info(f"API importada em {seconds:.3f}s.")
+        if self.import_budget and seconds > self.import_budget:
+            logger.warning(f"Importação da API levou {seconds:.3f}s, acima do orçamento de {self.import_budget}s.")
+
+    def _claim(self):
+        """True se o aquecimento ainda não começou neste processo (e o marca como iniciado)."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return False
+            self._reset(os.getpid())
+            return True
+
+    def _record(self, name, started, error=None):
+        elapsed = time.perf_counter() - started
+        self.results[name] = {"seconds": round(elapsed, 4), "ok": error is None}
+        if error is not None:
+            self.results[name]["error"] = str(error)
+            logger.warning(f"Aquecimento: etapa '{name}' falhou após {elapsed:.3f}s: {error}")
+        else:
+            logger.info(f"Aquecimento: etapa '{name}' concluída em {elapsed:.3f}s.")
+
+    def _finish(self, started):
+        self.seconds = time.perf_counter() - started
+        self.done = True
+        logger.info(f"Aquecimento concluído em {self.seconds:.3f}s.")
+        if self.warmup_budget and self.seconds > self.warmup_budget:
+            logger.warning(f"Aquecimento levou {self.seconds:.3f}s, acima do orçamento de {self.warmup_budget}s.")
+
+    def run(self):
+        """Executa as etapas na thread atual (se ainda não rodaram neste processo)."""
+        if not self._claim():
+            return
+        started = time.perf_counter()
+        for name, step in self.steps:
+            step_started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                self._record(name, step_started, e)
+            else:
+                self._record(name, step_started)
+        self._finish(started)
+
+    async def arun(self):
+        """Versão assíncrona: corrotinas rodam no event loop e as demais etapas em threads."""
+        if not self._claim():
+            return
+        started = time.perf_counter()
+        for name, step in self.steps:
+            step_started = time.perf_counter()
+            try:
+                if inspect.iscoroutinefunction(step):
+                    await step()
+                else:
+                    await asyncio.to_thread(step)
+            except Exception as e:
+                self._record(name, step_started, e)
+            else:
+                self._record(name, step_started)
+        self._finish(started)
+
+    def start(self):
+        """Inicia o aquecimento em uma thread de fundo, uma vez por processo."""
+        if self._pid == os.getpid():
+            return
+        threading.Thread(target=self.run, name="warmup", daemon=True).start()
+
+    def snapshot(self):
+        return {
+            "done": self.done,
+            "import_seconds": round(self.import_seconds, 4) if self.import_seconds is not None else None,
+            "warmup_seconds": round(self.seconds, 4) if self.seconds is not None else None,
+            "steps": dict(self.results),
+        }
+
+    def stats(self):
+        """Valores numéricos para o /metrics."""
+        stats = {"done": int(self.done), "failed_steps": sum(not r["ok"] for r in self.results.values())}
+        if self.import_seconds is not None:
+            stats["import_seconds"] = round(self.import_seconds, 4)
+        if self.seconds is not None:
+            stats["warmup_seconds"] = round(self.seconds, 4)
+        return stats
+
+
+class ReadinessProbe:
+    """
+    Verificações do /readyz: `checks` são pares de nome e função (síncrona
+    ou corrotina) que retornam (ok, detalhes). O resultado fica guardado por
+    `interval` segundos, para que sondagens frequentes (docker, nginx) não
+    virem uma consulta ao Qdrant a cada pedido.
+    """
+
+    def __init__(self, checks, interval=5.0):
+        self.checks = checks
+        self.interval = interval
+        self._cached = None
+        self._checked_at = 0.0
+
+    def _fresh(self):
+        if self._cached is not None and time.monotonic() - self._checked_at < self.interval:
+            return self._cached
+        return None
+
+    def _store(self, results):
+        ready = all(ok for ok, _ in results.values())
+        report = {"ready": ready, "checks": {name: {"ok": ok, **details} for name, (ok, details) in results.items()}}
+        self._cached, self._checked_at = report, time.monotonic()
+        return report
+
+    @staticmethod
+    def _failed(name, error):
+        logger.warning(f"Verificação de prontidão '{name}' falhou: {error}")
+        return False, {"error": str(error)}
+
+    def check(self):
+        report = self._fresh()
+        if report is not None:
+            return report
+        results = {}
+        for name, check in self.checks:
+            try:
+                results[name] = check()
+            except Exception as e:
+                results[name] = self._failed(name, e)
+        return self._store(results)
+
+    async def acheck(self):
+        report = self._fresh()
+        if report is not None:
+            return report
+        results = {}
+        for name, check in self.checks:
+            try:
+                if inspect.iscoroutinefunction(check):
+                    results[name] = await check()
+                else:
+                    results[name] = await asyncio.to_thread(check)
+            except Exception as e:
+                results[name] = self._failed(name, e)
+        return self._store(results)
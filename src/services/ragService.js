@@ -20,6 +20,65 @@ export const askQuestion = async (question) => {
   }
 };
 
+/**
+ * Envia uma pergunta para a rota de streaming (Server-Sent Events) da API de RAG.
+ * As fontes chegam primeiro, seguidas dos trechos da resposta à medida que são gerados.
+ * @param {string} question - A pergunta do usuário.
+ * @param {object} handlers - Callbacks chamados a cada evento.
+ * @param {(sources: Array<{id: string, title: string}>) => void} [handlers.onSources]
+ * @param {(text: string) => void} [handlers.onToken]
+ * @param {(stats: object) => void} [handlers.onDone]
+ * @param {AbortSignal} [signal] - Permite cancelar a geração (o servidor interrompe o LLM).
+ * @returns {Promise<void>}
+ */
+export const askQuestionStream = async (question, { onSources, onToken, onDone } = {}, signal) => {
+  const baseURL = import.meta.env.VITE_API_URL || '/api';
+  const response = await fetch(`${baseURL}/ask/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify({ question }),
+    signal,
+  });
+
+  if (!response.ok || !response.body) {
+    const data = await response.json().catch(() => ({}));
+    throw new Error(data.error || 'Não foi possível obter uma resposta. Tente novamente.');
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  const dispatch = (rawEvent) => {
+    let event = 'message';
+    const dataLines = [];
+    for (const line of rawEvent.split('\n')) {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+    }
+    if (!dataLines.length) return;
+    const data = JSON.parse(dataLines.join('\n'));
+
+    if (event === 'sources') onSources?.(data.sources);
+    else if (event === 'token') onToken?.(data.text);
+    else if (event === 'done') onDone?.(data);
+    else if (event === 'error') throw new Error(data.error);
+  };
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      dispatch(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+    }
+  }
+  if (buffer.trim()) dispatch(buffer);
+};
+
 /**
  * Busca o conteúdo completo de um documento pelo seu ID.
  * @param {string} id - O ID do documento.
@@ -37,14 +96,17 @@ export const getDocumentById = async (id) => {
 
 // --- INÍCIO DA NOVA FUNCIONALIDADE ---
 /**
- * Realiza uma busca semântica por portarias.
+ * Realiza uma busca semântica por portarias, uma página por vez.
  * @param {string} query - O termo ou assunto a ser buscado.
- * @returns {Promise<Array<object>>} Uma lista de portarias relevantes.
+ * @param {object} [options]
+ * @param {string|null} [options.cursor] - Cursor retornado pela página anterior (null na primeira).
+ * @param {number} [options.pageSize] - Resultados por página.
+ * @returns {Promise<{results: Array<object>, nextCursor: string|null}>} As portarias da página e o cursor da seguinte (null na última).
  */
-export const searchOrdinances = async (query) => {
+export const searchOrdinances = async (query, { cursor = null, pageSize } = {}) => {
   try {
-    const response = await apiClient.post('/search', { query });
-    return response.data.results;
+    const response = await apiClient.post('/search', { query, cursor, page_size: pageSize });
+    return { results: response.data.results, nextCursor: response.data.next_cursor ?? null };
   } catch (error)
  {
     console.error('Erro ao chamar a API de busca semântica:', error);
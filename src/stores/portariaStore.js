@@ -1,11 +1,15 @@
 import { defineStore } from 'pinia';
-import { askQuestion, getDocumentById, searchOrdinances } from '../services/ragService';
+import { askQuestionStream, getDocumentById, searchOrdinances } from '../services/ragService';
+
+// Controla a resposta em streaming em andamento (fora do state por não ser serializável).
+let abortController = null;
 
 export const usePortariaStore = defineStore('portaria', {
   state: () => ({
     // Estado do Chat
     conversation: [], 
     loading: false,
+    streaming: false, // true a partir do primeiro trecho da resposta recebido
     error: null,
     selectedPortaria: null,
 
@@ -13,9 +17,13 @@ export const usePortariaStore = defineStore('portaria', {
     semanticSearchResults: [],
     searchLoading: false,
     searchError: null,
+    searchQuery: '',
+    searchNextCursor: null, // cursor da próxima página no servidor (null se não houver mais)
   }),
 
   getters: {
+    hasMoreSearchResults: (state) => state.searchNextCursor !== null,
+
     latestSources: (state) => {
       const lastAiMessage = [...state.conversation].reverse().find(
         msg => msg.type === 'ai' && msg.sources
@@ -30,16 +38,44 @@ export const usePortariaStore = defineStore('portaria', {
       this.loading = true;
       this.error = null;
       this.conversation.push({ type: 'user', text: question });
-      
+
+      // A resposta é renderizada aos poucos: a mensagem do assistente é criada
+      // quando as fontes chegam e recebe cada trecho gerado pelo LLM.
+      let aiMessage = null;
+      const ensureMessage = () => {
+        if (!aiMessage) {
+          this.conversation.push({ type: 'ai', text: '', sources: [] });
+          aiMessage = this.conversation[this.conversation.length - 1];
+        }
+        return aiMessage;
+      };
+
+      abortController = new AbortController();
       try {
-        const response = await askQuestion(question);
-        this.conversation.push({ type: 'ai', text: response.answer, sources: response.sources });
+        await askQuestionStream(question, {
+          onSources: (sources) => {
+            ensureMessage().sources = sources;
+          },
+          onToken: (text) => {
+            this.streaming = true;
+            ensureMessage().text += text;
+          },
+        }, abortController.signal);
       } catch (e) {
-        this.error = e.message;
+        if (e.name !== 'AbortError') {
+          this.error = e.message;
+        }
       } finally {
+        abortController = null;
         this.loading = false;
+        this.streaming = false;
       }
     },
+
+    // Interrompe a resposta em andamento (o servidor cancela a geração).
+    cancelQuestion() {
+      abortController?.abort();
+    },
       
     async fetchPortariaById(id) {
         this.loading = true;
@@ -61,14 +97,36 @@ export const usePortariaStore = defineStore('portaria', {
         this.selectedPortaria = null;
     },
 
-    // Ação da Busca Semântica
-    async performSemanticSearch(query) {
+    // Ações da Busca Semântica
+    async performSemanticSearch(query, pageSize) {
       this.searchLoading = true;
       this.searchError = null;
       this.semanticSearchResults = [];
+      this.searchQuery = query;
+      this.searchNextCursor = null;
       try {
-        const results = await searchOrdinances(query);
+        const { results, nextCursor } = await searchOrdinances(query, { pageSize });
         this.semanticSearchResults = results;
+        this.searchNextCursor = nextCursor;
+      } catch (e) {
+        this.searchError = e.message;
+      } finally {
+        this.searchLoading = false;
+      }
+    },
+
+    // Carrega a próxima página da busca atual, quando o usuário chega nela.
+    async loadMoreSearchResults(pageSize) {
+      if (this.searchLoading || this.searchNextCursor === null) return;
+      this.searchLoading = true;
+      this.searchError = null;
+      try {
+        const { results, nextCursor } = await searchOrdinances(this.searchQuery, {
+          cursor: this.searchNextCursor,
+          pageSize,
+        });
+        this.semanticSearchResults.push(...results);
+        this.searchNextCursor = nextCursor;
       } catch (e) {
         this.searchError = e.message;
       } finally {
@@ -6,4 +6,20 @@ export const calculatePagination = (currentPage, totalItems, itemsPerPage) => {
     hasNextPage: currentPage * itemsPerPage < totalItems,
     hasPreviousPage: currentPage > 1
   };
-};
\ No newline at end of file
+};
+
+/**
+ * Paginação sobre resultados carregados aos poucos (cursor da API).
+ * Enquanto houver mais resultados no servidor, a próxima página conta no
+ * total e `needsFetch` indica que a página atual ainda não foi carregada.
+ */
+export const calculateCursorPagination = (currentPage, loadedItems, itemsPerPage, hasMore) => {
+  const pagination = calculatePagination(currentPage, loadedItems, itemsPerPage);
+  const loadedPages = Math.ceil(loadedItems / itemsPerPage);
+  return {
+    ...pagination,
+    totalPages: hasMore ? loadedPages + 1 : pagination.totalPages,
+    hasNextPage: pagination.hasNextPage || hasMore,
+    needsFetch: hasMore && currentPage * itemsPerPage > loadedItems
+  };
+};